@@ -0,0 +1,54 @@
+"""
+Auction benchmark.
+
+Run from the repository root::
+
+    python -m benchmarks.auction [--imps 10] [--bidders 50] [--number 200]
+"""
+
+import argparse
+import random
+import timeit
+from decimal import Decimal
+
+from openrtb import auction, request, response
+
+
+def make_request(imps):
+    return request.BidRequest(id='bench', imp=[
+        request.Impression(id=str(i), bidfloor=Decimal('0.50'), banner=request.Banner(w=300, h=250))
+        for i in range(imps)
+    ])
+
+
+def make_responses(imps, bidders, rnd):
+    responses = []
+    for b in range(bidders):
+        bids = [
+            response.Bid(id='{}-{}'.format(b, i), impid=str(i),
+                         price=Decimal(rnd.randint(10, 1000)) / 100)
+            for i in range(imps)
+        ]
+        seatbid = response.SeatBid(seat='seat{}'.format(b), bid=bids, group=int(b % 10 == 0))
+        responses.append(response.BidResponse(id='bench', seatbid=[seatbid]))
+    return responses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--imps', type=int, default=10)
+    parser.add_argument('--bidders', type=int, default=50)
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    brq = make_request(args.imps)
+    responses = make_responses(args.imps, args.bidders, random.Random(args.seed))
+    elapsed = timeit.timeit(lambda: auction.run(brq, responses), number=args.number)
+    bids = args.imps * args.bidders
+    print('auction: {} bids, {:.1f} us/auction, {:.2f} us/bid'.format(
+        bids, elapsed / args.number * 1e6, elapsed / args.number / bids * 1e6))
+
+
+if __name__ == '__main__':
+    main()
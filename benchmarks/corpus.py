@@ -0,0 +1,352 @@
+"""
+Seeded generator of synthetic bid requests for benchmarks.
+
+Produces raw (JSON-ready) web, app, video and native requests in a fixed mix, with
+optional fields present at rates typical of exchange traffic and lists (formats,
+segments, block lists, deals) of varying length. The same seed always gives the same
+corpus. Write a corpus as JSON lines from the repository root::
+
+    python -m benchmarks.corpus [--count 1000] [--seed 0] [--kind web] > requests.log
+"""
+
+import argparse
+import json
+import random
+import string
+import sys
+
+
+KINDS = ('web', 'app', 'video', 'native')
+
+#: Share of each kind of request in the default corpus.
+MIX = {'web': 0.45, 'app': 0.35, 'video': 0.12, 'native': 0.08}
+
+BANNER_SIZES = [(300, 250), (728, 90), (320, 50), (160, 600), (300, 600), (970, 250), (320, 100)]
+VIDEO_SIZES = [(640, 480), (1280, 720), (1920, 1080), (400, 300)]
+DOMAINS = ['news', 'sports', 'weather', 'recipes', 'games', 'finance', 'travel', 'music']
+TLDS = ['com', 'net', 'org', 'co.uk', 'de', 'fr']
+COUNTRIES = ['USA', 'GBR', 'DEU', 'FRA', 'CAN', 'BRA', 'IND', 'JPN']
+OSES = [('iOS', '16.4', 'Apple', 'iPhone'), ('Android', '13', 'Samsung', 'SM-G991B'),
+        ('Android', '12', 'Google', 'Pixel 6'), ('Windows', '10', None, None),
+        ('Mac OS X', '10.15', 'Apple', None)]
+USER_AGENTS = [
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 16_4 like Mac OS X) AppleWebKit/605.1.15 '
+    '(KHTML, like Gecko) Version/16.4 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 13; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/112.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/112.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/16.4 Safari/605.1.15',
+]
+VIDEO_MIMES = ['video/mp4', 'video/webm', 'application/javascript', 'video/ogg']
+NATIVE_REQUEST = json.dumps({'ver': '1.2', 'assets': [
+    {'id': 1, 'required': 1, 'title': {'len': 90}},
+    {'id': 2, 'required': 1, 'img': {'type': 3, 'wmin': 1200, 'hmin': 627}},
+    {'id': 3, 'data': {'type': 2, 'len': 140}},
+    {'id': 4, 'data': {'type': 12}},
+]})
+
+
+def category(rnd):
+    tier1 = rnd.randint(1, 26)
+    return 'IAB{}-{}'.format(tier1, rnd.randint(1, 6)) if rnd.random() < 0.6 else 'IAB{}'.format(tier1)
+
+
+def token(rnd, length=16, alphabet=string.ascii_lowercase + string.digits):
+    return ''.join(rnd.choice(alphabet) for _ in range(length))
+
+
+def uuid(rnd):
+    return '{}-{}-{}-{}-{}'.format(*(token(rnd, n, '0123456789abcdef') for n in (8, 4, 4, 4, 12)))
+
+
+def domain(rnd):
+    return '{}{}.{}'.format(rnd.choice(DOMAINS), rnd.randint(1, 500), rnd.choice(TLDS))
+
+
+def maybe(rnd, probability, value):
+    """``value()`` with the given probability, else None (the field is left out)."""
+    return value() if rnd.random() < probability else None
+
+
+def compact(obj):
+    """Drop the None values of a dict, recursively."""
+    if isinstance(obj, dict):
+        return {k: compact(v) for k, v in obj.items() if v is not None}
+    if isinstance(obj, list):
+        return [compact(v) for v in obj]
+    return obj
+
+
+def publisher(rnd):
+    return {
+        'id': 'pub{}'.format(rnd.randint(1, 2000)),
+        'name': maybe(rnd, 0.5, lambda: 'Publisher {}'.format(rnd.randint(1, 2000))),
+        'domain': maybe(rnd, 0.3, lambda: domain(rnd)),
+    }
+
+
+def geo(rnd, precise):
+    return {
+        'country': rnd.choice(COUNTRIES),
+        'region': maybe(rnd, 0.7, lambda: token(rnd, 2, string.ascii_uppercase)),
+        'city': maybe(rnd, 0.5, lambda: token(rnd, 8).title()),
+        'zip': maybe(rnd, 0.4, lambda: str(rnd.randint(10000, 99999))),
+        'lat': round(rnd.uniform(-60, 70), 4) if precise else None,
+        'lon': round(rnd.uniform(-180, 180), 4) if precise else None,
+        'type': (1 if rnd.random() < 0.6 else 2) if precise else 2,
+        'utcoffset': maybe(rnd, 0.3, lambda: rnd.choice([-480, -300, 0, 60, 120, 540])),
+    }
+
+
+def device(rnd, mobile):
+    os, osv, make, model = rnd.choice(OSES[:3] if mobile else OSES[3:])
+    return {
+        'ua': rnd.choice(USER_AGENTS[:2] if mobile else USER_AGENTS[2:]),
+        'ip': '{}.{}.{}.0'.format(rnd.randint(1, 223), rnd.randint(0, 255), rnd.randint(0, 255)),
+        'geo': geo(rnd, precise=mobile and rnd.random() < 0.5),
+        'devicetype': rnd.choice([1, 4, 5]) if mobile else 2,
+        'make': make,
+        'model': model,
+        'os': os,
+        'osv': osv,
+        'js': 1,
+        'language': rnd.choice(['en', 'de', 'fr', 'es', 'pt', 'ja']),
+        'dnt': maybe(rnd, 0.2, lambda: 0),
+        'lmt': maybe(rnd, 0.4, lambda: rnd.choice([0, 0, 0, 1])) if mobile else None,
+        'ifa': maybe(rnd, 0.8, lambda: uuid(rnd)) if mobile else None,
+        'carrier': maybe(rnd, 0.5, lambda: rnd.choice(['Verizon', 'T-Mobile', 'Vodafone'])) if mobile else None,
+        'connectiontype': maybe(rnd, 0.7, lambda: rnd.choice([2, 3, 6])),
+        'w': maybe(rnd, 0.6, lambda: rnd.choice([390, 412, 1920, 1440])),
+        'h': maybe(rnd, 0.6, lambda: rnd.choice([844, 915, 1080, 900])),
+        'pxratio': maybe(rnd, 0.3, lambda: rnd.choice([1.0, 2.0, 3.0])),
+    }
+
+
+def user(rnd):
+    data = [{
+        'id': 'dmp{}'.format(rnd.randint(1, 20)),
+        'name': maybe(rnd, 0.5, lambda: 'provider{}'.format(rnd.randint(1, 20))),
+        'segment': [{'id': str(rnd.randint(1, 100000)),
+                     'value': maybe(rnd, 0.2, lambda: str(rnd.randint(1, 10)))}
+                    for _ in range(rnd.randint(1, 25))],
+    } for _ in range(rnd.choice([1, 1, 1, 2, 3]))] if rnd.random() < 0.3 else None
+    return {
+        'id': maybe(rnd, 0.7, lambda: token(rnd, 24)),
+        'buyeruid': maybe(rnd, 0.6, lambda: token(rnd, 32)),
+        'yob': maybe(rnd, 0.1, lambda: rnd.randint(1950, 2005)),
+        'gender': maybe(rnd, 0.1, lambda: rnd.choice(['M', 'F', 'O'])),
+        'keywords': maybe(rnd, 0.1, lambda: ','.join(token(rnd, 6) for _ in range(rnd.randint(1, 8)))),
+        'data': data,
+        'ext': maybe(rnd, 0.5, lambda: {'consent': token(rnd, rnd.randint(100, 600))}),
+    }
+
+
+def banner(rnd):
+    sizes = rnd.sample(BANNER_SIZES, rnd.choice([1, 1, 2, 3, 4]))
+    return {
+        'w': sizes[0][0],
+        'h': sizes[0][1],
+        'format': [{'w': w, 'h': h} for w, h in sizes] if len(sizes) > 1 or rnd.random() < 0.5 else None,
+        'pos': maybe(rnd, 0.6, lambda: rnd.choice([0, 1, 3])),
+        'battr': maybe(rnd, 0.4, lambda: sorted(rnd.sample(range(1, 17), rnd.randint(1, 6)))),
+        'btype': maybe(rnd, 0.2, lambda: [4]),
+        'api': maybe(rnd, 0.5, lambda: sorted(rnd.sample([3, 5, 6, 7], rnd.randint(1, 3)))),
+        'topframe': maybe(rnd, 0.3, lambda: rnd.choice([0, 1])),
+    }
+
+
+def video(rnd):
+    w, h = rnd.choice(VIDEO_SIZES)
+    return {
+        'mimes': rnd.sample(VIDEO_MIMES, rnd.randint(1, 4)),
+        'minduration': rnd.choice([0, 5, 6]),
+        'maxduration': rnd.choice([15, 30, 60, 120]),
+        'protocols': sorted(rnd.sample(range(1, 11), rnd.randint(2, 6))),
+        'w': w,
+        'h': h,
+        'startdelay': rnd.choice([0, 0, -1, -2]),
+        'placement': rnd.choice([1, 1, 3, 4]),
+        'linearity': 1,
+        'skip': maybe(rnd, 0.5, lambda: rnd.choice([0, 1])),
+        'playbackmethod': [rnd.choice([1, 2, 3, 5])],
+        'delivery': maybe(rnd, 0.4, lambda: [2]),
+        'api': maybe(rnd, 0.6, lambda: sorted(rnd.sample([1, 2, 7], rnd.randint(1, 3)))),
+        'battr': maybe(rnd, 0.3, lambda: sorted(rnd.sample(range(1, 17), rnd.randint(1, 4)))),
+        'companionad': maybe(rnd, 0.1, lambda: [banner(rnd)]),
+    }
+
+
+def native(rnd):
+    return {'request': NATIVE_REQUEST, 'ver': '1.2', 'api': maybe(rnd, 0.3, lambda: [3, 5])}
+
+
+def deals(rnd):
+    return {
+        'private_auction': rnd.choice([0, 0, 1]),
+        'deals': [{
+            'id': 'deal-{}'.format(token(rnd, 8)),
+            'bidfloor': round(rnd.uniform(1, 20), 2),
+            'at': maybe(rnd, 0.5, lambda: rnd.choice([1, 2, 3])),
+            'wseat': maybe(rnd, 0.4, lambda: ['seat{}'.format(rnd.randint(1, 50)) for _ in range(rnd.randint(1, 5))]),
+        } for _ in range(rnd.randint(1, 4))],
+    }
+
+
+def impression(rnd, kind, index):
+    imp = {
+        'id': str(index + 1),
+        'tagid': maybe(rnd, 0.7, lambda: token(rnd, 12)),
+        'bidfloor': maybe(rnd, 0.6, lambda: round(rnd.uniform(0.01, 5 if kind != 'video' else 15), 2)),
+        'bidfloorcur': maybe(rnd, 0.5, lambda: rnd.choice(['USD', 'USD', 'EUR'])),
+        'secure': maybe(rnd, 0.8, lambda: 1),
+        'instl': maybe(rnd, 0.2, lambda: rnd.choice([0, 1])) if kind == 'app' else None,
+        'pmp': maybe(rnd, 0.15, lambda: deals(rnd)),
+        'ext': maybe(rnd, 0.4, lambda: {'gpid': '/{}/{}'.format(rnd.randint(1, 9999), token(rnd, 10))}),
+    }
+    if kind == 'video':
+        imp['video'] = video(rnd)
+    elif kind == 'native':
+        imp['native'] = native(rnd)
+    else:
+        imp['banner'] = banner(rnd)
+    return imp
+
+
+def site(rnd):
+    host = domain(rnd)
+    return {
+        'id': str(rnd.randint(1, 50000)),
+        'name': maybe(rnd, 0.4, lambda: host.split('.')[0].title()),
+        'domain': host,
+        'cat': maybe(rnd, 0.6, lambda: [category(rnd) for _ in range(rnd.randint(1, 4))]),
+        'pagecat': maybe(rnd, 0.2, lambda: [category(rnd) for _ in range(rnd.randint(1, 3))]),
+        'page': 'https://{}/{}/{}'.format(host, token(rnd, 6), token(rnd, rnd.randint(10, 60))),
+        'ref': maybe(rnd, 0.5, lambda: 'https://{}/'.format(domain(rnd))),
+        'mobile': maybe(rnd, 0.5, lambda: rnd.choice([0, 1])),
+        'publisher': publisher(rnd),
+        'keywords': maybe(rnd, 0.1, lambda: ','.join(token(rnd, 7) for _ in range(rnd.randint(1, 10)))),
+    }
+
+
+def app(rnd, kind):
+    bundle = 'com.{}.{}'.format(token(rnd, 6), token(rnd, 8))
+    return {
+        'id': str(rnd.randint(1, 50000)),
+        'name': token(rnd, 10).title(),
+        'bundle': bundle if rnd.random() < 0.7 else str(rnd.randint(100000000, 1999999999)),
+        'storeurl': maybe(rnd, 0.6, lambda: 'https://play.google.com/store/apps/details?id=' + bundle),
+        'cat': maybe(rnd, 0.6, lambda: [category(rnd) for _ in range(rnd.randint(1, 3))]),
+        'ver': maybe(rnd, 0.5, lambda: '{}.{}.{}'.format(rnd.randint(1, 9), rnd.randint(0, 20), rnd.randint(0, 99))),
+        'paid': maybe(rnd, 0.2, lambda: 0),
+        'publisher': publisher(rnd),
+        'content': maybe(rnd, 0.5 if kind == 'video' else 0.1, lambda: {
+            'id': token(rnd, 10),
+            'title': maybe(rnd, 0.6, lambda: token(rnd, 20)),
+            'series': maybe(rnd, 0.3, lambda: token(rnd, 12)),
+            'genre': maybe(rnd, 0.4, lambda: rnd.choice(['Drama', 'Comedy', 'News', 'Sports'])),
+            'livestream': maybe(rnd, 0.3, lambda: rnd.choice([0, 1])),
+            'len': maybe(rnd, 0.4, lambda: rnd.randint(60, 7200)),
+            'language': maybe(rnd, 0.5, lambda: 'en'),
+        }),
+    }
+
+
+def bid_request(rnd, kind):
+    """One raw bid request of the given kind."""
+    mobile = kind in ('app', 'native') or (kind == 'video' and rnd.random() < 0.5)
+    brq = {
+        'id': uuid(rnd),
+        'imp': [impression(rnd, kind, i) for i in range(rnd.choice([1, 1, 1, 1, 2, 3]))],
+        'device': device(rnd, mobile),
+        'user': user(rnd),
+        'at': maybe(rnd, 0.5, lambda: rnd.choice([1, 2])),
+        'tmax': maybe(rnd, 0.9, lambda: rnd.choice([100, 120, 150, 200, 300])),
+        'cur': maybe(rnd, 0.5, lambda: ['USD']),
+        'bcat': maybe(rnd, 0.7, lambda: sorted(set(category(rnd) for _ in range(rnd.randint(3, 30))))),
+        'badv': maybe(rnd, 0.5, lambda: [domain(rnd) for _ in range(rnd.randint(1, 40))]),
+        'bapp': maybe(rnd, 0.1, lambda: ['com.{}.app'.format(token(rnd, 8)) for _ in range(rnd.randint(1, 10))]),
+        'source': maybe(rnd, 0.5, lambda: {'fd': rnd.choice([0, 1]), 'tid': uuid(rnd)}),
+        'regs': maybe(rnd, 0.6, lambda: {'coppa': 0, 'ext': {'gdpr': rnd.choice([0, 1])}}),
+        'ext': maybe(rnd, 0.3, lambda: {'prebid': {'channel': {'name': 'web', 'version': '7'}}}),
+    }
+    if kind in ('app', 'native') or (kind == 'video' and mobile):
+        brq['app'] = app(rnd, kind)
+    else:
+        brq['site'] = site(rnd)
+    return compact(brq)
+
+
+def generate(count, seed=0, kinds=None):
+    """``count`` raw bid requests of ``kinds`` (default: all, mixed as in `MIX`)."""
+    rnd = random.Random(seed)
+    kinds = list(kinds or KINDS)
+    weights = [MIX[kind] for kind in kinds]
+    total = sum(weights)
+    requests = []
+    for _ in range(count):
+        pick = rnd.random() * total
+        for kind, weight in zip(kinds, weights):
+            pick -= weight
+            if pick < 0:
+                break
+        requests.append(bid_request(rnd, kind))
+    return requests
+
+
+def mobile_request(rnd):
+    """One raw OpenRTB 2.0 mobile bid request (see `openrtb.mobile`)."""
+    os, osv, make, model = rnd.choice(OSES[:3])
+    w, h = rnd.choice(BANNER_SIZES)
+    brq = {
+        'id': uuid(rnd),
+        'at': rnd.choice([1, 2]),
+        'tmax': rnd.choice([100, 120, 200]),
+        'imp': [{'impid': str(i + 1), 'w': w, 'h': h, 'pos': maybe(rnd, 0.5, lambda: rnd.choice([1, 3])),
+                 'battr': maybe(rnd, 0.4, lambda: sorted(rnd.sample(range(1, 17), rnd.randint(1, 4))))}
+                for i in range(rnd.choice([1, 1, 2]))],
+        'device': {
+            'did': token(rnd, 40, '0123456789abcdef'),
+            'ip': '{}.{}.{}.0'.format(rnd.randint(1, 223), rnd.randint(0, 255), rnd.randint(0, 255)),
+            'country': rnd.choice(COUNTRIES),
+            'carrier': maybe(rnd, 0.5, lambda: 'Verizon'),
+            'ua': rnd.choice(USER_AGENTS[:2]),
+            'make': make, 'model': model, 'os': os, 'osv': osv, 'js': 1,
+            'loc': maybe(rnd, 0.4, lambda: '{:.4f},{:.4f}'.format(rnd.uniform(-60, 70), rnd.uniform(-180, 180))),
+        },
+        'user': maybe(rnd, 0.7, lambda: {'uid': token(rnd, 24), 'yob': maybe(rnd, 0.2, lambda: rnd.randint(1950, 2005)),
+                                        'country': rnd.choice(COUNTRIES)}),
+        'restrictions': maybe(rnd, 0.6, lambda: {'bcat': [category(rnd) for _ in range(rnd.randint(1, 10))],
+                                                'badv': [domain(rnd) for _ in range(rnd.randint(0, 10))]}),
+    }
+    if rnd.random() < 0.8:
+        brq['app'] = {'aid': str(rnd.randint(1, 5000)), 'name': token(rnd, 10).title(),
+                      'bundle': 'com.{}.{}'.format(token(rnd, 6), token(rnd, 8)),
+                      'pid': 'pub{}'.format(rnd.randint(1, 2000)),
+                      'cat': [category(rnd) for _ in range(rnd.randint(1, 3))]}
+    else:
+        host = domain(rnd)
+        brq['site'] = {'sid': str(rnd.randint(1, 5000)), 'domain': host, 'page': 'https://{}/'.format(host),
+                       'pid': 'pub{}'.format(rnd.randint(1, 2000))}
+    return compact(brq)
+
+
+def generate_mobile(count, seed=0):
+    rnd = random.Random(seed)
+    return [mobile_request(rnd) for _ in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--kind', choices=KINDS, action='append', help='repeat for several kinds (default: all)')
+    args = parser.parse_args(argv)
+
+    for brq in generate(args.count, args.seed, args.kind):
+        sys.stdout.write(json.dumps(brq, sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Memory footprint of the bid requests in a log file.
+
+Run from the repository root::
+
+    python -m benchmarks.memory requests.log [--limit 20] [--response]
+"""
+
+import argparse
+
+from openrtb import memory, request, response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='one JSON object per line')
+    parser.add_argument('--limit', type=int, default=20, help='number of paths and classes shown')
+    parser.add_argument('--response', action='store_true', help='the log holds bid responses')
+    args = parser.parse_args(argv)
+
+    cls = response.BidResponse if args.response else request.BidRequest
+    report = memory.corpus(args.path, cls)
+    print(report.format(args.limit))
+    print('')
+    print(report.footprint.format(args.limit))
+
+
+if __name__ == '__main__':
+    main()
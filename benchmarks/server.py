@@ -0,0 +1,75 @@
+"""
+Bidder server load test against a local pipelining client.
+
+Run from the repository root (Python 3.5+)::
+
+    python -m benchmarks.server [--connections 20] [--requests 500] [--pipeline 4] [--latency 0]
+"""
+
+import argparse
+import asyncio
+import time
+
+from openrtb import codec, httpio, request, response
+from openrtb.server import BidderServer
+
+
+REQUEST = request.BidRequest(id='bench', tmax=120, imp=[
+    request.Impression(id='1', banner=request.Banner(w=300, h=250)),
+])
+
+
+def make_handler(latency):
+    async def handler(brq, deadline):
+        if latency:
+            await asyncio.sleep(latency / 1000.0)
+        return response.BidResponse.minimal(brq.id, 'b1', brq.imp[0].id, 1.5)
+    return handler
+
+
+async def client(port, requests, pipeline, latencies):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = httpio.request('POST', '/', 'localhost', codec.dumps(REQUEST))
+    sent = 0
+    while sent < requests:
+        batch = min(pipeline, requests - sent)
+        start = time.perf_counter()
+        writer.write(payload * batch)
+        for _ in range(batch):
+            message = await httpio.read_message(reader)
+            assert message.start[1] in ('200', '204'), message.start
+        latencies.append((time.perf_counter() - start) / batch)
+        sent += batch
+    writer.close()
+
+
+async def run(args):
+    server = BidderServer(make_handler(args.latency))
+    await server.start()
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(server.port, args.requests, args.pipeline, latencies)
+                           for _ in range(args.connections)])
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    latencies.sort()
+    total = args.connections * args.requests
+    print('server: {} requests, {:.0f} req/s, p50 {:.2f} ms, p99 {:.2f} ms, {} timeouts'.format(
+        total, total / elapsed,
+        latencies[len(latencies) // 2] * 1e3, latencies[int(len(latencies) * 0.99)] * 1e3,
+        server.timeouts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=500, help='requests per connection')
+    parser.add_argument('--pipeline', type=int, default=4, help='requests in flight per connection')
+    parser.add_argument('--latency', type=float, default=0, help='handler latency in ms')
+    args = parser.parse_args(argv)
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
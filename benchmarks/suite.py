@@ -0,0 +1,173 @@
+"""
+Benchmark suite for the core encode and decode paths over a synthetic corpus.
+
+Times deserialize, serialize and the JSON round-trip per kind of request (web, app,
+video, native), plus macro substitution, ``iab.from_string`` and the OpenRTB 2.0 mobile
+adapter. Results are microseconds per operation, the best of ``--repeat`` runs. Save
+them and compare later runs against them from the repository root::
+
+    python -m benchmarks.suite [--count 500] [--repeat 5] [--save results.json]
+    python -m benchmarks.suite --baseline [results.json] [--threshold 10]
+
+``benchmarks/baseline.json`` holds a stored run made with the defaults; numbers only
+compare on the same machine and Python, so regenerate it there with ``--save`` first.
+Exits with status 1 when any benchmark is slower than the baseline by more than the
+threshold.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from decimal import Decimal
+
+from openrtb import codec, iab, macros, mobile, request, response
+
+from . import corpus
+
+
+BASELINE = 'benchmarks/baseline.json'
+
+TEMPLATE = ('https://win.example.com/notify?auction=${AUCTION_ID}&bid=${AUCTION_BID_ID}'
+            '&imp=${AUCTION_IMP_ID}&seat=${AUCTION_SEAT_ID}&ad=${AUCTION_AD_ID}'
+            '&price=${AUCTION_PRICE}&cur=${AUCTION_CURRENCY}')
+
+
+def _categories(rnd, count):
+    return [corpus.category(rnd) for _ in range(count)] + ['IAB27', 'IAB3-99', 'unknown']
+
+
+def cases(count, seed=0):
+    """``[(name, function, number of operations per call)]``."""
+    requests = corpus.generate(count, seed)
+    corpora = [('all', requests)] + [(kind, corpus.generate(count, seed, [kind])) for kind in corpus.KINDS]
+
+    result = []
+    for kind, raws in corpora:
+        encoded = [codec.dumps(raw) for raw in raws]
+        objects = [request.BidRequest.deserialize(raw) for raw in raws]
+
+        def deserialize(raws=raws):
+            for raw in raws:
+                request.BidRequest.deserialize(raw)
+
+        def serialize(objects=objects):
+            for brq in objects:
+                brq.serialize()
+
+        def round_trip(encoded=encoded):
+            for data in encoded:
+                codec.dumps(codec.decode(request.BidRequest, data).serialize())
+
+        result.extend([('deserialize.' + kind, deserialize, len(raws)),
+                       ('serialize.' + kind, serialize, len(raws)),
+                       ('round_trip.' + kind, round_trip, len(raws))])
+
+    pairs = []
+    for brq in (request.BidRequest.deserialize(raw) for raw in requests):
+        imp = brq.imp[0]
+        brp = response.BidResponse.minimal(brq.id, 'b' + imp.id, imp.id, Decimal('1.25'))
+        brp.bidid = 'bid' + brq.id[:8]
+        brp.seatbid[0].seat = 'seat1'
+        pairs.append((brq, brp))
+
+    def substitution():
+        for brq, brp in pairs:
+            macros.substitution(brq, brp, Decimal('1.25'), TEMPLATE)
+
+    categories = _categories(random.Random(seed), count)
+
+    def from_string():
+        for cat in categories:
+            iab.from_string(cat)
+
+    mobile_requests = corpus.generate_mobile(count, seed)
+
+    def adapter():
+        for raw in mobile_requests:
+            mobile.OpenRTB20Adapter.deserialize(raw)
+
+    result.extend([('macros.substitution', substitution, len(pairs)),
+                   ('iab.from_string', from_string, len(categories)),
+                   ('mobile.OpenRTB20Adapter', adapter, len(mobile_requests))])
+    return result
+
+
+def run(count=500, seed=0, repeat=5, only=None):
+    """Run the suite; returns the results document."""
+    results = {}
+    for name, function, ops in cases(count, seed):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        function()  # warm up caches
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+        results[name] = {'us': round(best / ops * 1e6, 3), 'ops': ops}
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'count': count,
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=10.0):
+    """Report lines and the names of benchmarks slower than ``baseline`` by over ``threshold`` percent."""
+    lines = ['{:<28} {:>10} {:>10} {:>8}'.format('benchmark', 'baseline', 'current', 'change')]
+    regressions = []
+    for name, new in sorted(current['results'].items()):
+        old = baseline['results'].get(name)
+        if old is None:
+            lines.append('{:<28} {:>10} {:>10.3f}'.format(name, '-', new['us']))
+            continue
+        change = (new['us'] - old['us']) / old['us'] * 100 if old['us'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  slower'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        lines.append('{:<28} {:>10.3f} {:>10.3f} {:>+7.1f}%{}'.format(name, old['us'], new['us'], change, flag))
+    if (current['python'], current['count'], current['seed']) != \
+            (baseline['python'], baseline['count'], baseline['seed']):
+        lines.append('warning: the baseline was made with Python {python}, count {count}, seed {seed}'
+                     .format(**baseline))
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=500, help='requests per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', action='append', help='run benchmarks starting with this prefix')
+    parser.add_argument('--save', help='write the results as JSON')
+    parser.add_argument('--baseline', nargs='?', const=BASELINE,
+                        help='compare against saved results (default: {})'.format(BASELINE))
+    parser.add_argument('--threshold', type=float, default=10.0, help='percent slower counted as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.count, args.seed, args.repeat, args.only)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline, args.threshold)
+        print('\n'.join(lines))
+        if regressions:
+            sys.exit(1)
+    else:
+        for name, result in sorted(results['results'].items()):
+            print('{:<28} {:>10.3f} us/op'.format(name, result['us']))
+
+
+if __name__ == '__main__':
+    main()
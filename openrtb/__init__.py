@@ -3,4 +3,22 @@ from . import response
 from . import constants
 from . import macros
 from . import mobile
-from . import iab
\ No newline at end of file
+from . import iab
+from . import domains
+from . import auction
+from . import validation
+from . import price
+from . import currency
+from . import targeting
+from . import creatives
+from . import geofence
+from . import ipgeo
+from . import useragent
+from . import frequency
+from . import codec
+from . import nobid
+from . import prefilter
+from . import admission
+from . import metrics
+from . import tracking
+from . import memory
@@ -0,0 +1,195 @@
+"""
+Admission control for bid requests, applied to raw bodies before they are decoded.
+
+Requests are attributed to a source, ``(exchange, publisher id)``, where the publisher
+is ``site.publisher.id`` or ``app.publisher.id``. Each source is rate limited by a token
+bucket. While the observed latency exceeds the budget, requests are also shed by their
+estimated value (the highest ``bidfloor`` times the source's win rate): the fraction of
+traffic shed grows by a step per interval while latency stays over budget and shrinks
+once it recovers, and the cheapest requests go first. Requests valued at the cutoff are shed at random, so traffic
+with no floors is still shed in proportion.
+"""
+
+import bisect
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from . import prefilter
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+_PUBLISHER_PATHS = prefilter.path_tree(['site.publisher.id', 'app.publisher.id'])
+_BIDFLOOR = re.compile(br'"bidfloor"\s*:\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)')
+
+#: Reasons for shedding a request.
+RATE_LIMITED = 'rate_limited'
+OVERLOADED = 'overloaded'
+
+
+def source_of(data, exchange=None):
+    """The ``(exchange, publisher id)`` of a raw bid request."""
+    values = prefilter.extract(data, _PUBLISHER_PATHS)
+    return exchange, values['site.publisher.id'] or values['app.publisher.id']
+
+
+def max_bidfloor(data):
+    """The highest ``bidfloor`` of the impressions and deals in a raw bid request, or 0."""
+    floors = _BIDFLOOR.findall(data)
+    return max(float(f) for f in floors) if floors else 0.0
+
+
+class TokenBucket(object):
+
+    """Allows ``rate`` events per second on average, with bursts of up to ``burst``."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now, amount=1):
+        tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if tokens < amount:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - amount
+        return True
+
+
+class AdmissionControl(object):
+
+    """Per-source rate limits and value-based load shedding.
+
+    ``rates`` maps sources to their QPS limits; ``(exchange, None)`` sets the limit for
+    each source of an exchange. Other sources get ``default_rate`` (no limit if None).
+    ``latency_budget`` is in seconds, as is ``interval``, the time between adjustments of
+    the shed level.
+    """
+
+    #: Sources tracked at once; the tables are cleared when they fill up.
+    MAX_SOURCES = 100000
+
+    def __init__(self, latency_budget=0.05, default_rate=None, rates=None, burst=1.0,
+                 default_win_rate=0.1, smoothing=0.05, window=1000, step=0.05, interval=1.0, clock=_clock):
+        self.latency_budget = latency_budget
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        #: Bucket size in seconds of the source's rate.
+        self.burst = burst
+        self.default_win_rate = default_win_rate
+        self.smoothing = smoothing
+        self.step = step
+        self.interval = interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.win_rates = {}
+        self.latency = 0.0
+        #: Fraction of the lowest-value traffic being shed.
+        self.shed_level = 0.0
+        #: Clock time of the last shed level adjustment.
+        self.adjusted = None
+        self.values = deque(maxlen=window)
+        self.sorted_values = []
+        self.cutoff = 0.0
+        self.random = random.Random()
+        self.admitted = 0
+        #: ``{reason: count}`` of shed requests.
+        self.shed = {RATE_LIMITED: 0, OVERLOADED: 0}
+        #: ``{(reason, source): count}`` of shed requests.
+        self.shed_by_source = {}
+
+    def rate_of(self, source):
+        rate = self.rates.get(source)
+        if rate is None:
+            rate = self.rates.get((source[0], None), self.default_rate)
+        return rate
+
+    def win_rate(self, source):
+        return self.win_rates.get(source, self.default_win_rate)
+
+    def observe(self, latency):
+        """Record a request latency and adjust the shed level, at most once per interval."""
+        now = self.clock()
+        with self.lock:
+            self.latency += self.smoothing * (latency - self.latency)
+            if self.adjusted is not None and now - self.adjusted < self.interval:
+                return
+            self.adjusted = now
+            if self.latency > self.latency_budget:
+                self.shed_level = min(0.95, self.shed_level + self.step)
+            elif self.shed_level:
+                self.shed_level = max(0.0, self.shed_level - self.step / 2)
+            self._update_cutoff()
+
+    def report(self, source, won):
+        """Record whether a bid on a request from ``source`` won."""
+        with self.lock:
+            if len(self.win_rates) >= self.MAX_SOURCES:
+                self.win_rates.clear()
+            rate = self.win_rates.get(source, self.default_win_rate)
+            self.win_rates[source] = rate + self.smoothing * ((1.0 if won else 0.0) - rate)
+
+    def value(self, data, source):
+        return max_bidfloor(data) * self.win_rate(source)
+
+    def _update_cutoff(self):
+        if not self.shed_level or not self.sorted_values:
+            self.cutoff = 0.0
+            return
+        values = self.sorted_values
+        self.cutoff = values[min(len(values) - 1, int(self.shed_level * len(values)))]
+
+    def _record_value(self, value):
+        values = self.values
+        if len(values) == values.maxlen:
+            old = values[0]
+            del self.sorted_values[bisect.bisect_left(self.sorted_values, old)]
+        values.append(value)
+        bisect.insort(self.sorted_values, value)
+
+    def _shed(self, reason, source):
+        self.shed[reason] += 1
+        key = (reason, source)
+        if len(self.shed_by_source) >= self.MAX_SOURCES and key not in self.shed_by_source:
+            self.shed_by_source.clear()
+        self.shed_by_source[key] = self.shed_by_source.get(key, 0) + 1
+        return reason
+
+    def admit(self, data, exchange=None):
+        """Decide on a raw bid request: return None to admit it, or the reason it is shed."""
+        source = source_of(data, exchange)
+        value = self.value(data, source)
+        now = self.clock()
+        with self.lock:
+            rate = self.rate_of(source)
+            if rate is not None:
+                bucket = self.buckets.get(source)
+                if bucket is None:
+                    if len(self.buckets) >= self.MAX_SOURCES:
+                        self.buckets.clear()
+                    bucket = self.buckets[source] = TokenBucket(rate, max(1.0, rate * self.burst), now)
+                if not bucket.take(now):
+                    return self._shed(RATE_LIMITED, source)
+            self._record_value(value)
+            if self.shed_level and value <= self.cutoff:
+                # requests worth exactly the cutoff (e.g. all without floors) are shed at random
+                if value < self.cutoff or self.random.random() < self.shed_level:
+                    return self._shed(OVERLOADED, source)
+            self.admitted += 1
+            return None
+
+    def counters(self):
+        """A snapshot of the admission counters."""
+        with self.lock:
+            counters = {'admitted': self.admitted, 'shed_level': self.shed_level, 'latency': self.latency}
+            counters.update(('shed_' + reason, count) for reason, count in self.shed.items())
+            return counters
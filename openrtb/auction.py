@@ -0,0 +1,183 @@
+"""
+Auction resolution over the bid responses received for a single bid request.
+
+Bids are indexed by ``impid`` into one heap per impression, so picking a winner and
+a runner-up costs O(log n) instead of sorting every bid. Seat bids with ``group=1``
+are all-or-nothing: if such a seat loses any of its impressions, all of its bids are
+withdrawn and the affected impressions are resolved again.
+"""
+
+import heapq
+from collections import namedtuple
+from decimal import Decimal
+
+import six
+
+from .constants import AuctionType
+from .currency import CurrencyError
+from .price import Price
+
+
+Winner = namedtuple('Winner', 'impid bid seat response price')
+
+_Candidate = namedtuple('_Candidate', 'price bid seat response deal floor group')
+
+
+def to_decimal(value):
+    if value is None:
+        return Decimal(0)
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, Price):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+
+def amount(value):
+    """Like `to_decimal`, but keeps `Price` values so they compare as integers."""
+    if isinstance(value, Price):
+        return value
+    return to_decimal(value)
+
+
+class Auction(object):
+
+    """Resolves winners and clearing prices for a `BidRequest`.
+
+    ``increment`` is added to the runner-up price in second price auctions.
+    If ``rates`` (a `currency.Rates` table) is given, floors and bid prices are
+    converted to its base currency, and bids in unknown currencies are dropped.
+    """
+
+    def __init__(self, brq, increment=Decimal('0.01'), rates=None):
+        self.brq = brq
+        self.rates = rates
+        self.increment = to_decimal(increment)
+        self.at = brq.at or AuctionType.SECOND_PRICE
+        self.wseat = frozenset(brq.wseat or ())
+        self.bseat = frozenset(brq.bseat or ())
+        self.imps = {}
+        self.floors = {}
+        self.deals = {}
+        for imp in brq.imp:
+            self.imps[imp.id] = imp
+            self.floors[imp.id] = amount(self.normalize(imp.bidfloor, imp.bidfloorcur))
+            if imp.pmp and imp.pmp.deals:
+                self.deals[imp.id] = {deal.id: deal for deal in imp.pmp.deals}
+
+    def normalize(self, value, currency):
+        if self.rates is None or value is None:
+            return value
+        return self.rates.convert(value, currency)
+
+    def is_private(self, impid):
+        pmp = self.imps[impid].pmp
+        return bool(pmp and pmp.private_auction)
+
+    def admit(self, bid, seat, currency=None):
+        """Return the price, deal and floor a bid is admitted under, or None if it is not eligible."""
+        impid = bid.impid
+        if impid not in self.imps:
+            return None
+        if self.wseat and seat not in self.wseat or seat in self.bseat:
+            return None
+        deal = None
+        floor = self.floors[impid]
+        if bid.dealid:
+            deal = self.deals.get(impid, {}).get(bid.dealid)
+        if deal is not None:
+            if deal.wseat and seat not in deal.wseat:
+                return None
+            if deal.wadomain and not set(bid.adomain or ()).intersection(deal.wadomain):
+                return None
+            if deal.bidfloor is not None:
+                floor = amount(self.normalize(deal.bidfloor, deal.bidfloorcur))
+        elif self.is_private(impid):
+            return None
+        try:
+            price = amount(self.normalize(bid.price, currency))
+        except CurrencyError:
+            return None
+        if price < floor:
+            return None
+        return price, deal, floor
+
+    def collect(self, responses):
+        heaps = {}
+        groups = {}
+        excluded = set()
+        seq = 0
+        for response in responses:
+            for seatbid in response.seatbid or ():
+                group = id(seatbid) if seatbid.group == 1 else None
+                members = []
+                for bid in seatbid.bid or ():
+                    admitted = self.admit(bid, seatbid.seat, response.cur)
+                    if admitted is None:
+                        if group is not None:
+                            excluded.add(group)
+                        continue
+                    price, deal, floor = admitted
+                    candidate = _Candidate(price, bid, seatbid.seat,
+                                           response, deal, floor, group)
+                    heaps.setdefault(bid.impid, []).append((-candidate.price, seq, candidate))
+                    members.append(candidate)
+                    seq += 1
+                if group is not None:
+                    groups[group] = members
+        for heap in six.itervalues(heaps):
+            heapq.heapify(heap)
+        return heaps, groups, excluded
+
+    @staticmethod
+    def top(heap, excluded):
+        while heap and heap[0][2].group in excluded:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def runner_up(self, heap, excluded):
+        best = heapq.heappop(heap)
+        runner = self.top(heap, excluded)
+        heapq.heappush(heap, best)
+        return runner
+
+    def clearing_price(self, winner, runner):
+        deal = winner.deal
+        at = deal.at if deal is not None and deal.at is not None else self.at
+        if at == AuctionType.FIRST_PRICE:
+            return winner.price
+        if at == AuctionType.FIXED_PRICE and deal is not None and deal.bidfloor is not None:
+            return winner.floor
+        second = runner.price + self.increment if runner is not None else self.increment
+        return min(winner.price, max(second, winner.floor))
+
+    def run(self, responses):
+        """Return a dict of `Winner` objects keyed by impression id."""
+        heaps, groups, excluded = self.collect(responses)
+
+        while True:
+            tops = {}
+            for impid, heap in six.iteritems(heaps):
+                candidate = self.top(heap, excluded)
+                if candidate is not None:
+                    tops[impid] = candidate
+            changed = False
+            for group, members in six.iteritems(groups):
+                if group in excluded:
+                    continue
+                if any(tops.get(c.bid.impid) is not c for c in members):
+                    excluded.add(group)
+                    changed = True
+            if not changed:
+                break
+
+        winners = {}
+        for impid, winner in six.iteritems(tops):
+            runner = self.runner_up(heaps[impid], excluded)
+            winners[impid] = Winner(impid, winner.bid, winner.seat, winner.response,
+                                    self.clearing_price(winner, runner))
+        return winners
+
+
+def run(brq, responses, **kwargs):
+    return Auction(brq, **kwargs).run(responses)
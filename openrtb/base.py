@@ -1,3 +1,7 @@
+import functools
+import timeit
+from collections import namedtuple
+
 import six
 
 
@@ -21,6 +25,7 @@ def get_deserializer(datatype):
 class Field(object):
 
     def __init__(self, datatype, required=False, default=None):
+        self.datatype = datatype
         self.deserialize = get_deserializer(datatype)
         self.required = required
         self.default = default
@@ -42,15 +47,43 @@ def serialize(value):
     return value
 
 
+#: ``{class: [calls, seconds, fields, unknown fields]}`` while `profile_deserialize` is on.
+_profiles = None
+
+
 class ObjectMeta(type):
 
     def __init__(cls, name, bases, attrs):
         super(ObjectMeta, cls).__init__(name, bases, attrs)
         named_fields = [item for item in six.iteritems(attrs)
                         if isinstance(item[1], Field)]
+        cls._fields = dict(named_fields)
         cls._deserializers = {name: field.deserialize for name, field in named_fields}
         cls._defaults = {name: field.default for name, field in named_fields}
         cls._required = {name for name, field in named_fields if field.required}
+        if _profiles is not None and 'deserialize' in attrs:
+            cls.deserialize = classmethod(_profiled(attrs['deserialize'].__func__, _profiles))
+
+
+#: Instance attributes used by the library itself, never serialized.
+INTERNAL_ATTRIBUTES = frozenset(['_memo', '_frozen', '_track'])
+
+
+def memoized(method):
+    """Cache the result of an argument-less `Object` method until any attribute is assigned."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self):
+        memo = self.__dict__.get('_memo')
+        if memo is None:
+            memo = self.__dict__['_memo'] = {}
+        try:
+            return memo[name]
+        except KeyError:
+            value = memo[name] = method(self)
+            return value
+    return wrapper
 
 
 @six.add_metaclass(ObjectMeta)
@@ -66,6 +99,30 @@ class Object(object):
     def __getattr__(self, k):
         return None
 
+    def __setattr__(self, k, v):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError('{} is a shared empty instance and cannot be modified'
+                                 .format(self.__class__.__name__))
+        self.__dict__.pop('_memo', None)
+        object.__setattr__(self, k, v)
+
+    def __delattr__(self, k):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError('{} is a shared empty instance and cannot be modified'
+                                 .format(self.__class__.__name__))
+        self.__dict__.pop('_memo', None)
+        object.__delattr__(self, k)
+
+    @classmethod
+    def empty(cls):
+        """Return a shared, read-only instance of the class with default values."""
+        empty = cls.__dict__.get('_empty')
+        if empty is None:
+            empty = cls()
+            empty.__dict__['_frozen'] = True
+            cls._empty = empty
+        return empty
+
     @classmethod
     def deserialize(cls, raw_data):
         data = {}
@@ -79,12 +136,13 @@ class Object(object):
     def serialize(self):
         return {k: serialize(v)
                 for k, v in six.iteritems(self.__dict__)
-                if v is not None}
+                if v is not None and k not in INTERNAL_ATTRIBUTES}
 
 
 class Array(object):
 
     def __init__(self, datatype):
+        self.datatype = datatype
         self._deserialize_element = get_deserializer(datatype)
 
     def deserialize(self, raw_data):
@@ -94,6 +152,78 @@ class Array(object):
     __call__ = deserialize
 
 
+class OrderedFrozenSet(frozenset):
+
+    """A hashable set that remembers the order of the list it was built from.
+
+    Membership tests are set lookups; iteration, indexing and serialization
+    follow the original list order with duplicates dropped (the first occurrence
+    is kept), and it compares equal to that list.
+    """
+
+    def __new__(cls, values=()):
+        seen = set()
+        order = tuple(value for value in values if not (value in seen or seen.add(value)))
+        self = super(OrderedFrozenSet, cls).__new__(cls, order)
+        self.order = order
+        return self
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __getitem__(self, index):
+        return self.order[index]
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, list(self.order))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple)):
+            return list(self.order) == list(other)
+        return frozenset.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = frozenset.__hash__
+
+    def serialize(self):
+        return list(self.order)
+
+
+#: Number of distinct lists kept by `SetArray` before its cache is reset.
+SET_CACHE_SIZE = 4096
+
+
+class SetArray(Array):
+
+    """An `Array` deserialized into a shared `OrderedFrozenSet`.
+
+    Meant for block and allow lists that are only used for membership tests.
+    Identical lists (which repeat across requests) deserialize to the same instance.
+    """
+
+    def __init__(self, datatype):
+        super(SetArray, self).__init__(datatype)
+        self._cache = {}
+
+    def deserialize(self, raw_data):
+        try:
+            key = tuple(raw_data or ())
+            return self._cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            return OrderedFrozenSet(six.moves.map(self._deserialize_element, raw_data))
+        if len(self._cache) >= SET_CACHE_SIZE:
+            self._cache.clear()
+        value = self._cache[key] = OrderedFrozenSet(six.moves.map(self._deserialize_element, key))
+        return value
+
+    __call__ = deserialize
+
+
 class EnumMeta(type):
     def __new__(mcs, name, bases, params):
         params['values'] = {}
@@ -141,3 +271,245 @@ class Enum(object):
 
     def serialize(self):
         return self.value
+
+
+class EnumSet(object):
+
+    """A set of `Enum` values stored as an integer bitmask.
+
+    Iterates and serializes like the list it was built from, while membership and
+    intersection checks against other sets or plain integer masks are single
+    bitwise operations.
+    """
+
+    __slots__ = ('enum', 'mask', '_order')
+
+    #: Largest value a set can hold; the mask stays a small integer.
+    MAX_VALUE = 63
+
+    def __init__(self, enum, values=()):
+        self.enum = enum
+        mask = 0
+        order = []
+        for value in values:
+            value = int(value)
+            if not 0 <= value <= self.MAX_VALUE:
+                raise ValueError('{} is outside of 0..{}'.format(value, self.MAX_VALUE))
+            mask |= 1 << value
+            order.append(value)
+        self.mask = mask
+        # only kept when iteration order would not be ascending and unique
+        self._order = tuple(order) if order != sorted(set(order)) else None
+
+    @classmethod
+    def from_mask(cls, enum, mask):
+        enum_set = cls(enum)
+        enum_set.mask = mask
+        return enum_set
+
+    def values(self):
+        if self._order is not None:
+            return list(self._order)
+        mask = self.mask
+        values = []
+        value = 0
+        while mask:
+            if mask & 1:
+                values.append(value)
+            mask >>= 1
+            value += 1
+        return values
+
+    def __iter__(self):
+        return six.moves.map(self.enum, self.values())
+
+    def __len__(self):
+        return len(self._order) if self._order is not None else bin(self.mask).count('1')
+
+    def __bool__(self):
+        return self.mask != 0
+
+    __nonzero__ = __bool__
+
+    def __getitem__(self, index):
+        return self.enum(self.values()[index])
+
+    def __contains__(self, value):
+        if value is None:
+            return False
+        value = int(value)
+        return 0 <= value <= self.MAX_VALUE and (self.mask >> value) & 1 == 1
+
+    def __repr__(self):
+        return '{}({}, {})'.format(self.__class__.__name__, self.enum.__name__, self.values())
+
+    @classmethod
+    def to_mask(cls, other):
+        """The mask of an `EnumSet`, an integer mask or an iterable; values no set can hold are left out."""
+        if isinstance(other, EnumSet):
+            return other.mask
+        if isinstance(other, six.integer_types):
+            return other
+        mask = 0
+        for value in other or ():
+            value = int(value)
+            if 0 <= value <= cls.MAX_VALUE:
+                mask |= 1 << value
+        return mask
+
+    def __eq__(self, other):
+        if isinstance(other, EnumSet):
+            return self.mask == other.mask
+        if isinstance(other, (list, tuple, set, frozenset)):
+            values = [int(value) for value in other]
+            return all(0 <= value <= self.MAX_VALUE for value in values) and self.mask == self.to_mask(values)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def intersects(self, other):
+        """Check for common values with another `EnumSet`, an iterable or an integer mask."""
+        return self.mask & self.to_mask(other) != 0
+
+    def isdisjoint(self, other):
+        return not self.intersects(other)
+
+    def __and__(self, other):
+        return self.from_mask(self.enum, self.mask & self.to_mask(other))
+
+    def __or__(self, other):
+        return self.from_mask(self.enum, self.mask | self.to_mask(other))
+
+    def serialize(self):
+        return self.values()
+
+
+class EnumArray(Array):
+
+    """An `Array` of a small `Enum` subclass deserialized into an `EnumSet`.
+
+    Lists with values outside of ``0..EnumSet.MAX_VALUE`` deserialize into plain lists,
+    as they would without bitmasks.
+    """
+
+    def deserialize(self, raw_data):
+        try:
+            values = [int(value) for value in raw_data or ()]
+        except (ValueError, TypeError):
+            raise ValidationError('should be a list of {}, got {!r} instead'
+                                  .format(self.datatype.__name__, raw_data))
+        if values and (min(values) < 0 or max(values) > EnumSet.MAX_VALUE):
+            return Array.deserialize(self, raw_data)
+        return EnumSet(self.datatype, values)
+
+    __call__ = deserialize
+
+
+def _object_classes(cls=Object):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        for nested in _object_classes(subclass):
+            yield nested
+
+
+def use_enum_bitmasks(enabled=True):
+    """Deserialize every ``Array`` of an `Enum` into an `EnumSet` (or restore lists if ``enabled`` is false).
+
+    Applies to all `Object` subclasses defined at the time of the call.
+    """
+    for cls in _object_classes():
+        for name, field in six.iteritems(cls._fields):
+            datatype = getattr(field, 'datatype', None)
+            if isinstance(datatype, Array) and isinstance(datatype.datatype, type) \
+                    and issubclass(datatype.datatype, Enum):
+                array = EnumArray(datatype.datatype) if enabled else datatype
+                cls._deserializers[name] = array.deserialize
+
+
+ProfileRow = namedtuple('ProfileRow', 'name calls seconds fields unknown')
+
+
+def _profiled(function, profiles):
+    clock = timeit.default_timer
+
+    def deserialize(cls, raw_data):
+        start = clock()
+        try:
+            return function(cls, raw_data)
+        finally:
+            elapsed = clock() - start
+            stats = profiles.get(cls)
+            if stats is None:
+                stats = profiles[cls] = [0, 0.0, 0, 0]
+            stats[0] += 1
+            stats[1] += elapsed
+            if isinstance(raw_data, dict):
+                known = cls._deserializers
+                stats[2] += len(raw_data)
+                stats[3] += sum(1 for k in raw_data if k not in known)
+    deserialize.original = function
+    deserialize.profiled_wrapper = deserialize
+    return deserialize
+
+
+def _reprofiled(function, profiles):
+    """``function`` with its profiling wrapper replaced, or removed if ``profiles`` is None.
+
+    Other wrappers are recognized by identity: ``functools.wraps`` copies the attributes of
+    the function it wraps. Those that expose ``wrapped`` and ``rewrap`` (like the `metrics`
+    hooks) are rebuilt around the new function, others are left alone.
+    """
+    if getattr(function, 'profiled_wrapper', None) is function:
+        function = function.original
+    elif hasattr(function, 'rewrap'):
+        return function.rewrap(_reprofiled(function.wrapped, profiles))
+    elif hasattr(function, 'profiled_wrapper'):
+        return function
+    return function if profiles is None else _profiled(function, profiles)
+
+
+def profile_deserialize(enabled=True):
+    """Count calls, cumulative time, fields and unknown fields of every class's ``deserialize``.
+
+    Enabling (again) resets the counters; disabling removes the wrappers, so there is no
+    cost while profiling is off. Time is cumulative: it includes nested objects.
+    """
+    global _profiles
+    profiles = {} if enabled else None
+    for cls in [Object] + list(_object_classes()):
+        own = cls.__dict__.get('deserialize')
+        if own is None:
+            continue
+        cls.deserialize = classmethod(_reprofiled(own.__func__, profiles))
+    # nested objects are deserialized through references taken when their parent class was created
+    for cls in _object_classes():
+        for name, field in six.iteritems(cls._fields):
+            datatype = field.datatype
+            if isinstance(datatype, type) and issubclass(datatype, Object):
+                cls._deserializers[name] = datatype.deserialize
+            elif isinstance(datatype, Array) and isinstance(datatype.datatype, type) \
+                    and issubclass(datatype.datatype, Object):
+                datatype._deserialize_element = datatype.datatype.deserialize
+    _profiles = profiles
+
+
+def deserialize_profile():
+    """`ProfileRow` per profiled class, by cumulative time, slowest first."""
+    rows = [ProfileRow('{}.{}'.format(cls.__module__.rsplit('.', 1)[-1], cls.__name__), *stats)
+            for cls, stats in list(six.iteritems(_profiles or {}))]
+    return sorted(rows, key=lambda row: row.seconds, reverse=True)
+
+
+def format_deserialize_profile():
+    """`deserialize_profile` as a text table."""
+    lines = ['{:<28} {:>10} {:>12} {:>10} {:>10} {:>10}'.format(
+        'class', 'calls', 'total ms', 'us/call', 'fields', 'unknown')]
+    for row in deserialize_profile():
+        lines.append('{:<28} {:>10} {:>12.3f} {:>10.2f} {:>10} {:>10}'.format(
+            row.name, row.calls, row.seconds * 1e3, row.seconds / row.calls * 1e6, row.fields, row.unknown))
+    return '\n'.join(lines)
@@ -0,0 +1,42 @@
+"""
+JSON encoding of OpenRTB objects for the wire.
+
+Numbers with a fractional part are decoded as `Decimal`, so prices survive the round trip
+exactly; `Decimal` values are encoded as JSON numbers.
+"""
+
+import json
+from decimal import Decimal
+
+import six
+
+from .base import serialize
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'serialize'):
+        return value.serialize()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+_encoder = json.JSONEncoder(default=_default, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(data):
+    """Decode a JSON document from text or UTF-8 bytes."""
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode('utf-8')
+    return json.loads(data, parse_float=Decimal)
+
+
+def dumps(obj):
+    """Encode an `Object` (or plain data) as UTF-8 JSON bytes."""
+    text = _encoder.encode(serialize(obj))
+    return text.encode('utf-8') if isinstance(text, six.text_type) else text
+
+
+def decode(cls, data):
+    """Deserialize raw JSON into an `Object` subclass, e.g. ``decode(BidRequest, body)``."""
+    return cls.deserialize(loads(data))
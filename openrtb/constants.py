@@ -4,6 +4,7 @@ from . import base
 class AuctionType(base.Enum):
     FIRST_PRICE = 1
     SECOND_PRICE = 2
+    FIXED_PRICE = 3
 
 
 class BannerType(base.Enum):
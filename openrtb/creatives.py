@@ -0,0 +1,188 @@
+"""
+Creative catalog indexed for matching against `Banner` impressions.
+
+Creatives are kept in sets keyed by exact size (with the sizes sorted for
+``wmin``/``wmax`` ranges), in size lists per reduced aspect ratio (sorted by width
+for ``Format.wmin``) and in sets keyed by banner type, attribute and MIME type, so a lookup
+is a few dict probes and set operations instead of a scan over the catalog.
+"""
+
+import bisect
+import itertools
+
+from . import constants
+from .base import Object, Array, String, Field
+
+
+def gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def ratio(w, h):
+    d = gcd(w, h) or 1
+    return w // d, h // d
+
+
+class Creative(Object):
+
+    """A banner creative available for bidding."""
+
+    #: Creative ID.
+    id = Field(String, required=True)
+
+    #: Width of the creative in pixels.
+    w = Field(int, required=True)
+
+    #: Height of the creative in pixels.
+    h = Field(int, required=True)
+
+    #: Banner type of the creative, checked against ``Banner.btype``.
+    type = Field(constants.BannerType)
+
+    #: Creative attributes, checked against ``Banner.battr``.
+    attr = Field(Array(constants.CreativeAttribute))
+
+    #: MIME type of the creative, checked against ``Banner.mimes``.
+    mime = Field(String)
+
+
+class CreativeIndex(object):
+
+    """An index of `Creative` objects answering "which creatives fit this banner"."""
+
+    def __init__(self, creatives=()):
+        self.creatives = {}
+        self.by_size = {}
+        self.sizes = []
+        self.by_ratio = {}
+        self.by_type = {}
+        self.by_attr = {}
+        self.by_mime = {}
+        self.profiles = {}
+        for creative in creatives:
+            self.add(creative)
+
+    def __len__(self):
+        return len(self.creatives)
+
+    def __contains__(self, creative_id):
+        return creative_id in self.creatives
+
+    @staticmethod
+    def _put(index, key, creative_id):
+        index.setdefault(key, set()).add(creative_id)
+
+    @staticmethod
+    def _drop(index, key, creative_id):
+        ids = index[key]
+        ids.discard(creative_id)
+        if not ids:
+            del index[key]
+            return True
+        return False
+
+    def add(self, creative):
+        if creative.id in self.creatives:
+            self.remove(creative.id)
+        cid = creative.id
+        self.creatives[cid] = creative
+        self.profiles[cid] = (
+            int(creative.type) if creative.type is not None else None,
+            frozenset(int(a) for a in creative.attr or ()),
+            creative.mime.lower() if creative.mime else None,
+        )
+        size = (creative.w, creative.h)
+        if size not in self.by_size:
+            bisect.insort(self.sizes, size)
+            bisect.insort(self.by_ratio.setdefault(ratio(*size), []), size)
+        self._put(self.by_size, size, cid)
+        if creative.type is not None:
+            self._put(self.by_type, int(creative.type), cid)
+        for attr in creative.attr or ():
+            self._put(self.by_attr, int(attr), cid)
+        if creative.mime:
+            self._put(self.by_mime, creative.mime.lower(), cid)
+
+    def remove(self, creative_id):
+        creative = self.creatives.pop(creative_id)
+        del self.profiles[creative_id]
+        size = (creative.w, creative.h)
+        if self._drop(self.by_size, size, creative_id):
+            del self.sizes[bisect.bisect_left(self.sizes, size)]
+            key = ratio(*size)
+            sizes = self.by_ratio[key]
+            del sizes[bisect.bisect_left(sizes, size)]
+            if not sizes:
+                del self.by_ratio[key]
+        if creative.type is not None:
+            self._drop(self.by_type, int(creative.type), creative_id)
+        for attr in creative.attr or ():
+            self._drop(self.by_attr, int(attr), creative_id)
+        if creative.mime:
+            self._drop(self.by_mime, creative.mime.lower(), creative_id)
+
+    def in_range(self, wmin, wmax, hmin, hmax):
+        sizes = self.sizes
+        start = bisect.bisect_left(sizes, (wmin, -1))
+        stop = len(sizes) if wmax is None else bisect.bisect_right(sizes, (wmax, float('inf')))
+        found = set()
+        for size in sizes[start:stop]:
+            if hmin <= size[1] and (hmax is None or size[1] <= hmax):
+                found.update(self.by_size[size])
+        return found
+
+    def with_ratio(self, wratio, hratio, wmin=0):
+        sizes = self.by_ratio.get(ratio(wratio, hratio), ())
+        start = bisect.bisect_left(sizes, (wmin, -1)) if wmin else 0
+        return set().union(*[self.by_size[size] for size in sizes[start:]])
+
+    def sized(self, banner):
+        """Return the ids of creatives whose size fits ``banner`` and its formats."""
+        found = set()
+        constrained = False
+        if any(v is not None for v in (banner.wmin, banner.wmax, banner.hmin, banner.hmax)):
+            constrained = True
+            found.update(self.in_range(banner.wmin or 0, banner.wmax, banner.hmin or 0, banner.hmax))
+        elif banner.w is not None and banner.h is not None:
+            constrained = True
+            found.update(self.by_size.get((banner.w, banner.h), ()))
+        for fmt in banner.format or ():
+            if fmt.w is not None and fmt.h is not None:
+                constrained = True
+                found.update(self.by_size.get((fmt.w, fmt.h), ()))
+            elif fmt.wratio and fmt.hratio:
+                constrained = True
+                found.update(self.with_ratio(fmt.wratio, fmt.hratio, fmt.wmin or 0))
+        if not constrained:
+            return set(self.creatives)
+        return found
+
+    def eligible(self, banner):
+        """Return the ids of creatives eligible for ``banner`` (usually ``Impression.banner``)."""
+        found = self.sized(banner)
+        if not found:
+            return found
+        btype = set(int(t) for t in banner.btype or ())
+        battr = set(int(a) for a in banner.battr or ())
+        mimes = set(m.lower() for m in banner.mimes or ())
+        filters = [(self.by_type, btype), (self.by_attr, battr), (self.by_mime, mimes)]
+        postings = [[index[k] for k in keys if k in index] for index, keys in filters]
+
+        if len(found) < sum(len(ids) for ids in itertools.chain.from_iterable(postings)):
+            # few candidates: checking each one is cheaper than building the unions
+            profiles = self.profiles
+            return set(cid for cid in found
+                       if profiles[cid][0] not in btype
+                       and battr.isdisjoint(profiles[cid][1])
+                       and (not mimes or profiles[cid][2] in mimes))
+
+        types, attrs, mime_ids = postings
+        if types:
+            found.difference_update(*types)
+        if attrs:
+            found.difference_update(*attrs)
+        if mimes:
+            found.intersection_update(set().union(*mime_ids))
+        return found
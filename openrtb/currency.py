@@ -0,0 +1,129 @@
+"""
+Currency conversion for ``bidfloorcur`` and ``BidResponse.cur``.
+
+A `Rates` table is immutable; updating rates means building a new table and
+installing it with `set_rates`, which swaps a single reference so readers never
+see a half-updated table. Conversion factors between currency pairs are cached
+as fixed-point integers, so converting a price is an integer multiply.
+"""
+
+import codecs
+import csv
+import json
+from decimal import Decimal
+
+import six
+
+from .price import Price, SCALE, parse_micros
+
+
+DEFAULT_CURRENCY = 'USD'
+
+#: Conversion factors are stored as integers scaled by this value.
+RATE_SCALE = 10 ** 12
+
+
+class CurrencyError(ValueError):
+    pass
+
+
+class Rates(object):
+
+    """Exchange rates expressed as units of each currency per one unit of ``base``."""
+
+    def __init__(self, rates, base=DEFAULT_CURRENCY):
+        self.base = base.upper()
+        self.rates = {cur.upper(): Decimal(str(rate)) for cur, rate in six.iteritems(rates)}
+        self.rates[self.base] = Decimal(1)
+        self._factors = {}
+
+    def __contains__(self, currency):
+        return (currency or DEFAULT_CURRENCY).upper() in self.rates
+
+    @classmethod
+    def load(cls, path, base=DEFAULT_CURRENCY):
+        """Load rates from a ``.csv`` file of ``currency,rate`` rows or a JSON file.
+
+        JSON files contain either ``{"base": "USD", "rates": {"EUR": 0.92, ...}}``
+        or just the rates mapping.
+        """
+        with codecs.open(path, encoding='utf-8') as f:
+            if path.endswith('.csv'):
+                rates = {row[0].strip(): row[1].strip()
+                         for row in csv.reader(f) if row and not row[0].startswith('#')}
+            else:
+                data = json.load(f, parse_float=Decimal)
+                if 'rates' in data:
+                    base = data.get('base', base)
+                    data = data['rates']
+                rates = data
+        return cls(rates, base)
+
+    def factor(self, source, target=None):
+        """Fixed-point factor that converts ``source`` amounts to ``target`` (defaults to ``base``)."""
+        source = (source or DEFAULT_CURRENCY).upper()
+        target = (target or self.base).upper()
+        key = (source, target)
+        try:
+            return self._factors[key]
+        except KeyError:
+            pass
+        try:
+            ratio = self.rates[target] / self.rates[source]
+        except KeyError as e:
+            raise CurrencyError('unknown currency: {}'.format(e.args[0]))
+        factor = self._factors[key] = int((ratio * RATE_SCALE).to_integral_value())
+        return factor
+
+    def convert_micros(self, micros, source, target=None):
+        factor = self.factor(source, target)
+        if factor == RATE_SCALE:
+            return micros
+        return (micros * factor + RATE_SCALE // 2) // RATE_SCALE
+
+    def convert(self, amount, source, target=None):
+        """Convert a `Price`, `Decimal`, float or int amount; `Price` stays `Price`, anything else becomes `Decimal`."""
+        if amount is None:
+            return None
+        if isinstance(amount, Price):
+            return Price.from_micros(self.convert_micros(amount.micros, source, target))
+        return Decimal(self.convert_micros(parse_micros(amount), source, target)) / SCALE
+
+    def floors(self, brq, target=None):
+        """Return ``{impid: floor}`` and ``{(impid, dealid): floor}`` converted to ``target``."""
+        imp_floors = {}
+        deal_floors = {}
+        for imp in brq.imp:
+            imp_floors[imp.id] = self.convert(imp.bidfloor, imp.bidfloorcur, target)
+            if imp.pmp:
+                for deal in imp.pmp.deals or ():
+                    deal_floors[(imp.id, deal.id)] = self.convert(deal.bidfloor, deal.bidfloorcur, target)
+        return imp_floors, deal_floors
+
+    def prices(self, responses, target=None):
+        """Return a list of ``(bid, price)`` for every bid, converted from ``BidResponse.cur``."""
+        prices = []
+        for response in responses:
+            cur = response.cur
+            for seatbid in response.seatbid or ():
+                for bid in seatbid.bid or ():
+                    prices.append((bid, self.convert(bid.price, cur, target)))
+        return prices
+
+
+_rates = Rates({})
+
+
+def get_rates():
+    return _rates
+
+
+def set_rates(rates):
+    """Install a new `Rates` table for all subsequent conversions."""
+    global _rates
+    _rates = rates
+
+
+def load_rates(path, base=DEFAULT_CURRENCY):
+    set_rates(Rates.load(path, base))
+    return _rates
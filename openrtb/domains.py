@@ -0,0 +1,134 @@
+"""
+Advertiser domain and app bundle block lists.
+
+``BidRequest.badv`` blocks an advertiser domain together with all of its subdomains,
+so ``ford.com`` must also reject a bid with ``adomain=['www.ford.com']``.
+Lists are compiled into hashed suffix sets, so a lookup costs one set probe per label
+regardless of the list size. ``BidRequest.bapp`` holds exact app identifiers and is
+matched exactly, unless bundle prefix matching is asked for.
+"""
+
+import six
+
+
+#: Compiled block lists are cached by their contents, since the same publisher
+#: lists repeat across requests.
+CACHE_SIZE = 4096
+
+_cache = {}
+
+
+def normalize_domain(domain):
+    """Lowercase a domain and strip a URL scheme, path, port, and trailing dot."""
+    domain = domain.strip().lower()
+    if '://' in domain:
+        domain = domain.split('://', 1)[1]
+    for sep in '/?#:':
+        if sep in domain:
+            domain = domain.split(sep, 1)[0]
+    return domain.rstrip('.')
+
+
+def normalize_bundle(bundle):
+    """Lowercase an app bundle or store id and strip surrounding whitespace."""
+    return bundle.strip().lower()
+
+
+def reverse_bundle(bundle):
+    """Reverse the labels of a bundle id, so ``com.foo.game`` becomes ``game.foo.com``.
+
+    Bundle ids name the owner first, so reversing them lets a bundle list match every
+    bundle under a prefix with the same suffix matching as domains.
+    """
+    return '.'.join(reversed(normalize_bundle(bundle).split('.')))
+
+
+class DomainSet(object):
+
+    """A set of domains that also matches any subdomain of its members (unless ``subdomains`` is false)."""
+
+    def __init__(self, domains=(), normalize=normalize_domain, subdomains=True):
+        self.normalize = normalize
+        self.subdomains = subdomains
+        self.suffixes = frozenset(filter(None, six.moves.map(normalize, domains or ())))
+
+    def __len__(self):
+        return len(self.suffixes)
+
+    def __bool__(self):
+        return bool(self.suffixes)
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, domain):
+        if not self.suffixes or not domain:
+            return False
+        return self.match(domain) is not None
+
+    def match(self, domain):
+        """Return the blocked entry that covers ``domain``, or None."""
+        domain = self.normalize(domain)
+        suffixes = self.suffixes
+        if not self.subdomains:
+            return domain if domain in suffixes else None
+        while domain:
+            if domain in suffixes:
+                return domain
+            dot = domain.find('.')
+            if dot < 0:
+                return None
+            domain = domain[dot + 1:]
+
+    def blocks(self, domains):
+        """Check whether any of ``domains`` (e.g. ``Bid.adomain``) is blocked."""
+        if not self.suffixes or not domains:
+            return False
+        contains = self.__contains__
+        return any(contains(d) for d in domains)
+
+
+def compile_domains(domains, normalize=normalize_domain, subdomains=True):
+    """Return a cached `DomainSet` for a list of domains."""
+    # frozen sets from `base.SetArray` are shared and hash in O(1)
+    domains = domains if isinstance(domains, frozenset) else tuple(domains or ())
+    key = (normalize, subdomains, domains)
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    if len(_cache) >= CACHE_SIZE:
+        _cache.clear()
+    compiled = _cache[key] = DomainSet(domains, normalize, subdomains)
+    return compiled
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def blocked_advertisers(brq):
+    """Compiled ``BidRequest.badv``."""
+    return compile_domains(brq.badv)
+
+
+def blocked_apps(brq, prefixes=False):
+    """Compiled ``BidRequest.bapp``, matched exactly.
+
+    With ``prefixes``, each entry also blocks the bundles under it (``com.foo`` blocks
+    ``com.foo.game``).
+    """
+    if prefixes:
+        return compile_domains(brq.bapp, reverse_bundle)
+    return compile_domains(brq.bapp, normalize_bundle, subdomains=False)
+
+
+def is_bid_blocked(brq, bid, bundle_prefixes=False):
+    """Check a bid's ``adomain`` and ``bundle`` against the request's block lists.
+
+    ``bundle_prefixes`` turns on prefix matching for ``bapp`` (see `blocked_apps`).
+    """
+    if brq.badv and blocked_advertisers(brq).blocks(bid.adomain):
+        return True
+    if brq.bapp and bid.bundle and bid.bundle in blocked_apps(brq, bundle_prefixes):
+        return True
+    return False
@@ -0,0 +1,197 @@
+"""
+Asyncio fan-out of a `BidRequest` to many bidders. Requires Python 3.5+.
+
+Each `Bidder` keeps a pool of keep-alive connections. ``FanoutClient.fanout(brq)``
+sends the request to every bidder at once and returns an async iterator that yields a
+`Result` per bidder as its response arrives. When ``tmax`` runs out the outstanding
+requests are cancelled (their connections are dropped) and iteration stops::
+
+    async for result in client.fanout(brq):
+        ...
+"""
+
+import asyncio
+import collections
+import copy
+from collections import namedtuple
+
+from . import codec, httpio
+from .response import BidResponse
+
+
+#: ``response`` is a `BidResponse`, or None for a no-bid or a failure (``error`` is then set).
+Result = namedtuple('Result', 'bidder status response error latency')
+
+
+class ConnectionPool(object):
+
+    """Idle keep-alive connections to one host."""
+
+    def __init__(self, host, port, size=8):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle = collections.deque()
+        self.opened = 0
+
+    async def acquire(self):
+        """Return ``(reader, writer, reused)``."""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.opened += 1
+        return reader, writer, False
+
+    def release(self, reader, writer):
+        if len(self.idle) < self.size and not reader.at_eof():
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def close(self):
+        while self.idle:
+            self.idle.pop()[1].close()
+
+
+class Bidder(object):
+
+    """A bidder endpoint.
+
+    ``prepare``, if given, is called with a deep copy of the serialized request dict and returns
+    the dict to send to this bidder (e.g. to set bidder-specific ``ext`` fields).
+    """
+
+    def __init__(self, name, host, port=80, path='/', prepare=None, pool_size=8):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.path = path
+        self.prepare = prepare
+        self.pool = ConnectionPool(host, port, pool_size)
+
+    def __repr__(self):
+        return '<Bidder {} {}:{}{}>'.format(self.name, self.host, self.port, self.path)
+
+    def encode(self, data, body):
+        """The HTTP request for this bidder, given the serialized request and its default encoding."""
+        if self.prepare is not None:
+            body = codec.dumps(self.prepare(copy.deepcopy(data)))
+        return httpio.request('POST', self.path, '{}:{}'.format(self.host, self.port), body)
+
+    async def send(self, payload):
+        """Send an encoded request and return the response message."""
+        reader, writer, reused = await self.pool.acquire()
+        try:
+            writer.write(payload)
+            message = await httpio.read_message(reader)
+            if message is None and reused:
+                # the bidder closed an idle connection; retry on a new one
+                writer.close()
+                reader, writer, reused = await self.pool.acquire()
+                writer.write(payload)
+                message = await httpio.read_message(reader)
+            if message is None:
+                raise ConnectionError('Connection closed by {}'.format(self.name))
+        except BaseException:
+            # including cancellation: the connection is left mid-response
+            writer.close()
+            raise
+        if httpio.keep_alive(message.start[0], message.headers):
+            self.pool.release(reader, writer)
+        else:
+            writer.close()
+        return message
+
+
+class Fanout(object):
+
+    """Async iterator over the `Result` of each bidder, in order of arrival."""
+
+    def __init__(self, tasks, queue, deadline):
+        self.tasks = tasks
+        self.queue = queue
+        self.deadline = deadline
+        self.remaining = len(tasks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.remaining:
+            raise StopAsyncIteration
+        timeout = self.deadline - asyncio.get_event_loop().time()
+        try:
+            result = await asyncio.wait_for(self.queue.get(), max(0, timeout))
+        except asyncio.TimeoutError:
+            self.cancel()
+            raise StopAsyncIteration
+        self.remaining -= 1
+        return result
+
+    def cancel(self):
+        """Cancel the requests still outstanding."""
+        self.remaining = 0
+        for task in self.tasks:
+            task.cancel()
+
+    async def collect(self):
+        """All results that arrive before the deadline."""
+        results = []
+        while True:
+            try:
+                results.append(await self.__anext__())
+            except StopAsyncIteration:
+                return results
+
+
+class FanoutClient(object):
+
+    def __init__(self, bidders, network_budget=10, default_tmax=100):
+        self.bidders = list(bidders)
+        #: Milliseconds of ``tmax`` kept for answering the caller of the exchange.
+        self.network_budget = network_budget
+        #: ``tmax`` in milliseconds for requests that do not set it.
+        self.default_tmax = default_tmax
+
+    async def call(self, bidder, payload, queue):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        status, response, error = None, None, None
+        try:
+            message = await bidder.send(payload)
+            status = int(message.start[1])
+            if status == 200:
+                response = codec.decode(BidResponse, message.body)
+            elif status != 204:
+                error = httpio.HTTPError(status)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+        queue.put_nowait(Result(bidder, status, response, error, loop.time() - start))
+
+    def fanout(self, brq, bidders=None, timeout=None):
+        """Send ``brq`` to ``bidders`` (all by default) and return a `Fanout` of results.
+
+        ``timeout`` in seconds defaults to ``tmax`` minus the network budget.
+        """
+        loop = asyncio.get_event_loop()
+        if timeout is None:
+            timeout = max(0, (brq.tmax or self.default_tmax) - self.network_budget) / 1000.0
+        data = brq.serialize()
+        body = codec.dumps(data)
+        queue = asyncio.Queue()
+        tasks = [loop.create_task(self.call(bidder, bidder.encode(data, body), queue))
+                 for bidder in (self.bidders if bidders is None else bidders)]
+        return Fanout(tasks, queue, loop.time() + timeout)
+
+    async def dispatch(self, brq, **kwargs):
+        """Collect the results of `fanout` that arrive in time."""
+        return await self.fanout(brq, **kwargs).collect()
+
+    def close(self):
+        for bidder in self.bidders:
+            bidder.pool.close()
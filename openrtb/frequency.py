@@ -0,0 +1,235 @@
+"""
+In-process frequency capping.
+
+Counts are kept per key (usually ``(user_key(brq), campaign_id)``) in a ring of
+``buckets`` time buckets covering ``window`` seconds, so a count always covers the
+last ``window`` seconds at bucket resolution. Keys not updated for a whole window
+expire; every key is remembered under the bucket in which it was last updated, so
+expiring costs nothing for keys that are still live.
+"""
+
+import codecs
+import json
+import os
+import threading
+import time
+from array import array
+
+import six
+
+
+#: Identifiers a cap can be keyed on, in order of preference.
+ID_FIELDS = (
+    ('user', 'buyeruid'),
+    ('user', 'id'),
+    ('device', 'ifa'),
+    ('device', 'didsha1'),
+)
+
+
+def user_key(brq):
+    """Return the best user identifier of a `BidRequest` as ``'field:value'``, or None."""
+    for obj_name, field in ID_FIELDS:
+        obj = getattr(brq, obj_name)
+        value = obj is not None and getattr(obj, field)
+        if value:
+            return '{}:{}'.format(field, value)
+    return None
+
+
+class FrequencyStore(object):
+
+    """Thread-safe sliding-window counters with TTL expiry and a size limit."""
+
+    def __init__(self, window=86400, buckets=24, maxsize=1000000, clock=time.time):
+        self.window = window
+        self.buckets = buckets
+        self.width = float(window) / buckets
+        self.maxsize = maxsize
+        self.clock = clock
+        self.lock = threading.Lock()
+        # key -> array('l', [last bucket, count per ring slot...])
+        self.counters = {}
+        # bucket -> keys whose last update was in that bucket
+        self.generations = {}
+        self.oldest = None
+
+    def __len__(self):
+        return len(self.counters)
+
+    def __contains__(self, key):
+        return key in self.counters
+
+    def now(self):
+        return int(self.clock() // self.width)
+
+    def _roll(self, counter, bucket):
+        last = counter[0]
+        if last == bucket:
+            return
+        n = self.buckets
+        if bucket - last >= n:
+            for i in range(1, n + 1):
+                counter[i] = 0
+        else:
+            for b in range(last + 1, bucket + 1):
+                counter[b % n + 1] = 0
+        counter[0] = bucket
+
+    def _count(self, key, bucket):
+        counter = self.counters.get(key)
+        if counter is None:
+            return 0
+        last, n = counter[0], self.buckets
+        if last == bucket:
+            return sum(counter) - bucket
+        # slots of buckets that have left the window are only cleared on the next update
+        return sum(counter[b % n + 1] for b in range(max(last, bucket) - n + 1, last + 1))
+
+    def _increment(self, key, bucket, amount):
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) >= self.maxsize:
+                self._evict(bucket)
+            counter = self.counters[key] = array('l', [bucket] + [0] * self.buckets)
+            self._touch(key, bucket)
+        elif counter[0] != bucket:
+            generation = self.generations.get(counter[0])
+            if generation is not None:
+                generation.discard(key)
+            self._roll(counter, bucket)
+            self._touch(key, bucket)
+        counter[bucket % self.buckets + 1] += amount
+        return sum(counter) - bucket
+
+    def _touch(self, key, bucket):
+        generation = self.generations.get(bucket)
+        if generation is None:
+            generation = self.generations[bucket] = set()
+            if self.oldest is None or bucket < self.oldest:
+                self.oldest = bucket
+        generation.add(key)
+
+    def _drop_generation(self, bucket):
+        counters = self.counters
+        for key in self.generations.pop(bucket, ()):
+            counter = counters.get(key)
+            if counter is not None and counter[0] == bucket:
+                del counters[key]
+
+    def _expire(self, bucket):
+        if self.oldest is None:
+            return
+        cutoff = bucket - self.buckets
+        while self.oldest <= cutoff:
+            self._drop_generation(self.oldest)
+            self._advance_oldest()
+            if self.oldest is None:
+                return
+
+    def _advance_oldest(self):
+        self.oldest = min(self.generations) if self.generations else None
+
+    def _evict(self, bucket):
+        """Make room for a new key: expire, then drop just enough of the least recently updated keys."""
+        self._expire(bucket)
+        counters = self.counters
+        while len(counters) >= self.maxsize and self.oldest is not None:
+            generation = self.generations[self.oldest]
+            while generation and len(counters) >= self.maxsize:
+                key = generation.pop()
+                counter = counters.get(key)
+                if counter is not None and counter[0] == self.oldest:
+                    del counters[key]
+            if not generation:
+                del self.generations[self.oldest]
+                self._advance_oldest()
+
+    def count(self, key):
+        """Number of increments of ``key`` within the window."""
+        with self.lock:
+            return self._count(key, self.now())
+
+    def increment(self, key, amount=1):
+        """Add ``amount`` to ``key`` and return the new count."""
+        with self.lock:
+            return self._increment(key, self.now(), amount)
+
+    def check_and_increment(self, key, limit, amount=1):
+        """Atomically increment ``key`` if its count is below ``limit``.
+
+        Returns True if the increment was made (the cap allows another impression).
+        """
+        with self.lock:
+            bucket = self.now()
+            if self._count(key, bucket) >= limit:
+                return False
+            self._increment(key, bucket, amount)
+            return True
+
+    def counts(self, keys):
+        with self.lock:
+            bucket = self.now()
+            return [self._count(key, bucket) for key in keys]
+
+    def increment_many(self, keys, amount=1):
+        """Increment each of ``keys`` under a single lock, returning the new counts."""
+        with self.lock:
+            bucket = self.now()
+            return [self._increment(key, bucket, amount) for key in keys]
+
+    def check_and_increment_many(self, items, amount=1):
+        """Batch `check_and_increment` over ``(key, limit)`` pairs, returning a list of bools."""
+        results = []
+        with self.lock:
+            bucket = self.now()
+            for key, limit in items:
+                allowed = self._count(key, bucket) < limit
+                if allowed:
+                    self._increment(key, bucket, amount)
+                results.append(allowed)
+        return results
+
+    def expire(self):
+        """Drop keys that were not updated within the window."""
+        with self.lock:
+            self._expire(self.now())
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.generations.clear()
+            self.oldest = None
+
+    def snapshot(self, path):
+        """Write all live counters to ``path``, replacing it atomically."""
+        with self.lock:
+            self._expire(self.now())
+            entries = [[list(key) if isinstance(key, tuple) else key, counter.tolist()]
+                       for key, counter in six.iteritems(self.counters)]
+        data = {'window': self.window, 'buckets': self.buckets, 'counters': entries}
+        tmp = '{}.tmp'.format(path)
+        with codecs.open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+
+    def restore(self, path):
+        """Load counters written by `snapshot`, merging them into the store.
+
+        The snapshot must have been taken with the same window and bucket count.
+        """
+        with codecs.open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data['window'] != self.window or data['buckets'] != self.buckets:
+            raise ValueError('snapshot window does not match the store')
+        with self.lock:
+            bucket = self.now()
+            for key, values in data['counters']:
+                key = tuple(key) if isinstance(key, list) else key
+                counter = array('l', values)
+                if bucket - counter[0] >= self.buckets or key in self.counters:
+                    continue
+                if len(self.counters) >= self.maxsize:
+                    self._evict(bucket)
+                self.counters[key] = counter
+                self._touch(key, counter[0])
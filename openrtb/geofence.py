@@ -0,0 +1,172 @@
+"""
+Geofence matching for ``Geo.lat``/``Geo.lon``.
+
+Fences (circles and polygons) are bucketed into a grid of ``cell`` degree squares by
+their bounding boxes. A query looks up the one cell containing the point and runs the
+exact test (haversine distance or point-in-polygon) only on the fences in that cell.
+Polygons are tested in the plane of their lat/lon coordinates and must not cross the
+antimeridian.
+"""
+
+import math
+
+import six
+
+from .request import Device
+
+
+EARTH_RADIUS = 6371008.8
+
+#: Length of one degree of latitude in meters.
+DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in meters."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def point_in_polygon(lat, lon, points):
+    inside = False
+    j = len(points) - 1
+    for i in range(len(points)):
+        lat_i, lon_i = points[i]
+        lat_j, lon_j = points[j]
+        if (lat_i > lat) != (lat_j > lat) and \
+                lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+def location(obj):
+    """Return ``(lat, lon)`` of a `Geo`, a `Device` (its ``geo``) or a pair, or None."""
+    if isinstance(obj, tuple):
+        return obj
+    geo = obj.geo if isinstance(obj, Device) else obj
+    if geo is None or geo.lat is None or geo.lon is None:
+        return None
+    return geo.lat, geo.lon
+
+
+class Circle(object):
+
+    def __init__(self, lat, lon, radius):
+        self.lat = lat
+        self.lon = lon
+        self.radius = radius
+
+    def bounds(self):
+        dlat = self.radius / DEGREE
+        coslat = math.cos(math.radians(min(89.0, abs(self.lat) + dlat)))
+        dlon = min(180.0, self.radius / (DEGREE * coslat))
+        return self.lat - dlat, self.lon - dlon, self.lat + dlat, self.lon + dlon
+
+    def contains(self, lat, lon):
+        return haversine(self.lat, self.lon, lat, lon) <= self.radius
+
+
+class Polygon(object):
+
+    def __init__(self, points):
+        self.points = [tuple(p) for p in points]
+
+    def bounds(self):
+        lats = [p[0] for p in self.points]
+        lons = [p[1] for p in self.points]
+        return min(lats), min(lons), max(lats), max(lons)
+
+    def contains(self, lat, lon):
+        return point_in_polygon(lat, lon, self.points)
+
+
+class GeofenceIndex(object):
+
+    """A grid index of circle and polygon fences keyed by fence id."""
+
+    def __init__(self, cell=0.1):
+        self.cell = cell
+        self.columns = int(round(360 / cell))
+        self.grid = {}
+        self.fences = {}
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.fences)
+
+    def __contains__(self, fence_id):
+        return fence_id in self.fences
+
+    def cell_of(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell)) % self.columns
+
+    def covering(self, bounds):
+        min_lat, min_lon, max_lat, max_lon = bounds
+        row0, row1 = int(math.floor(min_lat / self.cell)), int(math.floor(max_lat / self.cell))
+        col0, col1 = int(math.floor(min_lon / self.cell)), int(math.floor(max_lon / self.cell))
+        if col1 - col0 >= self.columns:
+            col0, col1 = 0, self.columns - 1
+        return [(row, col % self.columns)
+                for row in range(row0, row1 + 1)
+                for col in range(col0, col1 + 1)]
+
+    def add(self, fence_id, fence):
+        if fence_id in self.fences:
+            self.remove(fence_id)
+        cells = self.covering(fence.bounds())
+        for cell in cells:
+            self.grid.setdefault(cell, []).append(fence_id)
+        self.fences[fence_id] = fence
+        self.cells[fence_id] = cells
+
+    def add_circle(self, fence_id, lat, lon, radius):
+        """Add a circular fence; ``radius`` is in meters."""
+        self.add(fence_id, Circle(lat, lon, radius))
+
+    def add_polygon(self, fence_id, points):
+        """Add a polygon fence given as a list of ``(lat, lon)`` vertices."""
+        self.add(fence_id, Polygon(points))
+
+    def remove(self, fence_id):
+        del self.fences[fence_id]
+        for cell in self.cells.pop(fence_id):
+            ids = self.grid[cell]
+            ids.remove(fence_id)
+            if not ids:
+                del self.grid[cell]
+
+    def candidates(self, lat, lon):
+        return self.grid.get(self.cell_of(lat, lon), ())
+
+    def query(self, obj):
+        """Return the ids of fences containing a `Geo`, a `Device` or a ``(lat, lon)`` pair."""
+        point = location(obj)
+        if point is None:
+            return []
+        lat, lon = point
+        fences = self.fences
+        return [fid for fid in self.candidates(lat, lon) if fences[fid].contains(lat, lon)]
+
+    def query_many(self, objs):
+        """Query many locations at once (e.g. from a log), returning one list per input.
+
+        Points are grouped by grid cell so each cell's candidates are looked up once.
+        """
+        by_cell = {}
+        results = []
+        for index, obj in enumerate(objs):
+            results.append([])
+            point = location(obj)
+            if point is not None:
+                by_cell.setdefault(self.cell_of(*point), []).append((index, point))
+        fences = self.fences
+        for cell, points in six.iteritems(by_cell):
+            candidates = [(fid, fences[fid]) for fid in self.grid.get(cell, ())]
+            if not candidates:
+                continue
+            for index, (lat, lon) in points:
+                results[index] = [fid for fid, fence in candidates if fence.contains(lat, lon)]
+        return results
@@ -0,0 +1,132 @@
+"""
+Minimal HTTP/1.1 message framing over asyncio streams, shared by `openrtb.server` and
+`openrtb.fanout`. Requires Python 3.5+.
+
+Only what OpenRTB traffic needs is supported: ``Content-Length`` and chunked bodies,
+keep-alive and pipelining (messages are read one after another from the same stream).
+"""
+
+import asyncio
+from collections import namedtuple
+
+
+#: Upper bound for the request/status line and headers.
+MAX_HEAD = 64 * 1024
+
+#: Upper bound for a body.
+MAX_BODY = 4 * 1024 * 1024
+
+REASONS = {
+    200: 'OK',
+    204: 'No Content',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+Message = namedtuple('Message', 'start headers body')
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message=None):
+        super(HTTPError, self).__init__(message or REASONS.get(status, 'Error'))
+        self.status = status
+
+
+async def read_message(reader):
+    """Read one request or response from ``reader``, or return None at a clean end of stream.
+
+    ``start`` is the split first line, header names are lowercased.
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HTTPError(400, 'Truncated message head')
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, 'Message head too large')
+    lines = head.decode('latin-1').split('\r\n')
+    start = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise HTTPError(400, 'Malformed header')
+            headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = await read_chunked(reader)
+    else:
+        length = headers.get('content-length')
+        try:
+            length = int(length) if length is not None else 0
+        except ValueError:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > MAX_BODY:
+            raise HTTPError(413)
+        try:
+            body = await reader.readexactly(length) if length else b''
+        except asyncio.IncompleteReadError:
+            raise HTTPError(400, 'Truncated body')
+    return Message(start, headers, body)
+
+
+async def read_chunked(reader):
+    chunks = []
+    size = 0
+    try:
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            try:
+                length = int(line.split(b';', 1)[0], 16)
+            except ValueError:
+                raise HTTPError(400, 'Invalid chunk size')
+            if not length:
+                # skip trailers
+                while (await reader.readuntil(b'\r\n')) != b'\r\n':
+                    pass
+                return b''.join(chunks)
+            size += length
+            if size > MAX_BODY:
+                raise HTTPError(413)
+            chunks.append(await reader.readexactly(length))
+            await reader.readexactly(2)
+    except asyncio.IncompleteReadError:
+        raise HTTPError(400, 'Truncated chunked body')
+
+
+def keep_alive(version, headers):
+    """Whether a connection stays open after this message."""
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+def response(status, body=b'', content_type='application/json', close=False, headers=()):
+    """Encode a complete HTTP/1.1 response."""
+    lines = ['HTTP/1.1 {} {}'.format(status, REASONS.get(status, 'Unknown'))]
+    if status != 204:
+        lines.append('Content-Length: {}'.format(len(body)))
+        if body:
+            lines.append('Content-Type: {}'.format(content_type))
+    if close:
+        lines.append('Connection: close')
+    lines.extend('{}: {}'.format(*h) for h in headers)
+    return '\r\n'.join(lines).encode('latin-1') + b'\r\n\r\n' + (body if status != 204 else b'')
+
+
+def request(method, path, host, body=b'', content_type='application/json', headers=()):
+    """Encode a complete HTTP/1.1 request."""
+    lines = ['{} {} HTTP/1.1'.format(method, path), 'Host: {}'.format(host),
+             'Content-Length: {}'.format(len(body))]
+    if body:
+        lines.append('Content-Type: {}'.format(content_type))
+    lines.extend('{}: {}'.format(*h) for h in headers)
+    return '\r\n'.join(lines).encode('latin-1') + b'\r\n\r\n' + body
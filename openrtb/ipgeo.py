@@ -0,0 +1,164 @@
+"""
+IP address to `Geo` enrichment from a local IP-range database.
+
+The source is a CSV file with ``start_ip,end_ip,country,region,city`` rows (IPv4 or
+IPv6, inclusive ranges). It is compiled into a binary table of sorted, fixed-width
+big-endian ranges that is searched in place, so a table opened with
+`IPDatabase.open` is memory-mapped and shared by every process that opens it.
+"""
+
+import codecs
+import csv
+import json
+import mmap
+import socket
+import struct
+from collections import namedtuple
+
+from . import constants
+from .lru import LRUCache
+from .request import Geo
+
+
+MAGIC = b'ORTBIPG1'
+HEADER = struct.Struct('>8sIII')
+V4_ENTRY = struct.Struct('>4s4sI')
+V6_ENTRY = struct.Struct('>16s16sI')
+
+_V4_MAPPED = b'\x00' * 10 + b'\xff\xff'
+
+Record = namedtuple('Record', 'country region city')
+
+
+def pack_ip(ip):
+    """Return an address as 4 (IPv4, including IPv4-mapped IPv6) or 16 big-endian bytes, or None."""
+    try:
+        return socket.inet_pton(socket.AF_INET, ip)
+    except (socket.error, ValueError, TypeError):
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except (socket.error, ValueError, TypeError):
+        return None
+    return packed[12:] if packed[:12] == _V4_MAPPED else packed
+
+
+def compile_csv(path):
+    """Compile a CSV range file into the binary table format."""
+    records = []
+    record_ids = {}
+    v4, v6 = [], []
+    with codecs.open(path, encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            start, end = pack_ip(row[0].strip()), pack_ip(row[1].strip())
+            if start is None or end is None or len(start) != len(end):
+                continue  # header or malformed row
+            record = tuple((row[i].strip() or None) if i < len(row) else None for i in (2, 3, 4))
+            if record not in record_ids:
+                record_ids[record] = len(records)
+                records.append(record)
+            (v4 if len(start) == 4 else v6).append((start, end, record_ids[record]))
+    v4.sort()
+    v6.sort()
+    blob = json.dumps(records).encode('utf-8')
+    return b''.join(
+        [HEADER.pack(MAGIC, len(v4), len(v6), len(blob))]
+        + [V4_ENTRY.pack(*entry) for entry in v4]
+        + [V6_ENTRY.pack(*entry) for entry in v6]
+        + [blob]
+    )
+
+
+def write_table(csv_path, table_path):
+    with open(table_path, 'wb') as f:
+        f.write(compile_csv(csv_path))
+
+
+class IPDatabase(object):
+
+    """Binary-search lookups over a compiled IP range table, with an LRU of hot addresses."""
+
+    def __init__(self, data, cache_size=100000):
+        magic, self.v4_count, self.v6_count, records_size = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError('not an IP range table')
+        self.data = data
+        self.v4_offset = HEADER.size
+        self.v6_offset = self.v4_offset + self.v4_count * V4_ENTRY.size
+        records_offset = self.v6_offset + self.v6_count * V6_ENTRY.size
+        raw = bytes(data[records_offset:records_offset + records_size]).decode('utf-8')
+        self.records = [Record(*r) for r in json.loads(raw)]
+        self.cache = LRUCache(cache_size)
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """Memory-map a table written by `write_table`."""
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, **kwargs)
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        return cls(compile_csv(path), **kwargs)
+
+    def __len__(self):
+        return self.v4_count + self.v6_count
+
+    def _search(self, key, offset, count, entry):
+        data = self.data
+        width = len(key)
+        size = entry.size
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * size
+            if data[start:start + width] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if not lo:
+            return None
+        _, end, record = entry.unpack_from(data, offset + (lo - 1) * size)
+        return self.records[record] if key <= end else None
+
+    def _lookup(self, ip):
+        key = pack_ip(ip)
+        if key is None:
+            return None
+        if len(key) == 4:
+            return self._search(key, self.v4_offset, self.v4_count, V4_ENTRY)
+        return self._search(key, self.v6_offset, self.v6_count, V6_ENTRY)
+
+    def lookup(self, ip):
+        """Return the `Record` for an IPv4 or IPv6 address string, or None."""
+        if not ip:
+            return None
+        return self.cache.get_or_compute(ip, self._lookup)
+
+
+def enrich(device, db):
+    """Fill missing ``Device.geo`` country, region and city from ``Device.ip``/``ipv6``.
+
+    Returns True if the device's geo was changed.
+    """
+    geo = device.geo
+    if geo is not None and geo.country and geo.region and geo.city:
+        return False
+    record = db.lookup(device.ip) or db.lookup(device.ipv6)
+    if record is None:
+        return False
+    if geo is None:
+        # the location source only describes a geo built entirely from the IP
+        device.geo = geo = Geo(type=constants.LocationType.IP)
+    changed = False
+    for name, value in zip(Record._fields, record):
+        if value and getattr(geo, name) is None:
+            setattr(geo, name, value)
+            changed = True
+    return changed
+
+
+def enrich_request(brq, db):
+    return brq.device is not None and enrich(brq.device, db)
@@ -0,0 +1,56 @@
+"""
+A small bounded least-recently-used cache.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    """A thread-safe mapping that evicts the least recently used key beyond ``maxsize`` entries."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, computing and storing it on a miss."""
+        marker = self.data
+        value = self.get(key, marker)
+        if value is marker:
+            value = compute(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
@@ -0,0 +1,103 @@
+"""
+Vectorized eligibility filtering of video and audio creatives.
+
+A `MediaCatalog` stores creative properties in NumPy arrays (enum lists as unsigned
+64-bit bitmasks), so checking a `Video` or `Audio` impression against the whole catalog
+is a handful of array operations. Requires NumPy (``pip install openrtb[numpy]``).
+"""
+
+import numpy
+
+from . import constants
+from .base import Object, Array, String, Field, EnumSet
+
+
+def bitmask(values):
+    """Fold enum values into a single ``numpy.uint64`` bitmask, leaving out values above 63."""
+    return numpy.uint64(EnumSet.to_mask(values))
+
+
+class MediaCreative(Object):
+
+    """A video or audio creative available for bidding."""
+
+    #: Creative ID.
+    id = Field(String, required=True)
+
+    #: MIME type of the creative file, checked against ``mimes``.
+    mime = Field(String, required=True)
+
+    #: Duration in seconds.
+    duration = Field(int)
+
+    #: Response protocol of the creative markup.
+    protocol = Field(constants.Protocol)
+
+    #: Bitrate in Kbps.
+    bitrate = Field(int)
+
+    #: Linear or non-linear (video only).
+    linearity = Field(constants.VideoLinearity)
+
+    #: API frameworks the creative requires.
+    api = Field(Array(constants.APIFramework))
+
+    #: Creative attributes, checked against ``battr``.
+    attr = Field(Array(constants.CreativeAttribute))
+
+
+class MediaCatalog(object):
+
+    """An immutable, array-backed catalog of `MediaCreative` objects."""
+
+    def __init__(self, creatives):
+        creatives = list(creatives)
+        self.ids = [c.id for c in creatives]
+        self.mime_codes = {}
+        for c in creatives:
+            self.mime_codes.setdefault(c.mime.lower(), len(self.mime_codes))
+        self.mime = numpy.array([self.mime_codes[c.mime.lower()] for c in creatives], dtype=numpy.int32)
+        self.duration = numpy.array([c.duration or 0 for c in creatives], dtype=numpy.int32)
+        self.protocol = numpy.array([bitmask([c.protocol]) if c.protocol else 0 for c in creatives],
+                                    dtype=numpy.uint64)
+        self.bitrate = numpy.array([c.bitrate or 0 for c in creatives], dtype=numpy.int32)
+        self.linearity = numpy.array([int(c.linearity or 0) for c in creatives], dtype=numpy.int8)
+        self.api = numpy.array([bitmask(c.api) for c in creatives], dtype=numpy.uint64)
+        self.attr = numpy.array([bitmask(c.attr) for c in creatives], dtype=numpy.uint64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def eligible(self, media):
+        """Return the indexes of creatives eligible for a `Video` or `Audio` object.
+
+        Unknown creative durations, protocols, bitrates and linearity do not exclude a creative.
+        """
+        ok = numpy.ones(len(self.ids), dtype=bool)
+        if media.mimes:
+            codes = [self.mime_codes[m.lower()] for m in media.mimes if m.lower() in self.mime_codes]
+            ok &= numpy.isin(self.mime, codes)
+        if media.minduration:
+            ok &= (self.duration == 0) | (self.duration >= media.minduration)
+        if media.maxduration:
+            ok &= self.duration <= media.maxduration
+        protocols = bitmask(media.protocols) | bitmask([media.protocol] if media.protocol else ())
+        if protocols:
+            ok &= (self.protocol == 0) | (self.protocol & protocols != 0)
+        if media.minbitrate:
+            ok &= (self.bitrate == 0) | (self.bitrate >= media.minbitrate)
+        if media.maxbitrate:
+            ok &= self.bitrate <= media.maxbitrate
+        if media.linearity:
+            ok &= (self.linearity == 0) | (self.linearity == int(media.linearity))
+        if media.api:
+            ok &= self.api & ~bitmask(media.api) == 0
+        else:
+            ok &= self.api == 0
+        if media.battr:
+            ok &= self.attr & bitmask(media.battr) == 0
+        return numpy.flatnonzero(ok)
+
+    def eligible_ids(self, media):
+        ids = self.ids
+        return [ids[i] for i in self.eligible(media)]
@@ -0,0 +1,231 @@
+"""
+Deep memory footprint of `Object` trees, by class and by field path.
+
+`footprint` walks an object (a `BidRequest`, a `BidResponse`...) through its fields,
+arrays, enums, decimals and raw ``ext``-style containers, counting each object once even
+if it is reachable through several paths. Objects shared with the whole process are not
+counted: None, booleans, small integers, classes and `Object.empty` instances. Attribute
+names are interned and not counted either. Block lists (`SetArray` fields) are counted
+in full, although identical lists are one `OrderedFrozenSet` shared between requests
+through a cache; their size is what a request would cost without that cache::
+
+    report = memory.footprint(brq)
+    report.total, report.by_class['request.Segment'], report.by_path['user.data.segment']
+
+`corpus` does the same for every request in a log file (one JSON request per line) and
+gives percentiles of the per-request sizes.
+"""
+
+import math
+import sys
+from collections import namedtuple
+
+import six
+
+from . import codec
+from .base import Object, Enum, EnumSet, OrderedFrozenSet, INTERNAL_ATTRIBUTES, ValidationError
+from .request import BidRequest
+
+
+#: Internal attributes that reference state outside of the tree.
+_SKIPPED_ATTRIBUTES = frozenset(['_frozen', '_track'])
+
+_CONTAINERS = (list, tuple, set, frozenset)
+
+ClassRow = namedtuple('ClassRow', 'name count bytes')
+PathRow = namedtuple('PathRow', 'path count bytes')
+
+
+def _class_name(cls):
+    if issubclass(cls, (Object, Enum)) and cls.__module__.startswith('openrtb.'):
+        return '{}.{}'.format(cls.__module__.rsplit('.', 1)[-1], cls.__name__)
+    return cls.__name__
+
+
+def _shared(value):
+    return (value is None or isinstance(value, (bool, type)) or
+            (type(value) is int and -5 <= value <= 256))
+
+
+class Footprint(object):
+
+    """Sizes in bytes accumulated over one or more trees.
+
+    ``by_class`` counts the objects themselves (including their attribute dictionaries);
+    ``by_path`` counts everything under each field path. Paths do not include array
+    indices: ``imp.banner.w`` adds up the banners of every impression.
+    """
+
+    def __init__(self):
+        self.total = 0
+        #: ``{class name: [count, bytes]}``.
+        self.by_class = {}
+        #: ``{dotted path: [count, bytes]}``.
+        self.by_path = {}
+        self.seen = set()
+
+    def _count_class(self, value, size):
+        name = _class_name(type(value))
+        row = self.by_class.get(name)
+        if row is None:
+            row = self.by_class[name] = [0, 0]
+        row[0] += 1
+        row[1] += size
+
+    def _size(self, value, path):
+        if _shared(value):
+            return 0
+        key = id(value)
+        if key in self.seen:
+            return 0
+        self.seen.add(key)
+
+        if isinstance(value, Object):
+            attributes = value.__dict__
+            if attributes.get('_frozen'):
+                return 0
+            own = sys.getsizeof(value) + sys.getsizeof(attributes)
+            self._count_class(value, own)
+            size = own
+            prefix = path + '.' if path else ''
+            for name, item in list(six.iteritems(attributes)):
+                if name in _SKIPPED_ATTRIBUTES:
+                    continue
+                item_size = self._size(item, prefix + name)
+                if item_size and name not in INTERNAL_ATTRIBUTES:
+                    row = self.by_path.get(prefix + name)
+                    if row is None:
+                        row = self.by_path[prefix + name] = [0, 0]
+                    row[0] += 1
+                    row[1] += item_size
+                size += item_size
+            return size
+
+        own = sys.getsizeof(value)
+        size = 0
+        if isinstance(value, Enum):
+            # the name is the class's own string and the value usually a small integer
+            own += sys.getsizeof(value.__dict__)
+            size = self._size(value.value, path)
+        elif isinstance(value, EnumSet):
+            size = self._size(value.mask, path) + self._size(value._order, path)
+        elif isinstance(value, OrderedFrozenSet):
+            # the set, the order tuple and the instance dictionary holding it
+            own += sys.getsizeof(value.__dict__)
+            size = self._size(value.order, path)
+        elif isinstance(value, dict):
+            for k, v in list(six.iteritems(value)):
+                size += self._size(k, path) + self._size(v, path)
+        elif isinstance(value, _CONTAINERS):
+            for item in list(value):
+                size += self._size(item, path)
+        self._count_class(value, own)
+        return own + size
+
+    def add(self, obj):
+        """Account for a tree; returns its size in bytes, not counting objects already seen."""
+        size = self._size(obj, '')
+        self.total += size
+        return size
+
+    def classes(self):
+        """`ClassRow` per class, largest first."""
+        rows = [ClassRow(name, count, size) for name, (count, size) in six.iteritems(self.by_class)]
+        return sorted(rows, key=lambda row: (-row.bytes, row.name))
+
+    def paths(self):
+        """`PathRow` per field path, largest first."""
+        rows = [PathRow(path, count, size) for path, (count, size) in six.iteritems(self.by_path)]
+        return sorted(rows, key=lambda row: (-row.bytes, row.path))
+
+    def format(self, limit=20):
+        """The largest classes and paths as a text table."""
+        lines = ['total {} bytes'.format(self.total), '',
+                 '{:<40} {:>8} {:>10}'.format('class', 'count', 'bytes')]
+        lines.extend('{:<40} {:>8} {:>10}'.format(*row) for row in self.classes()[:limit])
+        lines.extend(['', '{:<40} {:>8} {:>10}'.format('path', 'count', 'bytes')])
+        lines.extend('{:<40} {:>8} {:>10}'.format(*row) for row in self.paths()[:limit])
+        return '\n'.join(lines)
+
+
+def footprint(obj):
+    """The `Footprint` of a single tree."""
+    report = Footprint()
+    report.add(obj)
+    return report
+
+
+def percentile(values, q):
+    """The nearest-rank ``q`` quantile (0 to 1) of a sorted list of numbers, or None if empty."""
+    if not values:
+        return None
+    return values[max(0, min(len(values), int(math.ceil(q * len(values)))) - 1)]
+
+
+class CorpusReport(object):
+
+    """Per-request footprints over a corpus."""
+
+    def __init__(self):
+        #: Totals over every request (objects shared between requests count once per request).
+        self.footprint = Footprint()
+        #: Size in bytes of each request.
+        self.sizes = []
+        #: ``{dotted path: [bytes in each request that has it]}``.
+        self.path_sizes = {}
+        #: Lines that could not be decoded.
+        self.errors = 0
+
+    def add(self, obj):
+        report = footprint(obj)
+        self.sizes.append(report.total)
+        for path, (count, size) in six.iteritems(report.by_path):
+            self.path_sizes.setdefault(path, []).append(size)
+        total = self.footprint
+        total.total += report.total
+        for table, rows in ((total.by_class, report.by_class), (total.by_path, report.by_path)):
+            for name, (count, size) in six.iteritems(rows):
+                row = table.setdefault(name, [0, 0])
+                row[0] += count
+                row[1] += size
+        return report.total
+
+    def percentiles(self, qs=(0.5, 0.9, 0.99, 1.0), path=None):
+        """``{q: bytes}`` of the request sizes, or of the sizes at ``path``."""
+        values = sorted(self.sizes if path is None else self.path_sizes.get(path, ()))
+        return {q: percentile(values, q) for q in qs}
+
+    def percentile_values(self, qs, path=None):
+        values = self.percentiles(qs, path)
+        return [values[q] for q in qs]
+
+    def format(self, limit=20, qs=(0.5, 0.9, 0.99, 1.0)):
+        header = '{:<40} {:>8}'.format('path', 'requests') + ''.join(
+            ' {:>9}'.format('p{:g}'.format(q * 100)) for q in qs)
+        lines = ['{} requests, {} errors'.format(len(self.sizes), self.errors),
+                 '{:<40} {:>8}'.format('total', len(self.sizes)) + ''.join(
+                     ' {:>9}'.format(v) for v in self.percentile_values(qs)), '', header]
+        for row in self.footprint.paths()[:limit]:
+            values = self.percentile_values(qs, row.path)
+            lines.append('{:<40} {:>8}'.format(row.path, len(self.path_sizes[row.path])) +
+                         ''.join(' {:>9}'.format(v) for v in values))
+        return '\n'.join(lines)
+
+
+def corpus(lines, cls=BidRequest):
+    """A `CorpusReport` over JSON lines (an iterable of lines, or the path of a log file)."""
+    if isinstance(lines, six.string_types):
+        with open(lines, 'rb') as f:
+            return corpus(f, cls)
+    report = CorpusReport()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = codec.decode(cls, line)
+        except (ValueError, TypeError, AttributeError, ValidationError):
+            report.errors += 1
+            continue
+        report.add(obj)
+    return report
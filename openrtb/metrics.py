@@ -0,0 +1,321 @@
+"""
+Per-stage latency histograms with Prometheus text export.
+
+Latencies are recorded in log-linear buckets (16 per power of two nanoseconds, about 6%
+relative error, HDR-histogram style) into histograms owned by the recording thread, so
+recording takes no lock. `Registry.collect` merges the threads' histograms, and
+`Registry.dump`/`Registry.load` merge histograms across worker processes through files.
+
+``enable()`` times ``BidRequest.deserialize``, ``BidResponse.serialize`` and
+``macros.substitution``, and turns on `timer` for other stages::
+
+    metrics.enable()
+    with metrics.timer('targeting'):
+        ...
+    metrics.write_textfile('/var/lib/node_exporter/openrtb.prom')
+
+When disabled, nothing is wrapped and `timer` only checks a flag.
+"""
+
+import codecs
+import functools
+import json
+import os
+import threading
+import timeit
+
+import six
+from six.moves import BaseHTTPServer
+
+from . import macros
+from .request import BidRequest
+from .response import BidResponse
+
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+
+#: ``le`` bounds of the exported Prometheus buckets, in seconds: 1us to about 33s.
+EXPORT_BOUNDS = [2 ** k / 1e6 for k in range(26)]
+
+METRIC = 'openrtb_stage_seconds'
+
+clock = timeit.default_timer
+
+
+def bucket_of(ns):
+    """The bucket index of a latency in nanoseconds."""
+    if ns < SUB_BUCKETS:
+        return max(0, ns)
+    exp = ns.bit_length() - SUB_BITS - 1
+    return ((exp + 1) << SUB_BITS) + (ns >> exp) - SUB_BUCKETS
+
+
+def bucket_bound(index):
+    """The largest latency in nanoseconds that falls into a bucket."""
+    if index < SUB_BUCKETS:
+        return index
+    exp = (index >> SUB_BITS) - 1
+    mantissa = (index & (SUB_BUCKETS - 1)) + SUB_BUCKETS
+    return ((mantissa + 1) << exp) - 1
+
+
+class Histogram(object):
+
+    """Counts of latencies by log-linear bucket."""
+
+    __slots__ = ('counts', 'count', 'total')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        #: Sum of the recorded latencies in nanoseconds.
+        self.total = 0
+
+    def record(self, seconds):
+        ns = int(seconds * 1e9)
+        index = bucket_of(ns)
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.total += ns
+
+    def merge(self, other):
+        counts = self.counts
+        for index, count in six.iteritems(dict(other.counts)):
+            counts[index] = counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def quantile(self, q):
+        """Upper bound in seconds of the bucket holding the ``q`` quantile, or None if empty."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return bucket_bound(index) / 1e9
+        return bucket_bound(max(self.counts)) / 1e9
+
+    def cumulative(self, bounds=EXPORT_BOUNDS):
+        """Counts of latencies in buckets that end at or below each of ``bounds`` (seconds)."""
+        items = sorted((bucket_bound(index) / 1e9, count) for index, count in six.iteritems(self.counts))
+        result = []
+        seen = 0
+        i = 0
+        for bound in bounds:
+            while i < len(items) and items[i][0] <= bound:
+                seen += items[i][1]
+                i += 1
+            result.append(seen)
+        return result
+
+    def to_dict(self):
+        return {'counts': {str(k): v for k, v in six.iteritems(self.counts)},
+                'count': self.count, 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(k): v for k, v in six.iteritems(data['counts'])}
+        histogram.count = data['count']
+        histogram.total = data['total']
+        return histogram
+
+
+class Registry(object):
+
+    """Histograms by stage name, recorded per thread and merged on collection."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.shards = []
+        #: Histograms merged from other processes by `load`.
+        self.loaded = {}
+
+    def _shard(self):
+        shard = getattr(self.local, 'histograms', None)
+        if shard is None:
+            shard = self.local.histograms = {}
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def histogram(self, stage):
+        """This thread's histogram for ``stage``."""
+        shard = self._shard()
+        histogram = shard.get(stage)
+        if histogram is None:
+            histogram = shard[stage] = Histogram()
+        return histogram
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).record(seconds)
+
+    def collect(self):
+        """Return ``{stage: Histogram}`` merged across threads and loaded processes."""
+        merged = {}
+        with self.lock:
+            shards = list(self.shards)
+            loaded = list(six.iteritems(self.loaded))
+        for shard in shards:
+            for stage, histogram in six.iteritems(dict(shard)):
+                merged.setdefault(stage, Histogram()).merge(histogram)
+        for stage, histogram in loaded:
+            merged.setdefault(stage, Histogram()).merge(histogram)
+        return merged
+
+    def reset(self):
+        with self.lock:
+            for shard in self.shards:
+                shard.clear()
+            self.loaded = {}
+
+    def dump(self, path):
+        """Write this process's histograms to ``path`` for `load` in another process."""
+        data = {stage: h.to_dict() for stage, h in six.iteritems(self.collect())}
+        tmp = '{}.tmp'.format(path)
+        with codecs.open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+
+    def load(self, path):
+        """Merge histograms written by `dump` (e.g. by a worker process)."""
+        with codecs.open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        with self.lock:
+            for stage, histogram in six.iteritems(data):
+                self.loaded.setdefault(stage, Histogram()).merge(Histogram.from_dict(histogram))
+
+
+REGISTRY = Registry()
+
+_enabled = False
+_registry = REGISTRY
+_originals = {}
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def prometheus_text(histograms=None, metric=METRIC):
+    """Render histograms (the default registry's by default) in the Prometheus text format."""
+    if histograms is None:
+        histograms = REGISTRY.collect()
+    lines = ['# HELP {} Time spent in each processing stage.'.format(metric),
+             '# TYPE {} histogram'.format(metric)]
+    for stage in sorted(histograms):
+        histogram = histograms[stage]
+        label = 'stage="{}"'.format(stage.replace('\\', '\\\\').replace('"', '\\"'))
+        for bound, count in zip(EXPORT_BOUNDS, histogram.cumulative()):
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(metric, label, _format_bound(bound), count))
+        lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(metric, label, histogram.count))
+        lines.append('{}_sum{{{}}} {}'.format(metric, label, repr(histogram.total / 1e9)))
+        lines.append('{}_count{{{}}} {}'.format(metric, label, histogram.count))
+    return '\n'.join(lines) + '\n'
+
+
+def write_textfile(path, histograms=None):
+    """Write `prometheus_text` to ``path`` atomically (e.g. for the node exporter)."""
+    tmp = '{}.tmp'.format(path)
+    with codecs.open(tmp, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text(histograms))
+    os.rename(tmp, path)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = prometheus_text(self.server.registry.collect()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=0, registry=REGISTRY):
+    """Serve `prometheus_text` over HTTP from a daemon thread; returns the server."""
+    server = BaseHTTPServer.HTTPServer((host, port), _Handler)
+    server.registry = registry
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class timer(object):
+
+    """Time a block as ``stage`` while metrics are enabled."""
+
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = clock() if _enabled else None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            _registry.observe(self.stage, clock() - self.start)
+
+
+def _timed(stage, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _registry.observe(stage, clock() - start)
+    # lets base.profile_deserialize swap the function under the hook
+    wrapper.wrapped = function
+    wrapper.rewrap = functools.partial(_timed, stage)
+    return wrapper
+
+
+def enable(registry=REGISTRY):
+    """Start timing the built-in stages and `timer` blocks into ``registry``."""
+    global _enabled, _registry
+    _registry = registry
+    if _enabled:
+        return
+    _originals['deserialize'] = BidRequest.__dict__.get('deserialize')
+    _originals['serialize'] = BidResponse.__dict__.get('serialize')
+    _originals['macros'] = macros.substitution
+    deserialize = six.get_method_function(BidRequest.deserialize)
+    BidRequest.deserialize = classmethod(_timed('deserialize', deserialize))
+    BidResponse.serialize = _timed('serialize', BidResponse.serialize)
+    macros.substitution = _timed('macros', macros.substitution)
+    _enabled = True
+
+
+def disable():
+    """Remove the timing hooks."""
+    global _enabled
+    if not _enabled:
+        return
+    for cls, name in ((BidRequest, 'deserialize'), (BidResponse, 'serialize')):
+        if _originals[name] is None:
+            delattr(cls, name)
+        elif name == 'deserialize':
+            # base.profile_deserialize may have rebuilt the hook around another function
+            cls.deserialize = classmethod(cls.__dict__['deserialize'].__func__.wrapped)
+        else:
+            setattr(cls, name, _originals[name])
+    macros.substitution = _originals['macros']
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
@@ -0,0 +1,108 @@
+"""
+Pre-encoded no-bid responses for load shedding.
+
+Every no-bid payload (HTTP 204, or a JSON `BidResponse` with ``nbr`` for each
+`constants.NoBidReason`) is encoded once at import; answering a request only splices its
+``id`` into a template. `raw_id` finds the top-level ``id`` of a raw bid request without
+decoding the rest of it, so a request can be rejected before it is deserialized::
+
+    if overloaded:
+        return nobid.reject(body, NoBidReason.TECHNICAL_ERROR)
+"""
+
+import json
+import re
+
+import six
+
+from . import constants
+
+
+NO_CONTENT = b'HTTP/1.1 204 No Content\r\n\r\n'
+
+_BODY_PREFIX = b'{"id":'
+
+
+def _suffix(reason):
+    if reason is None:
+        return b',"seatbid":[]}'
+    return ',"seatbid":[],"nbr":{}}}'.format(int(reason)).encode('ascii')
+
+
+_BODY_SUFFIXES = {reason: _suffix(reason) for reason in [None] + list(constants.NoBidReason.values)}
+_HTTP_PREFIX = b'HTTP/1.1 200 OK\r\nContent-Length: '
+_HTTP_SEPARATOR = b'\r\nContent-Type: application/json\r\n\r\n'
+
+_TOKEN = re.compile(br'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+_VALUE = re.compile(br'\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)(?=\s*[,}])')
+_PLAIN_ID = re.compile(r'^[ !#-\[\]-~]*$')
+
+
+def encode_id(request_id):
+    """Encode a request id as a JSON string token."""
+    if isinstance(request_id, six.binary_type):
+        request_id = request_id.decode('utf-8')
+    request_id = six.text_type(request_id)
+    if _PLAIN_ID.match(request_id):
+        return b'"' + request_id.encode('ascii') + b'"'
+    return json.dumps(request_id).encode('ascii')
+
+
+def _quoted(token):
+    return token if token[:1] == b'"' else b'"' + token + b'"'
+
+
+def raw_id(data):
+    """Return the top-level ``id`` of a raw JSON bid request as an encoded JSON string token.
+
+    The token is returned as it appears in ``data`` (numeric ids are quoted), or None
+    if there is no top-level ``id`` or it is neither a string nor a number.
+    """
+    if data[:5] == b'{"id"':
+        # the common case: ``id`` is the first key
+        value = _VALUE.match(data, 5)
+        if value is not None:
+            return _quoted(value.group(1))
+    depth = 0
+    for match in _TOKEN.finditer(data):
+        token = match.group()
+        first = token[:1]
+        if first == b'"':
+            if depth == 1 and token == b'"id"':
+                value = _VALUE.match(data, match.end())
+                if value is not None:
+                    return _quoted(value.group(1))
+        elif first in (b'{', b'['):
+            depth += 1
+        else:
+            depth -= 1
+            if not depth:
+                return None
+    return None
+
+
+def body(id_token, reason=None):
+    """The JSON no-bid `BidResponse` for an encoded id and a `constants.NoBidReason` (or None)."""
+    suffix = _BODY_SUFFIXES.get(reason)
+    return _BODY_PREFIX + id_token + (suffix if suffix is not None else _suffix(reason))
+
+
+def response(id_token, reason=None):
+    """The complete HTTP response: 204 if ``reason`` is None, else 200 with `body`."""
+    if reason is None:
+        return NO_CONTENT
+    payload = body(id_token, reason)
+    return b''.join((_HTTP_PREFIX, str(len(payload)).encode('ascii'), _HTTP_SEPARATOR, payload))
+
+
+def reject(data, reason=None):
+    """Answer a raw bid request with a no-bid without deserializing it.
+
+    Falls back to 204 if the request has no readable ``id``.
+    """
+    if reason is None:
+        return NO_CONTENT
+    id_token = raw_id(data)
+    if id_token is None:
+        return NO_CONTENT
+    return response(id_token, reason)
@@ -0,0 +1,204 @@
+"""
+Reject bid requests from their raw bytes, before decoding them.
+
+A `Prefilter` declares reject rules on a few dotted object paths (``site.domain``,
+``app.bundle``, ``device.geo.country``, ``device.devicetype``...). Their values are read
+directly from the raw JSON: each key is located with `bytes.find` and its nesting is
+checked by counting the brackets before it with strings removed, using only bytes
+methods, so the rest of the document is never tokenized. Only requests that pass every
+rule are decoded::
+
+    prefilter = Prefilter()
+    prefilter.block('site.domain', domains.compile_domains(blocked_sites))
+    prefilter.allow('device.geo.country', ['USA', 'CAN'])
+    brq, rejection = prefilter.decode(body)
+
+Paths must go through objects only (not arrays).
+"""
+
+import json
+import re
+from collections import namedtuple
+
+from . import codec, nobid
+from .request import BidRequest
+
+
+Rule = namedtuple('Rule', 'path values allow missing reason')
+
+_COLON = re.compile(br'\s*:\s*')
+_NESTED = re.compile(br'\{[^{}\[\]]*\}|\[[^{}\[\]]*\]')
+_SCALAR = re.compile(br'"[^"\\]*(?:\\.[^"\\]*)*"|-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null')
+_BRACKETS = re.compile(br'[{}\[\]]')
+_WHITESPACE = re.compile(br'\s*')
+
+#: Every byte except quotes and brackets, dropped before looking at nesting.
+_NOT_STRUCTURAL = bytes(bytearray(c for c in range(256) if c not in bytearray(b'"{}[]')))
+
+
+def _skeleton(segment):
+    """The brackets of a span of JSON that starts outside of a string, with strings removed."""
+    if b'\\' in segment:
+        segment = segment.replace(b'\\\\', b'').replace(b'\\"', b'')
+    return b''.join(segment.translate(None, _NOT_STRUCTURAL).split(b'"')[::2])
+
+
+def _depth(segment):
+    skeleton = _skeleton(segment)
+    return skeleton.count(b'{') + skeleton.count(b'[') - skeleton.count(b'}') - skeleton.count(b']')
+
+
+def _encloses(data, start, end):
+    """Whether ``data[end]`` is directly inside the container opening at ``data[start]``."""
+    skeleton = _skeleton(data[start + 1:end])
+    while True:
+        skeleton, count = _NESTED.subn(b'', skeleton)
+        if not count:
+            return _BRACKETS.search(skeleton) is None
+
+
+def _members(data, start, keys, root):
+    """Offsets of the values of ``keys`` directly inside the object opening at ``data[start]``.
+
+    A quoted key followed by a colon can only be an object key in valid JSON, so candidates
+    are found with `bytes.find`. The root object only closes at the end of the document,
+    so for it the bracket depth of the preceding span is enough to check the nesting.
+    """
+    found = {}
+    for key in keys:
+        needle = b'"' + key.encode('ascii') + b'"'
+        pos = data.find(needle, start + 1)
+        while pos >= 0:
+            colon = _COLON.match(data, pos + len(needle))
+            if colon is not None and (_depth(data[start + 1:pos]) == 0 if root else
+                                      _encloses(data, start, pos)):
+                found[key] = colon.end()
+                break
+            pos = data.find(needle, pos + 1)
+    return found
+
+
+def _scalar(data, pos):
+    match = _SCALAR.match(data, pos)
+    if match is None:
+        return None
+    token = match.group()
+    try:
+        if token[:1] == b'"' and b'\\' not in token:
+            return token[1:-1].decode('utf-8')
+        return json.loads(token.decode('utf-8'))
+    except ValueError:
+        # invalid UTF-8 or escapes: treated as missing, the decoder rejects the request
+        return None
+
+
+def _resolve(data, start, tree, prefix, values, root=False):
+    found = _members(data, start, tree, root)
+    for key, subtree in tree.items():
+        pos = found.get(key)
+        path = prefix + key
+        if subtree is None:
+            values[path] = _scalar(data, pos) if pos is not None else None
+        elif pos is not None and data[pos:pos + 1] == b'{':
+            _resolve(data, pos, subtree, path + '.', values)
+        else:
+            _missing(subtree, path + '.', values)
+
+
+def _missing(tree, prefix, values):
+    for key, subtree in tree.items():
+        if subtree is None:
+            values[prefix + key] = None
+        else:
+            _missing(subtree, prefix + key + '.', values)
+
+
+def path_tree(paths):
+    """Nest dotted paths into ``{key: subtree or None}``."""
+    tree = {}
+    for path in paths:
+        node = tree
+        keys = path.split('.')
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+            if node is None:
+                raise ValueError('{} is both a value and an object path'.format(path))
+        if node.get(keys[-1], None) is not None:
+            raise ValueError('{} is both a value and an object path'.format(path))
+        node[keys[-1]] = None
+    return tree
+
+
+def extract(data, paths):
+    """Read the scalars at dotted ``paths`` (or a tree from `path_tree`) of a raw JSON object.
+
+    Returns ``{path: value}``, with None for paths that are missing or not scalars.
+    """
+    tree = paths if isinstance(paths, dict) else path_tree(paths)
+    values = {}
+    pos = _WHITESPACE.match(data).end()
+    if data[pos:pos + 1] == b'{':
+        _resolve(data, pos, tree, '', values, root=True)
+    else:
+        _missing(tree, '', values)
+    return values
+
+
+class Prefilter(object):
+
+    """Reject rules evaluated on raw bid requests."""
+
+    def __init__(self):
+        self.rules = []
+        self.tree = {}
+
+    @property
+    def paths(self):
+        return sorted(set(rule.path for rule in self.rules))
+
+    def _add(self, path, values, allow, missing, reason):
+        if not hasattr(values, '__contains__') or isinstance(values, (list, tuple)):
+            values = frozenset(values)
+        self.rules.append(Rule(path, values, allow, missing, reason))
+        self.tree = path_tree(self.paths)
+
+    def block(self, path, values, reason=None):
+        """Reject requests whose value at ``path`` is in ``values`` (any container, e.g. a `domains.DomainSet`).
+
+        ``reason`` is the `constants.NoBidReason` to answer with (204 if None).
+        """
+        self._add(path, values, False, False, reason)
+
+    def allow(self, path, values, reason=None, missing=True):
+        """Reject requests whose value at ``path`` is not in ``values``.
+
+        Requests without the value pass unless ``missing`` is false.
+        """
+        self._add(path, values, True, missing, reason)
+
+    def extract(self, data):
+        """Values of all rule paths in a raw request."""
+        return extract(data, self.tree)
+
+    def check(self, data):
+        """Return the first `Rule` that rejects the raw request ``data``, or None."""
+        values = extract(data, self.tree)
+        for rule in self.rules:
+            value = values[rule.path]
+            if value is None:
+                if rule.allow and not rule.missing:
+                    return rule
+                continue
+            if (value in rule.values) != rule.allow:
+                return rule
+        return None
+
+    def decode(self, data):
+        """Return ``(BidRequest, None)`` for a request that passes, or ``(None, response)``.
+
+        The response is the encoded no-bid HTTP response for the rejecting rule's reason.
+        """
+        rule = self.check(data)
+        if rule is not None:
+            return None, nobid.reject(data, rule.reason)
+        return codec.decode(BidRequest, data), None
@@ -0,0 +1,295 @@
+"""
+Fixed-point prices stored as integer micros (CPM * 10^6).
+
+`Price` parses wire values without going through `decimal`, compares and adds
+as plain integers, and interoperates with `Decimal` wherever a caller mixes the two.
+Call `use_micros()` to deserialize ``Bid.price``, ``Impression.bidfloor`` and
+``Deal.bidfloor`` as `Price` instead of `Decimal`/`float`.
+"""
+
+import math
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+import six
+
+from . import request
+from . import response
+from .base import ValidationError
+
+
+SCALE = 10 ** 6
+DIGITS = 6
+
+#: Floats below this magnitude are scaled with float arithmetic.
+MAX_FLOAT = 1e9
+
+
+def parse_micros(value):
+    """Convert a wire value (str, int, float or Decimal) to integer micros, exactly."""
+    if type(value) is float:
+        if -MAX_FLOAT < value < MAX_FLOAT:
+            # exact for any float whose shortest repr has at most six decimals
+            return int(round(value * SCALE))
+        value = repr(value)
+    elif isinstance(value, bool):
+        raise TypeError('price cannot be a bool')
+    elif isinstance(value, six.integer_types):
+        return value * SCALE
+    elif isinstance(value, float):
+        value = repr(value)
+    elif isinstance(value, Decimal):
+        return _decimal_micros(value)
+    elif isinstance(value, six.binary_type):
+        value = value.decode('ascii')
+    elif not isinstance(value, six.string_types):
+        raise TypeError('cannot convert {} to a price'.format(type(value)))
+
+    s = value.strip()
+    sign = 1
+    if s[:1] in ('-', '+'):
+        if s[0] == '-':
+            sign = -1
+        s = s[1:]
+    whole, _, frac = s.partition('.')
+    if (not (whole or frac) or len(frac) > DIGITS
+            or not (whole.isdigit() or not whole) or not (frac.isdigit() or not frac)):
+        # exponents, excess precision and garbage take the slow path
+        try:
+            return _decimal_micros(Decimal(value))
+        except InvalidOperation:
+            raise ValueError('invalid price: {!r}'.format(value))
+    return sign * (int(whole or 0) * SCALE + int(frac.ljust(DIGITS, '0') or 0))
+
+
+def _decimal_micros(value):
+    if not value.is_finite():
+        raise ValueError('invalid price: {!r}'.format(value))
+    return int(value.scaleb(DIGITS).to_integral_value(ROUND_HALF_EVEN))
+
+
+def _scaled(other):
+    """Return ``other`` multiplied by `SCALE` for comparison with micros."""
+    if isinstance(other, Price):
+        return other.micros
+    if isinstance(other, six.integer_types):
+        return other * SCALE
+    if isinstance(other, float):
+        return Decimal(other).scaleb(DIGITS)
+    if isinstance(other, Decimal):
+        return other.scaleb(DIGITS)
+    return NotImplemented
+
+
+class Price(object):
+
+    """A CPM price with six fractional digits, stored as an integer number of micros."""
+
+    __slots__ = ('micros',)
+
+    def __init__(self, value=0):
+        self.micros = value.micros if isinstance(value, Price) else parse_micros(value)
+
+    @classmethod
+    def from_micros(cls, micros):
+        price = cls.__new__(cls)
+        price.micros = int(micros)
+        return price
+
+    def to_decimal(self):
+        return Decimal(self.micros) / SCALE
+
+    def serialize(self):
+        return self.to_decimal()
+
+    def __getattr__(self, k):
+        # Decimal methods (quantize, is_zero, ...) for callers that expect a Decimal
+        if k.startswith('__'):
+            raise AttributeError(k)
+        return getattr(self.to_decimal(), k)
+
+    def __str__(self):
+        sign = '-' if self.micros < 0 else ''
+        whole, frac = divmod(abs(self.micros), SCALE)
+        if not frac:
+            return '{}{}'.format(sign, whole)
+        return '{}{}.{}'.format(sign, whole, str(frac).rjust(DIGITS, '0').rstrip('0'))
+
+    def __repr__(self):
+        return "{}('{}')".format(self.__class__.__name__, self)
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec) if spec else str(self)
+
+    def __round__(self, ndigits=None):
+        if ndigits is None:
+            return round(self.to_decimal())
+        return round(self.to_decimal(), ndigits)
+
+    def __floor__(self):
+        return math.floor(self.to_decimal())
+
+    def __ceil__(self):
+        return math.ceil(self.to_decimal())
+
+    def __trunc__(self):
+        return self.__int__()
+
+    def __float__(self):
+        return self.micros / float(SCALE)
+
+    def __int__(self):
+        micros = self.micros
+        return micros // SCALE if micros >= 0 else -(-micros // SCALE)
+
+    def __bool__(self):
+        return self.micros != 0
+
+    __nonzero__ = __bool__
+
+    def __hash__(self):
+        if not self.micros % SCALE:
+            return hash(self.micros // SCALE)
+        return hash(self.to_decimal())
+
+    def __eq__(self, other):
+        if type(other) is Price:
+            return self.micros == other.micros
+        if other is None:
+            return False
+        scaled = _scaled(other)
+        return scaled if scaled is NotImplemented else self.micros == scaled
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other):
+        if type(other) is Price:
+            return self.micros < other.micros
+        scaled = _scaled(other)
+        return scaled if scaled is NotImplemented else self.micros < scaled
+
+    def __le__(self, other):
+        if type(other) is Price:
+            return self.micros <= other.micros
+        scaled = _scaled(other)
+        return scaled if scaled is NotImplemented else self.micros <= scaled
+
+    def __gt__(self, other):
+        if type(other) is Price:
+            return self.micros > other.micros
+        scaled = _scaled(other)
+        return scaled if scaled is NotImplemented else self.micros > scaled
+
+    def __ge__(self, other):
+        if type(other) is Price:
+            return self.micros >= other.micros
+        scaled = _scaled(other)
+        return scaled if scaled is NotImplemented else self.micros >= scaled
+
+    def __neg__(self):
+        return Price.from_micros(-self.micros)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Price.from_micros(abs(self.micros))
+
+    def __add__(self, other):
+        if isinstance(other, (Price,) + six.integer_types):
+            return Price.from_micros(self.micros + _scaled(other))
+        if isinstance(other, Decimal):
+            return self.to_decimal() + other
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, (Price,) + six.integer_types):
+            return Price.from_micros(self.micros - _scaled(other))
+        if isinstance(other, Decimal):
+            return self.to_decimal() - other
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, six.integer_types):
+            return Price.from_micros(_scaled(other) - self.micros)
+        if isinstance(other, Decimal):
+            return other - self.to_decimal()
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, six.integer_types):
+            return Price.from_micros(self.micros * other)
+        if isinstance(other, Price):
+            return self.to_decimal() * other.to_decimal()
+        if isinstance(other, Decimal):
+            return self.to_decimal() * other
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Price):
+            return self.to_decimal() / other.to_decimal()
+        if isinstance(other, (Decimal,) + six.integer_types):
+            return self.to_decimal() / other
+        return NotImplemented
+
+    __div__ = __truediv__
+
+    def __rtruediv__(self, other):
+        if isinstance(other, (Decimal,) + six.integer_types):
+            return other / self.to_decimal()
+        return NotImplemented
+
+    __rdiv__ = __rtruediv__
+
+
+class FloatPrice(Price):
+
+    """A `Price` of a field declared as ``float`` (``Deal.bidfloor``), serialized back as a float."""
+
+    __slots__ = ()
+
+    def serialize(self):
+        return float(self)
+
+
+#: Fields that `use_micros` switches to `Price`.
+PRICE_FIELDS = [
+    (response.Bid, 'price'),
+    (request.Impression, 'bidfloor'),
+    (request.Deal, 'bidfloor'),
+]
+
+_original_deserializers = {(cls, name): cls._deserializers[name] for cls, name in PRICE_FIELDS}
+
+
+def _deserializer(price_class):
+    def deserialize(raw_data):
+        try:
+            return price_class(raw_data)
+        except (ValueError, TypeError):
+            raise ValidationError('should be convertible to a price, got {!r} instead'.format(raw_data))
+    return deserialize
+
+
+_deserialize = _deserializer(Price)
+_deserialize_float = _deserializer(FloatPrice)
+
+
+def use_micros(enabled=True):
+    """Deserialize price fields as `Price` (or restore the defaults if ``enabled`` is false).
+
+    Fields declared as ``float`` get a `FloatPrice`, which serializes back to a float.
+    """
+    for cls, name in PRICE_FIELDS:
+        if not enabled:
+            deserialize = _original_deserializers[(cls, name)]
+        elif cls._fields[name].datatype is float:
+            deserialize = _deserialize_float
+        else:
+            deserialize = _deserialize
+        cls._deserializers[name] = deserialize
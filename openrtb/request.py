@@ -8,7 +8,7 @@ and may optionally include additional objects providing impression context.
 from decimal import Decimal
 
 from . import constants
-from .base import Object, Array, String, Field
+from .base import Object, Array, SetArray, String, Field, EnumSet, memoized
 
 
 class Publisher(Object):
@@ -121,6 +121,7 @@ class Geo(Object):
     #: Placeholder for exchange-specific extensions to OpenRTB.
     ext = Field(Object)
 
+    @memoized
     def loc(self):
         if self.lat and self.lon:
             return self.lat, self.lon
@@ -333,8 +334,9 @@ class Device(Object):
     ext = Field(Object)
 
     def get_geo(self):
-        return self.geo or Geo()
+        return self.geo or Geo.empty()
 
+    @memoized
     def is_on_cellular(self):
         return self.connectiontype and self.connectiontype.is_cellular()
 
@@ -650,9 +652,13 @@ class Banner(Object):
     #: Placeholder for exchange-specific extensions to OpenRTB.
     ext = Field(Object)
 
+    @memoized
     def blocked_types(self):
-        return set(self.btype or [])
+        if isinstance(self.btype, EnumSet):
+            return self.btype
+        return frozenset(self.btype or [])
 
+    @memoized
     def size(self):
         if self.w and self.h:
             return self.w, self.h
@@ -948,11 +954,11 @@ class Deal(Object):
     #: Whitelist of buyer seats allowed to bid on this deal. Seat IDs must be
     #: communicated between bidders and the exchange a priori. Omission implies
     #: no seat restrictions.
-    wseat = Field(Array(String))
+    wseat = Field(SetArray(String))
 
     #: Array of advertiser domains (e.g., advertiser.com) allowed to bid on
     #: this deal. Omission implies no advertiser restrictions.
-    wadomain = Field(Array(String))
+    wadomain = Field(SetArray(String))
 
     #: Placeholder for exchange-specific extensions to OpenRTB.
     ext = Field(Object)
@@ -1121,9 +1127,9 @@ class BidRequest(Object):
     #: Whitelist of buyer seats allowed to bid on this impression. Seat IDs
     #: must be communicated between bidders and the exchange a priori. Omission
     #: implies no seat restrictions.
-    wseat = Field(Array(String))
+    wseat = Field(SetArray(String))
 
-    bseat = Field(Array(String))
+    bseat = Field(SetArray(String))
 
     #: Flag to indicate if Exchange can verify that the impressions offered
     #: represent all of the impressions available in context (e.g., all on the
@@ -1137,16 +1143,16 @@ class BidRequest(Object):
     #: currencies.
     cur = Field(Array(String))
 
-    wlang = Field(Array(String))
+    wlang = Field(SetArray(String))
 
     #: Blocked advertiser categories using the IAB content categories. Refer
     #: to List 5.1.
-    bcat = Field(Array(String))
+    bcat = Field(SetArray(String))
 
     #: Block list of advertisers by their domains (e.g., “ford.com”).
-    badv = Field(Array(String))
+    badv = Field(SetArray(String))
 
-    bapp = Field(Array(String))
+    bapp = Field(SetArray(String))
 
     source = Field(Source)
 
@@ -1158,16 +1164,16 @@ class BidRequest(Object):
     ext = Field(Object)
 
     def get_app(self):
-        return self.app or App()
+        return self.app or App.empty()
 
     def get_site(self):
-        return self.site or Site()
+        return self.site or Site.empty()
 
     def get_device(self):
-        return self.device or Device()
+        return self.device or Device.empty()
 
     def get_user(self):
-        return self.user or User()
+        return self.user or User.empty()
 
     @staticmethod
     def minimal(id, imp_id):
@@ -0,0 +1,181 @@
+"""
+An asyncio HTTP/1.1 bidder endpoint. Requires Python 3.5+.
+
+``BidderServer(handler)`` accepts POSTed bid requests, deserializes them into `BidRequest`
+and awaits ``handler(brq, deadline)``, where ``deadline`` is an event loop time derived
+from ``BidRequest.tmax`` minus the network budget. The handler returns a `BidResponse`,
+or None for a no-bid (HTTP 204). A handler that misses the deadline is cancelled and the
+request is answered with 204, or with a `BidResponse` carrying ``timeout_nbr`` if set.
+
+Connections are kept alive and pipelined requests are answered in order.
+"""
+
+import asyncio
+import collections
+import logging
+
+from . import codec, httpio, nobid
+from .base import ValidationError
+from .request import BidRequest
+
+
+log = logging.getLogger(__name__)
+
+
+class BidderServer(object):
+
+    def __init__(self, handler, network_budget=20, default_tmax=100, timeout_nbr=None, path=None,
+                 max_pipeline=16, prefilter=None, admission=None, shed_nbr=None):
+        #: ``async def handler(brq, deadline)``.
+        self.handler = handler
+        #: Milliseconds of ``tmax`` reserved for the network round trip.
+        self.network_budget = network_budget
+        #: ``tmax`` in milliseconds for requests that do not set it.
+        self.default_tmax = default_tmax
+        #: `constants.NoBidReason` to answer with on a missed deadline instead of 204.
+        self.timeout_nbr = timeout_nbr
+        #: Only accept requests to this path, if set.
+        self.path = path
+        #: Pipelined requests handled at once on one connection.
+        self.max_pipeline = max_pipeline
+        #: A `prefilter.Prefilter` applied to raw bodies before they are decoded.
+        self.prefilter = prefilter
+        #: An `admission.AdmissionControl` that sees each raw body (with the path as the
+        #: exchange) and the latency of each request passed to the handler.
+        self.admission = admission
+        #: `constants.NoBidReason` to answer shed requests with instead of 204.
+        self.shed_nbr = shed_nbr
+        self.server = None
+        self.requests = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def deadline(self, brq, received):
+        """Loop time by which the handler must produce a response."""
+        tmax = brq.tmax or self.default_tmax
+        return received + max(0, tmax - self.network_budget) / 1000.0
+
+    async def start(self, host='127.0.0.1', port=0, **kwargs):
+        self.server = await asyncio.start_server(self.serve, host, port, **kwargs)
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        self.server.close()
+
+    async def wait_closed(self):
+        await self.server.wait_closed()
+
+    def no_bid(self, brq):
+        return nobid.response(nobid.encode_id(brq.id), self.timeout_nbr)
+
+    async def process(self, message, received):
+        """Produce the encoded HTTP response for one request message."""
+        method, path = message.start[0], message.start[1] if len(message.start) > 1 else ''
+        if self.path is not None and path.split('?', 1)[0] != self.path:
+            return httpio.response(404)
+        if method != 'POST':
+            return httpio.response(405, headers=[('Allow', 'POST')])
+        try:
+            if self.admission is not None and self.admission.admit(message.body, path) is not None:
+                return nobid.reject(message.body, self.shed_nbr)
+            if self.prefilter is not None:
+                brq, rejection = self.prefilter.decode(message.body)
+                if rejection is not None:
+                    self.rejected += 1
+                    return rejection
+            else:
+                brq = codec.decode(BidRequest, message.body)
+        except (ValueError, TypeError, AttributeError, ValidationError) as e:
+            self.errors += 1
+            return httpio.response(400, str(e).encode('utf-8'), content_type='text/plain')
+
+        loop = asyncio.get_event_loop()
+        timeout = self.deadline(brq, received) - loop.time()
+        try:
+            bid_response = await asyncio.wait_for(self.handler(brq, received + timeout), max(0, timeout))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return self.no_bid(brq)
+        except Exception:
+            self.errors += 1
+            log.exception('Bid handler failed')
+            return httpio.response(500)
+        finally:
+            # shed and rejected requests are cheap and would hide the load
+            if self.admission is not None:
+                self.admission.observe(loop.time() - received)
+        if bid_response is None:
+            return httpio.response(204)
+        try:
+            body = codec.dumps(bid_response)
+        except Exception:
+            self.errors += 1
+            log.exception('Bid response could not be encoded')
+            return httpio.response(500)
+        return httpio.response(200, body)
+
+    async def answer(self, message, received, close, previous, writer):
+        failed = False
+        try:
+            data = await self.process(message, received)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the connection state is unknown, answer and drop it
+            self.errors += 1
+            log.exception('Request failed')
+            data, close, failed = httpio.response(500), True, True
+        if previous is not None:
+            await previous
+        if close:
+            data = data.replace(b'\r\n\r\n', b'\r\nConnection: close\r\n\r\n', 1)
+        writer.write(data)
+        await writer.drain()
+        if failed:
+            writer.close()
+
+    async def serve(self, reader, writer):
+        loop = asyncio.get_event_loop()
+        # pipelined requests are handled concurrently, each response waits for the previous one
+        pending = collections.deque()
+        try:
+            while True:
+                try:
+                    message = await httpio.read_message(reader)
+                except httpio.HTTPError as e:
+                    if pending:
+                        await pending[-1]
+                    writer.write(httpio.response(e.status, str(e).encode('utf-8'),
+                                                 content_type='text/plain', close=True))
+                    break
+                if message is None:
+                    break
+                received = loop.time()
+                self.requests += 1
+                version = message.start[2] if len(message.start) > 2 else 'HTTP/1.0'
+                close = not httpio.keep_alive(version, message.headers)
+                previous = pending[-1] if pending else None
+                pending.append(loop.create_task(self.answer(message, received, close, previous, writer)))
+                while pending and (pending[0].done() or len(pending) > self.max_pipeline):
+                    await pending.popleft()
+                if close:
+                    break
+            if pending:
+                await pending[-1]
+        except (ConnectionError, asyncio.CancelledError):
+            for task in pending:
+                task.cancel()
+        finally:
+            writer.close()
+
+
+async def serve(handler, host='127.0.0.1', port=0, **kwargs):
+    """Start a `BidderServer` and return it."""
+    server = BidderServer(handler, **kwargs)
+    await server.start(host, port)
+    return server
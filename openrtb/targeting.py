@@ -0,0 +1,216 @@
+"""
+Inverted index for matching bid requests against many targeting expressions.
+
+Expressions are built from clauses over dotted `BidRequest` paths, for example::
+
+    ('and',
+        ('in', 'device.geo.country', ['USA', 'CAN']),
+        ('in', 'imp.banner.size', [(300, 250), (728, 90)]),
+        ('not', ('in', 'user.data.segment.id', ['opted-out'])))
+
+``in`` matches when any value found at the path is one of the listed values; a bare
+string or tuple counts as a single value. Strings are compared case-insensitively.
+Paths walk through arrays and call zero-argument helpers such as ``Banner.size``.
+A dict ``{path: values}`` is shorthand for an ``and`` of ``in`` clauses.
+
+Every expression is rewritten into disjunctive normal form and each conjunction is
+stored in posting lists keyed by ``(path, value)``. Matching a request only touches
+the postings of values actually present in it.
+"""
+
+import itertools
+
+import six
+
+from .base import Enum, EnumSet
+
+
+def normalize(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, six.string_types):
+        return value.lower()
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def extract(obj, path):
+    """Return all non-empty values found at a dotted ``path`` under ``obj``."""
+    values = [obj]
+    for part in path.split('.'):
+        found = []
+        for value in values:
+            attr = getattr(value, part, None)
+            if callable(attr):
+                attr = attr()
+            if attr is None:
+                continue
+            if isinstance(attr, (list, set, frozenset, EnumSet)):
+                found.extend(a for a in attr if a is not None)
+            else:
+                found.append(attr)
+        values = found
+        if not values:
+            break
+    return values
+
+
+def to_dnf(expr, negate=False):
+    """Rewrite an expression into a list of conjunctions of ``(path, values, negated)`` clauses."""
+    if isinstance(expr, dict):
+        expr = ('and',) + tuple(('in', path, values) for path, values in sorted(six.iteritems(expr)))
+    op = expr[0]
+    if op in ('in', 'not in'):
+        _, path, values = expr
+        if isinstance(values, (six.string_types, tuple)):
+            values = [values]
+        clause = (path, frozenset(normalize(v) for v in values), negate != (op == 'not in'))
+        return [[clause]]
+    if op == 'not':
+        return to_dnf(expr[1], not negate)
+    if op not in ('and', 'or'):
+        raise ValueError('unknown targeting operator: {!r}'.format(op))
+    children = [to_dnf(child, negate) for child in expr[1:]]
+    if (op == 'and') != negate:
+        return [list(itertools.chain.from_iterable(parts)) for parts in itertools.product(*children)]
+    return list(itertools.chain.from_iterable(children))
+
+
+def evaluate(expr, brq):
+    """Evaluate a single expression against a request without an index."""
+    for clauses in to_dnf(expr):
+        for path, values, negated in clauses:
+            found = not values.isdisjoint(normalize(v) for v in extract(brq, path))
+            if found == negated:
+                break
+        else:
+            return True
+    return False
+
+
+class TargetingIndex(object):
+
+    """An incrementally updatable index of targeting expressions keyed by line item id.
+
+    Positive postings are grouped by the size of the conjunction and the position of
+    the clause inside it, so a conjunction of ``k`` clauses matches exactly when it is
+    in the intersection of its ``k`` position unions. All of this is done with set
+    operations rather than per-conjunction counters.
+    """
+
+    def __init__(self):
+        self.include = {}
+        self.exclude = {}
+        self.unconditional = set()
+        self.conjunctions = {}
+        self.line_items = {}
+        self.paths = {}
+        self._ids = itertools.count()
+
+    def __len__(self):
+        return len(self.line_items)
+
+    def __contains__(self, line_item):
+        return line_item in self.line_items
+
+    def _paths(self, clauses, delta):
+        for path, _, _ in clauses:
+            count = self.paths.get(path, 0) + delta
+            if count:
+                self.paths[path] = count
+            else:
+                del self.paths[path]
+
+    @staticmethod
+    def _split(clauses):
+        positive = [c for c in clauses if not c[2]]
+        negative = [c for c in clauses if c[2]]
+        return positive, negative
+
+    def add(self, line_item, expr):
+        """Add (or replace) the targeting expression of a line item."""
+        if line_item in self.line_items:
+            self.remove(line_item)
+        ids = []
+        for clauses in to_dnf(expr):
+            cid = next(self._ids)
+            positive, negative = self._split(clauses)
+            size = len(positive)
+            for position, (path, values, _) in enumerate(positive):
+                for value in values:
+                    slots = self.include.setdefault((path, value), {})
+                    slots.setdefault((size, position), set()).add(cid)
+            for path, values, _ in negative:
+                for value in values:
+                    self.exclude.setdefault((path, value), set()).add(cid)
+            if not size:
+                self.unconditional.add(cid)
+            self.conjunctions[cid] = (line_item, clauses)
+            self._paths(clauses, 1)
+            ids.append(cid)
+        self.line_items[line_item] = ids
+
+    def remove(self, line_item):
+        for cid in self.line_items.pop(line_item):
+            _, clauses = self.conjunctions.pop(cid)
+            self.unconditional.discard(cid)
+            positive, negative = self._split(clauses)
+            size = len(positive)
+            for position, (path, values, _) in enumerate(positive):
+                for value in values:
+                    slots = self.include[(path, value)]
+                    cids = slots[(size, position)]
+                    cids.discard(cid)
+                    if not cids:
+                        del slots[(size, position)]
+                        if not slots:
+                            del self.include[(path, value)]
+            for path, values, _ in negative:
+                for value in values:
+                    cids = self.exclude[(path, value)]
+                    cids.discard(cid)
+                    if not cids:
+                        del self.exclude[(path, value)]
+            self._paths(clauses, -1)
+
+    def attributes(self, brq):
+        """Return the ``(path, value)`` keys present in a request for every indexed path."""
+        keys = set()
+        for path in self.paths:
+            for value in extract(brq, path):
+                keys.add((path, normalize(value)))
+        return keys
+
+    def match(self, brq):
+        """Return the set of line items whose targeting matches ``brq``."""
+        keys = self.attributes(brq)
+        include, exclude = self.include, self.exclude
+
+        positions = {}
+        excluded = set()
+        for key in keys:
+            slots = include.get(key)
+            if slots:
+                for slot, cids in six.iteritems(slots):
+                    positions.setdefault(slot, []).append(cids)
+            cids = exclude.get(key)
+            if cids:
+                excluded.update(cids)
+
+        matched = self.unconditional - excluded
+        sizes = set(size for size, _ in positions)
+        for size in sizes:
+            unions = []
+            for position in range(size):
+                postings = positions.get((size, position))
+                if postings is None:
+                    break
+                unions.append(set().union(*postings) if len(postings) > 1 else postings[0])
+            else:
+                unions.sort(key=len)
+                found = unions[0].intersection(*unions[1:])
+                matched.update(found - excluded if excluded else found)
+
+        conjunctions = self.conjunctions
+        return set(conjunctions[cid][0] for cid in matched)
@@ -0,0 +1,182 @@
+"""
+Learn which fields of a `BidRequest` a service actually reads.
+
+A `FieldTracker` samples a fraction of requests. The objects of a sampled request are
+switched to tracking subclasses of their classes (so ``isinstance`` checks still hold)
+that record every field read by dotted path, e.g. ``imp.banner.w``. Requests that are not
+sampled are not touched and cost nothing. The aggregated counts yield a projection spec
+that `deserialize` uses to decode only those fields::
+
+    tracker = FieldTracker(rate=0.01)
+    brq = BidRequest.deserialize(data)
+    tracker.sample(brq)
+    ...
+    spec = tracker.projection(BidRequest)
+    brq = tracking.deserialize(BidRequest, data, spec)
+"""
+
+import random
+import threading
+
+import six
+
+from .base import Object, Array
+
+
+_tracked_classes = {}
+_lock = threading.Lock()
+
+
+def _tracking_class(cls):
+    tracked = _tracked_classes.get(cls)
+    if tracked is not None:
+        return tracked
+
+    def __getattribute__(self, name):
+        d = object.__getattribute__(self, '__dict__')
+        if name in d and name[:1] != '_':
+            prefix, tracker, seen = d['_track']
+            tracker.record(prefix + name, seen)
+        return super(tracked, self).__getattribute__(name)
+
+    with _lock:
+        tracked = _tracked_classes.get(cls)
+        if tracked is None:
+            tracked = type(cls)('Tracked' + cls.__name__, (cls,), {
+                '__getattribute__': __getattribute__,
+                '__module__': cls.__module__,
+            })
+            # share the field tables, which are not inherited
+            for table in ('_fields', '_deserializers', '_defaults', '_required'):
+                setattr(tracked, table, getattr(cls, table))
+            tracked.untracked = cls
+            _tracked_classes[cls] = tracked
+    return tracked
+
+
+def _walk(obj, prefix, visit):
+    if obj.__dict__.get('_frozen'):
+        # shared `Object.empty` instances are never tracked
+        return
+    visit(obj, prefix)
+    for name, value in list(six.iteritems(obj.__dict__)):
+        if name[:1] == '_':
+            continue
+        if isinstance(value, Object):
+            _walk(value, prefix + name + '.', visit)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, Object):
+                    _walk(item, prefix + name + '.', visit)
+
+
+def _child_class(cls, name):
+    field = cls._fields.get(name)
+    datatype = field.datatype if field is not None else None
+    if isinstance(datatype, Array):
+        datatype = datatype.datatype
+    if isinstance(datatype, type) and issubclass(datatype, Object):
+        return datatype
+    return None
+
+
+class FieldTracker(object):
+
+    """Samples requests and counts field reads by dotted path."""
+
+    def __init__(self, rate=0.01, seed=None):
+        self.rate = rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        #: Number of sampled requests.
+        self.requests = 0
+        #: ``{path: number of reads}``.
+        self.reads = {}
+        #: ``{path: number of sampled requests that read it}``.
+        self.request_counts = {}
+
+    def record(self, path, seen):
+        with self.lock:
+            self.reads[path] = self.reads.get(path, 0) + 1
+            if path not in seen:
+                seen.add(path)
+                self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def sample(self, obj, force=False):
+        """Track field reads on ``obj`` (and everything it contains) with probability ``rate``.
+
+        Returns True if the object is being tracked.
+        """
+        if not force and self.random.random() >= self.rate:
+            return False
+        seen = set()
+
+        def visit(item, prefix):
+            item.__dict__['_track'] = (prefix, self, seen)
+            item.__class__ = _tracking_class(type(item))
+
+        _walk(obj, '', visit)
+        with self.lock:
+            self.requests += 1
+        return True
+
+    def release(self, obj):
+        """Stop tracking ``obj``, restoring the original classes."""
+        def visit(item, prefix):
+            item.__dict__.pop('_track', None)
+            item.__class__ = getattr(type(item), 'untracked', type(item))
+
+        _walk(obj, '', visit)
+
+    def paths(self, min_fraction=0.0):
+        """Paths read in at least ``min_fraction`` of the sampled requests, most read first."""
+        with self.lock:
+            counts = list(six.iteritems(self.request_counts))
+        threshold = min_fraction * self.requests
+        return [path for path, count in sorted(counts, key=lambda item: (-item[1], item[0]))
+                if count >= threshold and count]
+
+    def projection(self, cls, min_fraction=0.0):
+        """A projection spec for ``cls`` covering the paths read in ``min_fraction`` of requests.
+
+        The spec maps field names to True (decode the whole value) or to a nested spec.
+        Required fields are always included.
+        """
+        spec = {}
+        for path in self.paths(min_fraction):
+            node = spec
+            names = path.split('.')
+            for name in names[:-1]:
+                child = node.get(name)
+                if not isinstance(child, dict):
+                    child = node[name] = {}
+                node = child
+            node.setdefault(names[-1], True)
+        return _with_required(cls, spec)
+
+
+def _with_required(cls, spec):
+    spec = dict(spec)
+    for name in cls._required:
+        spec.setdefault(name, True)
+    for name, child in list(six.iteritems(spec)):
+        child_cls = _child_class(cls, name)
+        if isinstance(child, dict) and child_cls is not None:
+            spec[name] = _with_required(child_cls, child)
+    return spec
+
+
+def project(raw_data, spec):
+    """Drop the keys of raw (decoded JSON) data that are not in a projection spec."""
+    if spec is True:
+        return raw_data
+    if isinstance(raw_data, list):
+        return [project(item, spec) for item in raw_data]
+    if not isinstance(raw_data, dict):
+        return raw_data
+    return {k: project(v, spec[k]) for k, v in six.iteritems(raw_data) if k in spec}
+
+
+def deserialize(cls, raw_data, spec):
+    """Deserialize only the fields in a projection spec."""
+    return cls.deserialize(project(raw_data, spec))
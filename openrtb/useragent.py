@@ -0,0 +1,107 @@
+"""
+User agent parsing for ``Device.ua``.
+
+Rules are loaded from a JSON file (``openrtb/data/useragents.json`` by default) of the form
+``{"rules": [{"contains": "...", "regex": "...", "os": "...", "osv": "{1}.{2}"}, ...]}``.
+Each rule fills any of ``make``, ``model``, ``os`` and ``osv`` that no earlier rule has
+filled; values are `str.format` templates over the regex groups. The optional
+``contains`` literal is checked before the regex, so most rules cost one substring test.
+Parsed results are kept in an LRU keyed by the raw user agent, as a small number of
+distinct user agents makes up most traffic.
+"""
+
+import codecs
+import json
+import os
+import re
+from collections import namedtuple
+
+from .lru import LRUCache
+
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'useragents.json')
+
+UserAgent = namedtuple('UserAgent', 'make model os osv')
+
+_parser = None
+
+
+class Rule(object):
+
+    def __init__(self, regex, contains=None, **fields):
+        unknown = set(fields) - set(UserAgent._fields)
+        if unknown:
+            raise ValueError('Unknown user agent fields: {}'.format(', '.join(sorted(unknown))))
+        self.regex = re.compile(regex)
+        self.contains = contains
+        self.fields = fields
+
+    def apply(self, ua, result):
+        """Fill the fields of ``result`` that are still missing if the rule matches ``ua``."""
+        if self.contains is not None and self.contains not in ua:
+            return
+        match = self.regex.search(ua)
+        if match is None:
+            return
+        groups = [g or '' for g in match.groups()]
+        for name, template in self.fields.items():
+            if name not in result:
+                value = template.format(match.group(0), *groups).strip()
+                if value:
+                    result[name] = value
+
+
+class UAParser(object):
+
+    """A compiled rule set with an LRU of parsed user agents."""
+
+    def __init__(self, rules, cache_size=10000):
+        self.rules = [r if isinstance(r, Rule) else Rule(**r) for r in rules]
+        self.cache = LRUCache(cache_size)
+
+    @classmethod
+    def load(cls, path=DATA_PATH, **kwargs):
+        with codecs.open(path, encoding='utf-8') as f:
+            return cls(json.load(f)['rules'], **kwargs)
+
+    def _parse(self, ua):
+        result = {}
+        for rule in self.rules:
+            rule.apply(ua, result)
+            if len(result) == len(UserAgent._fields):
+                break
+        return UserAgent(*[result.get(name) for name in UserAgent._fields])
+
+    def parse(self, ua):
+        """Return a `UserAgent` tuple with None for anything the rules did not find."""
+        if not ua:
+            return UserAgent(None, None, None, None)
+        return self.cache.get_or_compute(ua, self._parse)
+
+
+def get_parser():
+    """The parser for the bundled rule set, loaded on first use."""
+    global _parser
+    if _parser is None:
+        _parser = UAParser.load()
+    return _parser
+
+
+def enrich(device, parser=None):
+    """Fill missing ``Device`` make, model, os and osv from ``Device.ua``.
+
+    Returns True if the device was changed.
+    """
+    if not device.ua or all(getattr(device, name) for name in UserAgent._fields):
+        return False
+    parsed = (parser or get_parser()).parse(device.ua)
+    changed = False
+    for name, value in zip(UserAgent._fields, parsed):
+        if value and not getattr(device, name):
+            setattr(device, name, value)
+            changed = True
+    return changed
+
+
+def enrich_request(brq, parser=None):
+    return brq.device is not None and enrich(brq.device, parser)
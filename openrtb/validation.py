@@ -0,0 +1,143 @@
+"""
+Validation of bid responses against the bid request they answer.
+
+A `Validator` compiles the request into lookup tables once (floors, sizes and blocked
+attributes per impression, blocked categories and advertisers) and then checks every
+bid with a handful of dict and set probes.
+"""
+
+from collections import namedtuple
+
+from . import domains
+from .auction import amount
+from .base import Enum
+from .currency import CurrencyError
+
+
+class RejectReason(Enum):
+    UNKNOWN_IMP = 1
+    BELOW_FLOOR = 2
+    INVALID_SIZE = 3
+    BLOCKED_CATEGORY = 4
+    BLOCKED_ATTRIBUTE = 5
+    BLOCKED_ADVERTISER = 6
+    UNKNOWN_CURRENCY = 7
+
+
+Rejection = namedtuple('Rejection', 'bid seat response reasons')
+
+
+class SizeRule(object):
+
+    """Banner sizes allowed by a `Banner` and its `Format` options."""
+
+    def __init__(self, banner):
+        self.exact = set()
+        self.ranges = []
+        self.ratios = []
+        flexible = any(v is not None for v in (banner.wmin, banner.wmax, banner.hmin, banner.hmax))
+        if flexible:
+            self.ranges.append((banner.wmin or 0, banner.wmax, banner.hmin or 0, banner.hmax))
+        elif banner.w is not None and banner.h is not None:
+            self.exact.add((banner.w, banner.h))
+        for fmt in banner.format or ():
+            if fmt.w is not None and fmt.h is not None:
+                self.exact.add((fmt.w, fmt.h))
+            elif fmt.wratio and fmt.hratio:
+                self.ratios.append((fmt.wratio, fmt.hratio, fmt.wmin or 0))
+
+    def __bool__(self):
+        return bool(self.exact or self.ranges or self.ratios)
+
+    __nonzero__ = __bool__
+
+    def allows(self, w, h):
+        if (w, h) in self.exact:
+            return True
+        for wmin, wmax, hmin, hmax in self.ranges:
+            if wmin <= w and (wmax is None or w <= wmax) and hmin <= h and (hmax is None or h <= hmax):
+                return True
+        for wratio, hratio, wmin in self.ratios:
+            if w * hratio == h * wratio and w >= wmin:
+                return True
+        return False
+
+
+class _Imp(object):
+
+    def __init__(self, imp, rates=None):
+        convert = rates.convert if rates is not None else lambda value, currency: value
+        self.floor = amount(convert(imp.bidfloor, imp.bidfloorcur))
+        self.deal_floors = {}
+        if imp.pmp:
+            for deal in imp.pmp.deals or ():
+                if deal.bidfloor is not None:
+                    self.deal_floors[deal.id] = amount(convert(deal.bidfloor, deal.bidfloorcur))
+        self.sizes = SizeRule(imp.banner) if imp.banner else None
+        battr = set()
+        for media in (imp.banner, imp.video, imp.audio):
+            if media is not None:
+                battr.update(media.battr or ())
+        self.battr = frozenset(battr)
+
+
+class Validator(object):
+
+    """Validates bids against a compiled `BidRequest`.
+
+    If ``rates`` (a `currency.Rates` table) is given, floors and bid prices are
+    compared in its base currency.
+    """
+
+    def __init__(self, brq, rates=None):
+        self.rates = rates
+        self.imps = {imp.id: _Imp(imp, rates) for imp in brq.imp}
+        self.bcat = frozenset(brq.bcat or ())
+        self.badv = domains.compile_domains(brq.badv)
+
+    def is_blocked_category(self, cat):
+        bcat = self.bcat
+        return cat in bcat or cat.split('-', 1)[0] in bcat
+
+    def check(self, bid, currency=None):
+        """Return a list of `RejectReason` values for a single bid priced in ``currency``."""
+        imp = self.imps.get(bid.impid)
+        if imp is None:
+            return [RejectReason.UNKNOWN_IMP]
+        reasons = []
+        floor = imp.deal_floors.get(bid.dealid, imp.floor) if bid.dealid else imp.floor
+        price = bid.price
+        if self.rates is not None:
+            try:
+                price = self.rates.convert(price, currency)
+            except CurrencyError:
+                reasons.append(RejectReason.UNKNOWN_CURRENCY)
+                price = None
+        if price is not None and amount(price) < floor:
+            reasons.append(RejectReason.BELOW_FLOOR)
+        if imp.sizes and bid.w is not None and bid.h is not None and not imp.sizes.allows(bid.w, bid.h):
+            reasons.append(RejectReason.INVALID_SIZE)
+        if self.bcat and bid.cat and any(self.is_blocked_category(c) for c in bid.cat):
+            reasons.append(RejectReason.BLOCKED_CATEGORY)
+        if imp.battr and bid.attr and not imp.battr.isdisjoint(bid.attr):
+            reasons.append(RejectReason.BLOCKED_ATTRIBUTE)
+        if self.badv and self.badv.blocks(bid.adomain):
+            reasons.append(RejectReason.BLOCKED_ADVERTISER)
+        return reasons
+
+    def validate(self, responses):
+        """Check every bid of every response and return a list of `Rejection` objects."""
+        rejected = []
+        check = self.check
+        for response in responses:
+            currency = response.cur
+            for seatbid in response.seatbid or ():
+                for bid in seatbid.bid or ():
+                    reasons = check(bid, currency)
+                    if reasons:
+                        rejected.append(Rejection(bid, seatbid.seat, response, reasons))
+        return rejected
+
+
+def validate(brq, responses, rates=None):
+    return Validator(brq, rates).validate(responses)
@@ -12,6 +12,9 @@ setup(name='openrtb',
       packages=[
           'openrtb',
       ],
+      package_data={
+          'openrtb': ['data/*.json'],
+      },
       author='Pavel Anossov',
       author_email='anossov@gmail.com',
       classifiers=[
@@ -26,6 +29,9 @@ setup(name='openrtb',
           'six',
           'tox'
       ],
+      extras_require={
+          'numpy': ['numpy'],
+      },
       url='https://github.com/anossov/openrtb',
       license='BSD',
       description='A set of classes implementing OpenRTB 2.2 and OpenRTB Mobile specifications',
@@ -1,10 +1,31 @@
 # -*- coding: utf-8 -*-
 
+import json
+import math
+import os
+import sys
+import tempfile
 import unittest
+from decimal import Decimal
+
+import six
 
 import openrtb
 import openrtb.base
 
+try:
+    import numpy
+    import openrtb.media
+except ImportError:
+    numpy = None
+
+try:
+    import asyncio
+    import openrtb.server
+    import openrtb.fanout
+except (ImportError, SyntaxError):
+    asyncio = None
+
 BRQ = {
     'id': u'testbrqid',
     'tmax': 100,
@@ -146,6 +167,26 @@ class TestObjects(unittest.TestCase):
         s = openrtb.request.Site.deserialize({'id': None})
         self.assertEqual(s.id, None)
 
+    def test_set_array(self):
+        raw = {'id': 'r', 'imp': [{'id': '1'}], 'bcat': ['IAB2', 'IAB1'], 'badv': ['a.com']}
+        brq = openrtb.request.BidRequest.deserialize(raw)
+        self.assertIn('IAB1', brq.bcat)
+        self.assertEqual(brq.bcat, ['IAB2', 'IAB1'])
+        self.assertEqual(brq.bcat[0], 'IAB2')
+        self.assertEqual(brq.serialize()['bcat'], ['IAB2', 'IAB1'])
+        self.assertIs(openrtb.request.BidRequest.deserialize(raw).bcat, brq.bcat)
+        self.assertEqual(hash(brq.badv), hash(frozenset(['a.com'])))
+
+    def test_set_array_duplicates(self):
+        bcat = openrtb.base.SetArray(str)(['IAB1', 'IAB1', 'IAB2'])
+        self.assertEqual(len(bcat), 2)
+        self.assertEqual(list(bcat), ['IAB1', 'IAB2'])
+        self.assertEqual(bcat.serialize(), ['IAB1', 'IAB2'])
+        self.assertEqual(bcat[1], 'IAB2')
+        with self.assertRaises(IndexError):
+            bcat[2]
+        self.assertNotEqual(bcat, ['IAB1', 'IAB1', 'IAB2'])
+
     def test_bid_request_serialize_cycle(self):
         self.maxDiff = None
         brq = openrtb.request.BidRequest.deserialize(BRQ)
@@ -356,5 +397,1148 @@ class TestMacros(unittest.TestCase):
             self.TPL
         ), 'rid//impid///0.2/USD')
 
+
+class TestDomains(unittest.TestCase):
+    def test_subdomain(self):
+        ds = openrtb.domains.DomainSet(['ford.com'])
+        self.assertIn('ford.com', ds)
+        self.assertIn('www.ford.com', ds)
+        self.assertIn('HTTP://Shop.Ford.com/cars', ds)
+        self.assertNotIn('notford.com', ds)
+        self.assertNotIn('com', ds)
+
+    def test_empty(self):
+        ds = openrtb.domains.DomainSet()
+        self.assertFalse(ds)
+        self.assertFalse(ds.blocks(['ford.com']))
+
+    def test_cache(self):
+        self.assertIs(openrtb.domains.compile_domains(['a.com', 'b.com']),
+                      openrtb.domains.compile_domains(['a.com', 'b.com']))
+
+    def test_bid_blocked(self):
+        brq = openrtb.request.BidRequest.minimal('r', 'i')
+        brq.badv = ['ford.com']
+        brq.bapp = ['com.foo']
+        bid = openrtb.response.Bid(id='b', impid='i', price=1, adomain=['x.com', 'eu.ford.com'])
+        self.assertTrue(openrtb.domains.is_bid_blocked(brq, bid))
+        bid = openrtb.response.Bid(id='b', impid='i', price=1, adomain=['x.com'], bundle='COM.Foo')
+        self.assertTrue(openrtb.domains.is_bid_blocked(brq, bid))
+        bid = openrtb.response.Bid(id='b', impid='i', price=1, adomain=['x.com'], bundle='com.foo.game')
+        self.assertFalse(openrtb.domains.is_bid_blocked(brq, bid))
+        self.assertTrue(openrtb.domains.is_bid_blocked(brq, bid, bundle_prefixes=True))
+        bid = openrtb.response.Bid(id='b', impid='i', price=1, adomain=['x.com'], bundle='com.foobar')
+        self.assertFalse(openrtb.domains.is_bid_blocked(brq, bid, bundle_prefixes=True))
+        brq.bapp = ['com']
+        self.assertFalse(openrtb.domains.is_bid_blocked(brq, bid))
+
+
+class TestAuction(unittest.TestCase):
+    def brq(self, **kwargs):
+        return openrtb.request.BidRequest(id='r', imp=[
+            openrtb.request.Impression(id='1', bidfloor=Decimal('1.00'), **kwargs),
+            openrtb.request.Impression(id='2'),
+        ])
+
+    def brp(self, seat, prices, group=0, dealid=None):
+        return openrtb.response.BidResponse(id='r', seatbid=[openrtb.response.SeatBid(
+            seat=seat, group=group,
+            bid=[openrtb.response.Bid(id=seat + impid, impid=impid, price=Decimal(price), dealid=dealid)
+                 for impid, price in prices]
+        )])
+
+    def test_second_price(self):
+        winners = openrtb.auction.run(self.brq(), [
+            self.brp('a', [('1', '3.00')]),
+            self.brp('b', [('1', '2.00')]),
+            self.brp('c', [('1', '0.50'), ('3', '9.00')]),
+        ])
+        self.assertEqual(list(winners), ['1'])
+        self.assertEqual(winners['1'].seat, 'a')
+        self.assertEqual(winners['1'].price, Decimal('2.01'))
+
+    def test_floor_price(self):
+        winners = openrtb.auction.run(self.brq(), [self.brp('a', [('1', '3.00')])])
+        self.assertEqual(winners['1'].price, Decimal('1.00'))
+
+    def test_first_price(self):
+        brq = self.brq()
+        brq.at = openrtb.constants.AuctionType.FIRST_PRICE
+        winners = openrtb.auction.run(brq, [self.brp('a', [('1', '3.00')]), self.brp('b', [('1', '2.00')])])
+        self.assertEqual(winners['1'].price, Decimal('3.00'))
+
+    def test_group(self):
+        winners = openrtb.auction.run(self.brq(), [
+            self.brp('a', [('1', '5.00'), ('2', '1.00')], group=1),
+            self.brp('b', [('1', '2.00'), ('2', '2.00')]),
+        ])
+        self.assertEqual(winners['1'].seat, 'b')
+        self.assertEqual(winners['2'].seat, 'b')
+
+    def test_deal(self):
+        deal = openrtb.request.Deal(id='d', bidfloor=4.0, wseat=['a', 'b'],
+                                    at=openrtb.constants.AuctionType.FIXED_PRICE)
+        pmp = openrtb.request.PMP(private_auction=1, deals=[deal])
+        winners = openrtb.auction.run(self.brq(pmp=pmp), [
+            self.brp('a', [('1', '3.00')], dealid='d'),
+            self.brp('b', [('1', '4.50')], dealid='d'),
+            self.brp('c', [('1', '9.00')], dealid='d'),
+            self.brp('e', [('1', '9.00')]),
+        ])
+        self.assertEqual(winners['1'].seat, 'b')
+        self.assertEqual(winners['1'].price, Decimal('4'))
+
+
+class TestValidation(unittest.TestCase):
+    def test_validate(self):
+        CA = openrtb.constants.CreativeAttribute
+        RR = openrtb.validation.RejectReason
+        brq = openrtb.request.BidRequest(
+            id='r',
+            bcat=['IAB25'],
+            badv=['ford.com'],
+            imp=[openrtb.request.Impression(
+                id='1',
+                bidfloor=Decimal('1.00'),
+                banner=openrtb.request.Banner(
+                    w=300, h=250,
+                    battr=[CA.POP],
+                    format=[openrtb.request.Format(w=728, h=90),
+                            openrtb.request.Format(wratio=16, hratio=9, wmin=320)]
+                )
+            )]
+        )
+        bid = openrtb.response.Bid
+        brp = openrtb.response.BidResponse(id='r', seatbid=[openrtb.response.SeatBid(seat='s', bid=[
+            bid(id='ok', impid='1', price=2, w=728, h=90, cat=['IAB1']),
+            bid(id='ratio', impid='1', price=2, w=640, h=360),
+            bid(id='small', impid='1', price=2, w=160, h=90),
+            bid(id='imp', impid='2', price=2),
+            bid(id='all', impid='1', price='0.5', w=1, h=1, cat=['IAB25-3'],
+                attr=[CA.POP], adomain=['www.ford.com']),
+        ])])
+        rejected = {r.bid.id: r.reasons for r in openrtb.validation.validate(brq, [brp])}
+        self.assertEqual(rejected['small'], [RR.INVALID_SIZE])
+        self.assertEqual(rejected['imp'], [RR.UNKNOWN_IMP])
+        self.assertEqual(rejected['all'], [RR.BELOW_FLOOR, RR.INVALID_SIZE, RR.BLOCKED_CATEGORY,
+                                           RR.BLOCKED_ATTRIBUTE, RR.BLOCKED_ADVERTISER])
+        self.assertNotIn('ok', rejected)
+        self.assertNotIn('ratio', rejected)
+
+    def test_size_range(self):
+        rule = openrtb.validation.SizeRule(openrtb.request.Banner(w=300, h=250, wmax=320, hmax=260))
+        self.assertTrue(rule.allows(310, 255))
+        self.assertFalse(rule.allows(330, 255))
+
+
+class TestPrice(unittest.TestCase):
+    def test_parse(self):
+        Price = openrtb.price.Price
+        self.assertEqual(Price('1.5').micros, 1500000)
+        self.assertEqual(Price(0.1).micros, 100000)
+        self.assertEqual(Price(3).micros, 3000000)
+        self.assertEqual(Price('-.25').micros, -250000)
+        self.assertEqual(Price('1e-3').micros, 1000)
+        self.assertEqual(Price(Decimal('0.0000015')).micros, 2)
+        with self.assertRaises(ValueError):
+            Price('x')
+
+    def test_decimal_compat(self):
+        Price = openrtb.price.Price
+        self.assertEqual(Price('1.50'), Decimal('1.5'))
+        self.assertEqual(hash(Price('1.5')), hash(Decimal('1.5')))
+        self.assertTrue(Decimal('1.4') < Price('1.5') < 2)
+        self.assertEqual(Price('0.1') + Price('0.2'), Price('0.3'))
+        self.assertEqual(Price('1.5') + Decimal('0.25'), Decimal('1.75'))
+        self.assertEqual(Price('1.25').quantize(Decimal('0.1')), Decimal('1.2'))
+        self.assertEqual(str(Price('2.500')), '2.5')
+
+    def test_decimal_formatting(self):
+        Price = openrtb.price.Price
+        self.assertEqual('{:.2f}'.format(Price('1.255')), '{:.2f}'.format(Decimal('1.255')))
+        self.assertEqual('{}'.format(Price('2.50')), '2.5')
+        if six.PY3:
+            # Python 2's round() converts to float
+            self.assertEqual(round(Price('1.256'), 2), Decimal('1.26'))
+            self.assertEqual(round(Price('2.5')), 2)
+        self.assertEqual((math.floor(Price('-1.5')), math.ceil(Price('1.2')), math.trunc(Price('-1.5'))), (-2, 2, -1))
+        self.assertEqual(3 / Price('1.5'), Decimal(2))
+        self.assertEqual(Decimal('3') / Price('2'), Decimal('1.5'))
+
+    def test_use_micros(self):
+        openrtb.price.use_micros()
+        try:
+            brq = openrtb.request.BidRequest.deserialize({'id': 'r', 'imp': [{'id': '1', 'bidfloor': 0.3}]})
+            brp = openrtb.response.BidResponse.deserialize(
+                {'id': 'r', 'seatbid': [{'bid': [{'id': 'b', 'impid': '1', 'price': 1.1}]}]})
+        finally:
+            openrtb.price.use_micros(False)
+        self.assertIsInstance(brq.imp[0].bidfloor, openrtb.price.Price)
+        self.assertEqual(brp.serialize()['seatbid'][0]['bid'][0]['price'], Decimal('1.1'))
+        self.assertEqual(openrtb.auction.run(brq, [brp])['1'].price, Decimal('0.3'))
+        brq = openrtb.request.BidRequest.deserialize({'id': 'r', 'imp': [{'id': '1', 'bidfloor': '0.3'}]})
+        self.assertIsInstance(brq.imp[0].bidfloor, Decimal)
+
+    def test_float_fields(self):
+        raw = {'id': 'd', 'bidfloor': 2.35, 'bidfloorcur': 'USD'}
+        openrtb.price.use_micros()
+        try:
+            deal = openrtb.request.Deal.deserialize(raw)
+        finally:
+            openrtb.price.use_micros(False)
+        self.assertIsInstance(deal.bidfloor, openrtb.price.Price)
+        self.assertEqual(deal.bidfloor, Decimal('2.35'))
+        self.assertEqual(json.loads(json.dumps(deal.serialize())), raw)
+
+
+class TestCurrency(unittest.TestCase):
+    RATES = openrtb.currency.Rates({'EUR': '0.5', 'JPY': '100'})
+
+    def test_convert(self):
+        self.assertEqual(self.RATES.convert(Decimal('1.5'), 'EUR'), Decimal('3'))
+        self.assertEqual(self.RATES.convert(Decimal('100'), 'JPY', 'EUR'), Decimal('0.5'))
+        self.assertEqual(self.RATES.convert(openrtb.price.Price('2'), 'USD', 'JPY'), openrtb.price.Price(200))
+        self.assertEqual(self.RATES.convert(1, None), Decimal(1))
+        with self.assertRaises(openrtb.currency.CurrencyError):
+            self.RATES.convert(1, 'XXX')
+
+    def test_load(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write('# currency,rate\nEUR,0.5\n')
+        try:
+            rates = openrtb.currency.load_rates(path)
+        finally:
+            os.remove(path)
+        self.assertIs(openrtb.currency.get_rates(), rates)
+        self.assertEqual(rates.convert(Decimal(1), 'EUR'), Decimal(2))
+        openrtb.currency.set_rates(openrtb.currency.Rates({}))
+
+    def test_floors(self):
+        brq = openrtb.request.BidRequest(id='r', imp=[
+            openrtb.request.Impression(id='1', bidfloor=Decimal(1), bidfloorcur='EUR')])
+        self.assertEqual(self.RATES.floors(brq), ({'1': Decimal(2)}, {}))
+        brp = openrtb.response.BidResponse.minimal('r', 'b', '1', Decimal('1.5'))
+        brp.cur = 'EUR'
+        self.assertEqual(self.RATES.prices([brp])[0][1], Decimal(3))
+        winners = openrtb.auction.run(brq, [brp], rates=self.RATES)
+        self.assertEqual(winners['1'].price, Decimal(2))
+        self.assertEqual(openrtb.validation.validate(brq, [brp], rates=self.RATES), [])
+        brp.cur = 'XXX'
+        self.assertEqual(openrtb.auction.run(brq, [brp], rates=self.RATES), {})
+        self.assertEqual(openrtb.validation.validate(brq, [brp], rates=self.RATES)[0].reasons,
+                         [openrtb.validation.RejectReason.UNKNOWN_CURRENCY])
+
+
+class TestTargeting(unittest.TestCase):
+    EXPRS = {
+        'geo': ('in', 'device.geo.country', ['us', 'CA']),
+        'size': {'imp.banner.size': [(320, 50)], 'device.devicetype': [openrtb.constants.DeviceType.MOBILE]},
+        'not_segment': ('not', ('in', 'user.data.segment.id', 'segmentid')),
+        'or': ('or', ('in', 'site.domain', 'example.com'), ('in', 'app.cat', ['IAB2-2'])),
+        'not_and': ('not', ('and', ('in', 'app.cat', 'IAB1'), ('in', 'device.make', 'Apple'))),
+        'not_in': ('not in', 'device.os', 'ios'),
+        'miss': ('and', ('in', 'device.geo.country', 'US'), ('in', 'imp.banner.size', [(1, 1)])),
+    }
+
+    def test_match(self):
+        brq = openrtb.request.BidRequest.deserialize(BRQ)
+        index = openrtb.targeting.TargetingIndex()
+        for name, expr in self.EXPRS.items():
+            index.add(name, expr)
+        expected = {name for name, expr in self.EXPRS.items() if openrtb.targeting.evaluate(expr, brq)}
+        self.assertEqual(expected, {'geo', 'size', 'or', 'not_in'})
+        self.assertEqual(index.match(brq), expected)
+
+    def test_enum_bitmasks(self):
+        raw = {'id': 'r', 'imp': [{'id': '1', 'banner': {'api': [3]}}]}
+        expr = ('in', 'imp.banner.api', [3])
+        openrtb.base.use_enum_bitmasks()
+        try:
+            brq = openrtb.request.BidRequest.deserialize(raw)
+        finally:
+            openrtb.base.use_enum_bitmasks(False)
+        self.assertIsInstance(brq.imp[0].banner.api, openrtb.base.EnumSet)
+        self.assertTrue(openrtb.targeting.evaluate(expr, brq))
+        index = openrtb.targeting.TargetingIndex()
+        index.add('api', expr)
+        self.assertEqual(index.match(brq), {'api'})
+
+    def test_block_lists(self):
+        brq = openrtb.request.BidRequest.deserialize(
+            {'id': 'r', 'imp': [{'id': '1'}], 'bcat': ['IAB1', 'IAB2'], 'badv': ['a.com']})
+        self.assertIsInstance(brq.bcat, openrtb.base.OrderedFrozenSet)
+        self.assertTrue(openrtb.targeting.evaluate(('in', 'bcat', ['IAB1']), brq))
+        self.assertFalse(openrtb.targeting.evaluate(('in', 'bcat', ['IAB3']), brq))
+        index = openrtb.targeting.TargetingIndex()
+        index.add('bcat', ('in', 'bcat', 'iab2'))
+        index.add('badv', ('not in', 'badv', 'a.com'))
+        self.assertEqual(index.match(brq), {'bcat'})
+
+    def test_incremental(self):
+        brq = openrtb.request.BidRequest.deserialize(BRQ)
+        index = openrtb.targeting.TargetingIndex()
+        index.add('a', self.EXPRS['geo'])
+        index.add('b', self.EXPRS['size'])
+        index.remove('a')
+        self.assertEqual(index.match(brq), {'b'})
+        index.add('b', self.EXPRS['miss'])
+        self.assertEqual(index.match(brq), set())
+        index.remove('b')
+        self.assertEqual((index.include, index.exclude, index.paths), ({}, {}, {}))
+
+
+class TestCreatives(unittest.TestCase):
+    def test_eligible(self):
+        BT = openrtb.constants.BannerType
+        CA = openrtb.constants.CreativeAttribute
+        Creative = openrtb.creatives.Creative
+        index = openrtb.creatives.CreativeIndex([
+            Creative(id='a', w=320, h=50, type=BT.BANNER, mime='image/png'),
+            Creative(id='b', w=320, h=50, type=BT.JS, mime='text/html'),
+            Creative(id='c', w=728, h=90, attr=[CA.POP]),
+            Creative(id='d', w=640, h=360),
+            Creative(id='e', w=320, h=180),
+            Creative.deserialize({'id': 'f', 'w': 300, 'h': 250}),
+        ])
+        banner = openrtb.request.Banner
+        fmt = openrtb.request.Format
+        self.assertEqual(index.eligible(banner(w=320, h=50)), {'a', 'b'})
+        self.assertEqual(index.eligible(banner(w=320, h=50, btype=[BT.JS])), {'a'})
+        self.assertEqual(index.eligible(banner(w=320, h=50, mimes=['IMAGE/PNG'])), {'a'})
+        self.assertEqual(index.eligible(banner(format=[fmt(w=728, h=90), fmt(wratio=16, hratio=9, wmin=400)])),
+                         {'c', 'd'})
+        self.assertEqual(index.eligible(banner(format=[fmt(w=728, h=90)], battr=[CA.POP])), set())
+        self.assertEqual(index.eligible(banner(w=300, h=250, wmin=300, wmax=330, hmax=250)), {'a', 'b', 'e', 'f'})
+        index.remove('a')
+        index.remove('f')
+        self.assertEqual(index.eligible(banner(wmin=300, wmax=330, hmax=250)), {'b', 'e'})
+        self.assertEqual(len(index), 4)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestMedia(unittest.TestCase):
+    def test_eligible(self):
+        C = openrtb.constants
+        MC = openrtb.media.MediaCreative
+        catalog = openrtb.media.MediaCatalog([
+            MC(id='a', mime='video/mp4', duration=15, protocol=C.Protocol.VAST3, bitrate=800),
+            MC(id='b', mime='video/mp4', duration=60, protocol=C.Protocol.VAST3),
+            MC(id='c', mime='video/webm', duration=15),
+            MC(id='d', mime='video/mp4', duration=15, protocol=C.Protocol.VAST2),
+            MC(id='e', mime='video/mp4', bitrate=3000, linearity=C.VideoLinearity.NON_LINEAR),
+            MC(id='f', mime='video/mp4', api=[C.APIFramework.VPAID2]),
+            MC(id='g', mime='video/mp4', attr=[C.CreativeAttribute.VIDEO_AUTOPLAY]),
+            MC.deserialize({'id': 'h', 'mime': 'audio/mpeg', 'duration': 30}),
+        ])
+        video = openrtb.request.Video(
+            mimes=['video/MP4'], minduration=5, maxduration=30,
+            protocols=[C.Protocol.VAST3, C.Protocol.VAST4], maxbitrate=2000,
+            linearity=C.VideoLinearity.LINEAR, battr=[C.CreativeAttribute.VIDEO_AUTOPLAY])
+        self.assertEqual(catalog.eligible_ids(video), ['a'])
+        video.api = [C.APIFramework.VPAID2]
+        video.battr = None
+        self.assertEqual(catalog.eligible_ids(video), ['a', 'f', 'g'])
+        audio = openrtb.request.Audio(mimes=['audio/mpeg', 'audio/ogg'], maxduration=30)
+        self.assertEqual(list(catalog.eligible(audio)), [7])
+
+    def test_high_bits(self):
+        MC = openrtb.media.MediaCreative
+        catalog = openrtb.media.MediaCatalog([
+            MC.deserialize({'id': 'a', 'mime': 'video/mp4', 'attr': [63], 'api': [62, 63]}),
+            MC.deserialize({'id': 'b', 'mime': 'video/mp4', 'attr': [1]}),
+        ])
+        video = openrtb.request.Video.deserialize({'mimes': ['video/mp4'], 'minduration': 0, 'maxduration': 30,
+                                                   'protocols': [3], 'battr': [63], 'api': [63, 62]})
+        self.assertEqual(catalog.eligible_ids(video), ['b'])
+        video.battr = None
+        self.assertEqual(catalog.eligible_ids(video), ['a', 'b'])
+        video.api = [63]
+        self.assertEqual(catalog.eligible_ids(video), ['b'])
+
+
+class TestEnumSet(unittest.TestCase):
+    def test_enum_set(self):
+        CA = openrtb.constants.CreativeAttribute
+        s = openrtb.base.EnumSet(CA, [CA.POP, 3])
+        self.assertEqual(list(s), [CA.POP, CA.EXPAND_AUTO])
+        self.assertEqual(s.serialize(), [8, 3])
+        self.assertEqual(list(openrtb.base.EnumSet(CA, [3, 8])), [CA.EXPAND_AUTO, CA.POP])
+        self.assertIn(CA.POP, s)
+        self.assertIn(3, s)
+        self.assertNotIn(CA.FLASHING, s)
+        self.assertEqual(len(s), 2)
+        self.assertEqual(s, [CA.POP, CA.EXPAND_AUTO])
+        self.assertTrue(s.intersects([CA.POP, CA.FLASHING]))
+        self.assertTrue(s.isdisjoint(1 << CA.FLASHING.value))
+        self.assertEqual(list(s & [8, 9]), [CA.POP])
+
+    def test_order_preserved(self):
+        s = openrtb.base.EnumArray(openrtb.constants.BannerType)([4, 1])
+        self.assertEqual(s.serialize(), [4, 1])
+        self.assertEqual(s[0], openrtb.constants.BannerType.IFRAME)
+        with self.assertRaises(openrtb.base.ValidationError):
+            openrtb.base.EnumArray(openrtb.constants.BannerType)(['x'])
+
+    def test_out_of_range(self):
+        array = openrtb.base.EnumArray(openrtb.constants.CreativeAttribute)
+        for values in ([1, 100000000], [-1, 2], [10 ** 10]):
+            result = array(values)
+            self.assertIsInstance(result, list)
+            self.assertEqual([value.value for value in result], values)
+        s = array([1, 63])
+        self.assertIsInstance(s, openrtb.base.EnumSet)
+        self.assertNotIn(10 ** 10, s)
+        self.assertNotIn(-1, s)
+        self.assertFalse(s.intersects([10 ** 10]))
+        self.assertNotEqual(s, [1, 63, 10 ** 10])
+        with self.assertRaises(ValueError):
+            openrtb.base.EnumSet(openrtb.constants.CreativeAttribute, [64])
+
+    def test_use_enum_bitmasks(self):
+        raw = {'id': 'r', 'at': 2, 'imp': [
+            {'id': '1', 'bidfloorcur': 'USD', 'banner': {'btype': [1, 4], 'battr': [8]}}]}
+        openrtb.base.use_enum_bitmasks()
+        try:
+            brq = openrtb.request.BidRequest.deserialize(raw)
+        finally:
+            openrtb.base.use_enum_bitmasks(False)
+        banner = brq.imp[0].banner
+        self.assertIsInstance(banner.btype, openrtb.base.EnumSet)
+        self.assertIn(openrtb.constants.BannerType.IFRAME, banner.blocked_types())
+        self.assertEqual(brq.serialize(), raw)
+        self.assertIsInstance(openrtb.request.BidRequest.deserialize(raw).imp[0].banner.btype, list)
+
+
+class TestMemoized(unittest.TestCase):
+    def test_invalidation(self):
+        banner = openrtb.request.Banner(w=1, h=2)
+        self.assertIs(banner.size(), banner.size())
+        banner.w = 3
+        self.assertEqual(banner.size(), (3, 2))
+        banner.h = None
+        self.assertEqual(banner.size(), None)
+
+    def test_not_serialized(self):
+        geo = openrtb.request.Geo(lat=1, lon=2)
+        geo.loc()
+        self.assertEqual(geo.serialize(), {'lat': 1, 'lon': 2})
+
+    def test_shared_empty(self):
+        brq = openrtb.request.BidRequest.minimal('i', 'i')
+        self.assertIs(brq.get_user(), brq.get_user())
+        self.assertIs(openrtb.request.Device().get_geo(), openrtb.request.Geo.empty())
+        with self.assertRaises(AttributeError):
+            brq.get_user().id = 'x'
+        self.assertEqual(openrtb.request.User.empty().id, None)
+
+
+class TestGeofence(unittest.TestCase):
+    def test_query(self):
+        index = openrtb.geofence.GeofenceIndex()
+        index.add_circle('moscow', 55.7558, 37.6173, 20000)
+        index.add_circle('red-square', 55.7539, 37.6208, 300)
+        index.add_polygon('box', [(54.0, 32.0), (54.0, 33.0), (55.0, 33.0), (55.0, 32.0)])
+        index.add_circle('dateline', 0.0, 179.99, 5000)
+        geo = openrtb.request.Geo
+        self.assertEqual(sorted(index.query(geo(lat=55.754, lon=37.621))), ['moscow', 'red-square'])
+        self.assertEqual(index.query(geo(lat=55.9, lon=37.6)), ['moscow'])
+        self.assertEqual(index.query(openrtb.request.BidRequest.deserialize(BRQ).device), ['box'])
+        self.assertEqual(index.query((0.0, -179.99)), ['dateline'])
+        self.assertEqual(index.query(geo()), [])
+        index.remove('moscow')
+        self.assertEqual(index.query_many([(55.754, 37.621), (55.9, 37.6), geo(), (54.5, 32.5)]),
+                         [['red-square'], [], [], ['box']])
+
+    def test_haversine(self):
+        self.assertAlmostEqual(openrtb.geofence.haversine(0, 0, 0, 1), 111195, delta=1)
+
+
+class TestIPGeo(unittest.TestCase):
+    CSV = ('start,end,country,region,city\n'
+           '1.0.0.0,1.0.0.255,AUS,,\n'
+           '123.1.0.0,123.1.255.255,USA,CA,San Francisco\n'
+           '2001:db8::,2001:db8::ffff,DEU,BE,Berlin\n')
+
+    def setUp(self):
+        fd, self.csv = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.CSV)
+        self.table = self.csv + '.bin'
+        openrtb.ipgeo.write_table(self.csv, self.table)
+
+    def tearDown(self):
+        os.remove(self.csv)
+        os.remove(self.table)
+
+    def test_lookup(self):
+        for db in (openrtb.ipgeo.IPDatabase.from_csv(self.csv), openrtb.ipgeo.IPDatabase.open(self.table)):
+            self.assertEqual(len(db), 3)
+            self.assertEqual(db.lookup('123.1.2.3').city, 'San Francisco')
+            self.assertEqual(db.lookup('::ffff:1.0.0.7').country, 'AUS')
+            self.assertEqual(db.lookup('2001:db8::1').country, 'DEU')
+            self.assertIsNone(db.lookup('2001:db8::1:0'))
+            self.assertIsNone(db.lookup('123.2.0.0'))
+            self.assertIsNone(db.lookup('0.0.0.1'))
+            self.assertIsNone(db.lookup('garbage'))
+            db.lookup('123.1.2.3')
+            self.assertEqual(db.cache.hits, 1)
+
+    def test_enrich(self):
+        db = openrtb.ipgeo.IPDatabase.open(self.table)
+        brq = openrtb.request.BidRequest.deserialize(BRQ)
+        self.assertTrue(openrtb.ipgeo.enrich_request(brq, db))
+        geo = brq.device.geo
+        self.assertEqual((geo.country, geo.region, geo.city), ('US', 'CA', 'San Francisco'))
+        self.assertIsNone(geo.type)
+        device = openrtb.request.Device(ipv6='2001:db8::5')
+        self.assertTrue(openrtb.ipgeo.enrich(device, db))
+        self.assertEqual(device.get_geo().city, 'Berlin')
+        self.assertEqual(device.geo.type, openrtb.constants.LocationType.IP)
+        self.assertFalse(openrtb.ipgeo.enrich(openrtb.request.Device(ip='9.9.9.9'), db))
+
+
+class TestUserAgent(unittest.TestCase):
+
+    IPHONE = ('Mozilla/5.0 (iPhone; CPU iPhone OS 14_2 like Mac OS X) '
+              'AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148')
+    GALAXY = 'Mozilla/5.0 (Linux; Android 10; SM-G973F) AppleWebKit/537.36 (KHTML, like Gecko)'
+
+    def test_parse(self):
+        parser = openrtb.useragent.get_parser()
+        self.assertEqual(parser.parse(self.IPHONE),
+                         openrtb.useragent.UserAgent('Apple', 'iPhone', 'iOS', '14.2'))
+        self.assertEqual(parser.parse(self.GALAXY),
+                         openrtb.useragent.UserAgent('Samsung', 'SM-G973F', 'Android', '10'))
+        self.assertEqual(parser.parse(''), (None, None, None, None))
+
+    def test_rule_order_and_cache(self):
+        parser = openrtb.useragent.UAParser([
+            {'contains': 'Foo', 'regex': r'Foo/(\d+)\.(\d+)', 'os': 'FooOS', 'osv': '{1}.{2}'},
+            {'regex': 'Foo', 'os': 'Other', 'make': 'Acme'},
+        ], cache_size=1)
+        self.assertEqual(parser.parse('x Foo/3.1'), (u'Acme', None, 'FooOS', '3.1'))
+        self.assertEqual(parser.parse('Bar'), (None, None, None, None))
+        self.assertEqual(len(parser.cache), 1)
+        with self.assertRaises(ValueError):
+            openrtb.useragent.UAParser([{'regex': 'x', 'browser': 'y'}])
+
+    def test_enrich(self):
+        device = openrtb.request.Device(ua=self.IPHONE, os='iPhone OS')
+        self.assertTrue(openrtb.useragent.enrich(device))
+        self.assertEqual((device.make, device.model, device.os, device.osv),
+                         ('Apple', 'iPhone', 'iPhone OS', '14.2'))
+        self.assertFalse(openrtb.useragent.enrich(device))
+        brq = openrtb.request.BidRequest(id='x', imp=[], device=openrtb.request.Device())
+        self.assertFalse(openrtb.useragent.enrich_request(brq))
+        self.assertFalse(openrtb.useragent.enrich_request(openrtb.request.BidRequest(id='x', imp=[])))
+
+
+class TestFrequency(unittest.TestCase):
+
+    def setUp(self):
+        self.time = 1000.0
+        self.store = openrtb.frequency.FrequencyStore(window=60, buckets=6, clock=lambda: self.time)
+
+    def test_user_key(self):
+        self.assertEqual(openrtb.frequency.user_key(openrtb.request.BidRequest.deserialize(BRQ)), 'id:userid')
+        brq = openrtb.request.BidRequest(id='x', imp=[], device=openrtb.request.Device(ifa='abc'),
+                                         user=openrtb.request.User(id='u1'))
+        self.assertEqual(openrtb.frequency.user_key(brq), 'id:u1')
+        brq.user.buyeruid = 'b1'
+        self.assertEqual(openrtb.frequency.user_key(brq), 'buyeruid:b1')
+        brq.user = None
+        self.assertEqual(openrtb.frequency.user_key(brq), 'ifa:abc')
+
+    def test_window(self):
+        store = self.store
+        self.assertEqual(store.increment('k'), 1)
+        self.time += 25
+        self.assertEqual(store.increment('k', 2), 3)
+        self.time += 40
+        self.assertEqual(store.count('k'), 2)
+        self.time += 30
+        self.assertEqual(store.count('k'), 0)
+        store.expire()
+        self.assertNotIn('k', store)
+
+    def test_check_and_increment(self):
+        store = self.store
+        self.assertTrue(store.check_and_increment('k', 2))
+        self.assertTrue(store.check_and_increment('k', 2))
+        self.assertFalse(store.check_and_increment('k', 2))
+        self.assertEqual(store.check_and_increment_many([('k', 3), ('k', 3), ('j', 1)]),
+                         [True, False, True])
+        self.assertEqual(store.increment_many(['j', 'x']), [2, 1])
+        self.assertEqual(store.counts(['k', 'j', 'y']), [3, 2, 0])
+
+    def test_maxsize(self):
+        store = openrtb.frequency.FrequencyStore(window=60, buckets=6, maxsize=2,
+                                                 clock=lambda: self.time)
+        store.increment('a')
+        self.time += 10
+        store.increment('b')
+        store.increment('c')
+        self.assertEqual(sorted(store.counters), ['b', 'c'])
+
+    def test_maxsize_one_bucket(self):
+        store = openrtb.frequency.FrequencyStore(window=60, buckets=6, maxsize=3,
+                                                 clock=lambda: self.time)
+        store.increment_many(['a', 'b', 'c'])
+        store.increment('d')
+        self.assertEqual(len(store.counters), 3)
+        self.assertIn('d', store)
+        self.assertEqual(sum(store.count(key) for key in 'abc'), 2)
+        self.assertEqual(sum(len(keys) for keys in store.generations.values()), 3)
+
+    def test_snapshot(self):
+        self.store.increment(('ifa:abc', 'c1'), 3)
+        self.store.increment('old')
+        self.time += 30
+        self.store.increment('new')
+        path = os.path.join(tempfile.mkdtemp(), 'caps.json')
+        self.store.snapshot(path)
+        self.time += 40
+        restored = openrtb.frequency.FrequencyStore(window=60, buckets=6, clock=lambda: self.time)
+        restored.restore(path)
+        self.assertEqual(restored.count(('ifa:abc', 'c1')), 0)
+        self.assertEqual(restored.count('new'), 1)
+        self.assertEqual(sorted(restored.counters), ['new'])
+        with self.assertRaises(ValueError):
+            openrtb.frequency.FrequencyStore(window=30).restore(path)
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = openrtb.codec.dumps(openrtb.request.BidRequest.deserialize(BRQ))
+        brq = openrtb.codec.decode(openrtb.request.BidRequest, data)
+        self.assertEqual(brq.device.geo.lat, 54.3123)
+        self.assertEqual(brq.serialize(), openrtb.request.BidRequest.deserialize(BRQ).serialize())
+        brq = openrtb.codec.decode(openrtb.request.BidRequest, b'{"id":"x","imp":[{"id":"1","bidfloor":0.1}]}')
+        self.assertEqual(brq.imp[0].bidfloor, Decimal('0.1'))
+        self.assertEqual(openrtb.codec.dumps({'p': Decimal('1.25')}), b'{"p":1.25}')
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.delays = {}
+
+    def tearDown(self):
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def handler(self, brq, deadline):
+        if brq.id == 'fail':
+            raise RuntimeError(brq.id)
+        result = None
+        if brq.id != 'nobid':
+            result = openrtb.response.BidResponse.minimal(brq.id, 'b', brq.imp[0].id, Decimal('2.5'))
+        if brq.id == 'unencodable':
+            result.ext = {'tags': {'a'}}
+        return asyncio.sleep(self.delays.get(brq.id, 0), result=result)
+
+    def exchange(self, payload, count, process=None, **kwargs):
+        self.server = openrtb.server.BidderServer(self.handler, **kwargs)
+        if process is not None:
+            self.server.process = process
+        run = self.loop.run_until_complete
+        run(self.server.start())
+        reader, writer = run(asyncio.open_connection('127.0.0.1', self.server.port))
+        writer.write(payload)
+        messages = [run(openrtb.httpio.read_message(reader)) for _ in range(count)]
+        writer.close()
+        run(asyncio.sleep(0.01))  # let the server see the connection close
+        return messages
+
+    def post(self, brq_id, tmax=100, headers=()):
+        brq = openrtb.request.BidRequest(id=brq_id, tmax=tmax, imp=[openrtb.request.Impression(id='1')])
+        return openrtb.httpio.request('POST', '/bid', 'localhost', openrtb.codec.dumps(brq), headers=headers)
+
+    def test_pipelined(self):
+        self.delays['slow'] = 0.02
+        payload = self.post('slow') + self.post('nobid') + self.post('fast') + b'GET /bid HTTP/1.1\r\n\r\n'
+        slow, nobid, fast, get = self.exchange(payload, 4)
+        self.assertEqual(slow.start[1], '200')
+        self.assertEqual(openrtb.codec.loads(slow.body)['id'], 'slow')
+        self.assertEqual(nobid.start[1], '204')
+        self.assertEqual(openrtb.codec.loads(fast.body)['seatbid'][0]['bid'][0]['price'], Decimal('2.5'))
+        self.assertEqual(get.start[1], '405')
+        self.assertEqual(self.server.requests, 4)
+
+    def test_deadline(self):
+        self.delays['late'] = 0.5
+        late, = self.exchange(self.post('late', tmax=40), 1, network_budget=20)
+        self.assertEqual(late.start[1], '204')
+        self.assertEqual(self.server.timeouts, 1)
+
+    def test_deadline_nbr(self):
+        self.delays['late'] = 0.5
+        nbr = openrtb.constants.NoBidReason.TECHNICAL_ERROR
+        late, = self.exchange(self.post('late', tmax=30), 1, timeout_nbr=nbr)
+        self.assertEqual(openrtb.codec.loads(late.body), {'id': 'late', 'seatbid': [], 'nbr': 1})
+
+    def test_prefilter(self):
+        prefilter = openrtb.prefilter.Prefilter()
+        prefilter.block('id', ['blocked'], reason=openrtb.constants.NoBidReason.UNMATCHED_USER)
+        blocked, ok = self.exchange(self.post('blocked') + self.post('ok'), 2, prefilter=prefilter)
+        self.assertEqual(openrtb.codec.loads(blocked.body)['nbr'], 8)
+        self.assertEqual(ok.start[1], '200')
+        self.assertEqual(self.server.rejected, 1)
+
+    def test_admission(self):
+        admission = openrtb.admission.AdmissionControl(default_rate=1)
+        latencies = []
+        admission.observe = latencies.append
+        first, second = self.exchange(self.post('a') + self.post('b'), 2, admission=admission)
+        self.assertEqual((first.start[1], second.start[1]), ('200', '204'))
+        self.assertEqual(admission.shed_by_source, {('rate_limited', ('/bid', None)): 1})
+        self.assertEqual(len(latencies), 1)  # the shed request is not measured
+        self.assertGreater(latencies[0], 0)
+
+    def test_admission_invalid(self):
+        body = b'{"id":"r","site":{"publisher":{"id":"\xff"}},"imp":[{"id":"1"}]}'
+        admission = openrtb.admission.AdmissionControl()
+        invalid, ok = self.exchange(openrtb.httpio.request('POST', '/bid', 'localhost', body) + self.post('ok'),
+                                    2, admission=admission)
+        self.assertEqual((invalid.start[1], ok.start[1]), ('400', '200'))
+        self.assertEqual(self.server.errors, 1)
+
+    def test_errors(self):
+        payload = (self.post('fail') + openrtb.httpio.request('POST', '/bid', 'localhost', b'{')
+                   + self.post('ok', headers=[('Connection', 'close')]))
+        fail, bad, ok = self.exchange(payload, 3)
+        self.assertEqual((fail.start[1], bad.start[1], ok.start[1]), ('500', '400', '200'))
+        self.assertEqual(ok.headers['connection'], 'close')
+
+    def test_unexpected_errors(self):
+        unencodable, ok = self.exchange(self.post('unencodable') + self.post('ok'), 2)
+        self.assertEqual((unencodable.start[1], ok.start[1]), ('500', '200'))
+        self.assertEqual(self.server.errors, 1)
+
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+
+        def process(message, received):
+            raise RuntimeError('broken')
+
+        broken, dropped = self.exchange(self.post('a') + self.post('b'), 2, process=process)
+        self.assertEqual((broken.start[1], broken.headers['connection']), ('500', 'close'))
+        self.assertIsNone(dropped)
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestFanout(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.servers = []
+
+    def tearDown(self):
+        self.client.close()
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        for server in self.servers:
+            server.close()
+            self.loop.run_until_complete(server.wait_closed())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def stub(self, name, latency, price=None):
+        def handler(brq, deadline):
+            result = None
+            if price is not None:
+                result = openrtb.response.BidResponse.minimal(brq.id, name, brq.imp[0].id, price)
+            return asyncio.sleep(latency, result=result)
+        server = openrtb.server.BidderServer(handler, default_tmax=1000, network_budget=0)
+        self.loop.run_until_complete(server.start())
+        self.servers.append(server)
+        return openrtb.fanout.Bidder(name, '127.0.0.1', server.port)
+
+    def test_fanout(self):
+        bidders = [self.stub('slow', 0.05, Decimal('3')), self.stub('late', 1, Decimal('9')),
+                   self.stub('fast', 0, Decimal('1.5')), self.stub('nobid', 0.01)]
+        self.client = openrtb.fanout.FanoutClient(bidders, network_budget=0)
+        brq = openrtb.request.BidRequest(id='r1', tmax=200, imp=[openrtb.request.Impression(id='1')])
+
+        fanout = self.client.fanout(brq)
+        results = self.loop.run_until_complete(fanout.collect())
+        self.assertEqual([r.bidder.name for r in results], ['fast', 'nobid', 'slow'])
+        fast, nobid, slow = results
+        self.assertEqual(fast.response.seatbid[0].bid[0].price, Decimal('1.5'))
+        self.assertEqual((nobid.status, nobid.response), (204, None))
+        self.assertEqual(slow.response.id, 'r1')
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(all(task.done() for task in fanout.tasks))
+
+        # keep-alive connections are reused, the cancelled one is not
+        brq.tmax = 100
+        self.loop.run_until_complete(self.client.dispatch(brq, bidders=bidders[2:]))
+        self.assertEqual([b.pool.opened for b in bidders], [1, 1, 1, 1])
+
+    def test_prepare_and_errors(self):
+        def prepare(data):
+            data['ext']['seat'] = 'x'
+            data['imp'][0]['tagid'] = 't'
+            return data
+        bidder = self.stub('ok', 0, Decimal('1'))
+        bidder.prepare = prepare
+        down = openrtb.fanout.Bidder('down', '127.0.0.1', self.servers[0].port, path='/nowhere')
+        self.servers[0].path = '/'
+        self.client = openrtb.fanout.FanoutClient([bidder, down])
+        brq = openrtb.request.BidRequest(id='r2', imp=[openrtb.request.Impression(id='1')], ext={'a': 1})
+        results = {r.bidder.name: r for r in self.loop.run_until_complete(self.client.dispatch(brq))}
+        self.assertEqual(results['ok'].status, 200)
+        self.assertEqual(results['down'].status, 404)
+        self.assertIsInstance(results['down'].error, openrtb.httpio.HTTPError)
+        self.assertEqual(brq.ext, {'a': 1})
+        self.assertNotIn('tagid', brq.serialize()['imp'][0])
+        data = brq.serialize()
+        self.assertIn(b'"seat":"x"', bidder.encode(data, b''))
+        self.assertEqual(data, {'id': 'r2', 'imp': [{'id': '1', 'bidfloorcur': 'USD'}], 'at': 2, 'ext': {'a': 1}})
+
+
+class TestNoBid(unittest.TestCase):
+
+    def test_raw_id(self):
+        raw_id = openrtb.nobid.raw_id
+        self.assertEqual(raw_id(b'{"id":"abc","imp":[]}'), b'"abc"')
+        self.assertEqual(raw_id(b'{"imp":[{"id":"1","ext":{"id":"x"}}], "site": {"id": "s"},'
+                                b' "note": "\\"id\\": 1", "id" : "a\\"b"}'), b'"a\\"b"')
+        self.assertEqual(raw_id(b'{"id": 42}'), b'"42"')
+        self.assertEqual(raw_id(b'{"id":1.5}'), b'"1.5"')
+        self.assertEqual(raw_id(b'{"id":-2E+3 ,"imp":[]}'), b'"-2E+3"')
+        self.assertEqual(raw_id(b'{"imp":[{"id":1}],"id":1.25e-1}'), b'"1.25e-1"')
+        self.assertEqual(raw_id(b'{"id":1.}'), None)
+        self.assertEqual(raw_id(b'{"id":true}'), None)
+        self.assertEqual(raw_id(b'{"imp":[{"id":"1"}]}'), None)
+        self.assertEqual(raw_id(b'not json'), None)
+
+    def test_encode_id(self):
+        self.assertEqual(openrtb.nobid.encode_id(u'abc-1'), b'"abc-1"')
+        self.assertEqual(openrtb.nobid.encode_id(u'a"é'), b'"a\\"\\u00e9"')
+
+    def test_reject(self):
+        reason = openrtb.constants.NoBidReason.SUSPECTED_NON_HUMAN
+        raw = openrtb.codec.dumps(openrtb.request.BidRequest.deserialize(BRQ))
+        data = openrtb.nobid.reject(raw, reason)
+        head, body = data.split(b'\r\n\r\n', 1)
+        self.assertTrue(head.startswith(b'HTTP/1.1 200 OK\r\n'))
+        self.assertIn('Content-Length: {}'.format(len(body)).encode('ascii'), head)
+        expected = openrtb.response.BidResponse(id=BRQ['id'], seatbid=[], nbr=reason).serialize()
+        self.assertEqual(openrtb.codec.loads(body), expected)
+        self.assertEqual(openrtb.nobid.reject(raw), openrtb.nobid.NO_CONTENT)
+        self.assertEqual(openrtb.nobid.reject(b'{}', reason), openrtb.nobid.NO_CONTENT)
+        self.assertEqual(openrtb.nobid.body(b'"x"', 500), b'{"id":"x","seatbid":[],"nbr":500}')
+
+
+class TestPrefilter(unittest.TestCase):
+
+    RAW = (b'{"imp":[{"id":"1","ext":{"site":{"domain":"imp.com"},"note":"\\"app\\": {"}}],'
+           b' "site": {"publisher": {"domain": "pub.com"}, "name": "a \\\\", "domain": "www.news.com"},'
+           b' "device": {"ua": "x [", "devicetype": 4, "geo": {"lat": 1.5, "country": "USA"}}, "id": "r1"}')
+
+    def test_extract(self):
+        values = openrtb.prefilter.extract(self.RAW, ['site.domain', 'app.bundle', 'device.geo.country',
+                                                      'device.devicetype', 'device.geo.lat', 'id', 'imp.id'])
+        self.assertEqual(values, {
+            'site.domain': 'www.news.com',
+            'app.bundle': None,
+            'device.geo.country': 'USA',
+            'device.devicetype': 4,
+            'device.geo.lat': 1.5,
+            'id': 'r1',
+            'imp.id': None,
+        })
+        self.assertEqual(openrtb.prefilter.extract(b'[]', ['id']), {'id': None})
+        with self.assertRaises(ValueError):
+            openrtb.prefilter.path_tree(['device', 'device.ua'])
+
+    def test_rules(self):
+        prefilter = openrtb.prefilter.Prefilter()
+        prefilter.block('app.bundle', ['com.bad'])
+        prefilter.allow('device.geo.country', ['USA', 'CAN'])
+        prefilter.block('device.devicetype', [openrtb.constants.DeviceType.TV])
+        self.assertEqual(prefilter.check(self.RAW), None)
+        brq, rejection = prefilter.decode(self.RAW)
+        self.assertEqual((brq.id, rejection), ('r1', None))
+
+        reason = openrtb.constants.NoBidReason.BLOCKED_PUBLISHER_OR_SITE
+        prefilter.block('site.domain', openrtb.domains.compile_domains(['news.com']), reason=reason)
+        self.assertEqual(prefilter.check(self.RAW).path, 'site.domain')
+        brq, rejection = prefilter.decode(self.RAW)
+        self.assertEqual(brq, None)
+        self.assertTrue(rejection.endswith(b'{"id":"r1","seatbid":[],"nbr":7}'))
+
+    def test_missing(self):
+        prefilter = openrtb.prefilter.Prefilter()
+        prefilter.allow('user.id', ['u'])
+        self.assertEqual(prefilter.check(self.RAW), None)
+        prefilter.allow('app.bundle', ['com.good'], missing=False)
+        self.assertEqual(prefilter.check(self.RAW).path, 'app.bundle')
+        self.assertEqual(prefilter.decode(self.RAW), (None, openrtb.nobid.NO_CONTENT))
+
+
+class TestAdmission(unittest.TestCase):
+
+    def raw(self, publisher, bidfloor=None, app=False):
+        imp = {'id': '1'}
+        if bidfloor is not None:
+            imp['bidfloor'] = bidfloor
+        data = {'id': 'r', 'imp': [imp], 'app' if app else 'site': {'publisher': {'id': publisher}}}
+        return openrtb.codec.dumps(data)
+
+    def test_source(self):
+        self.assertEqual(openrtb.admission.source_of(self.raw('p1', 0.5), 'x'), ('x', 'p1'))
+        self.assertEqual(openrtb.admission.source_of(self.raw('p2', app=True)), (None, 'p2'))
+        self.assertEqual(openrtb.admission.max_bidfloor(self.raw('p1', Decimal('1.5'))), 1.5)
+        self.assertEqual(openrtb.admission.max_bidfloor(self.raw('p1')), 0)
+        invalid = b'{"id":"r","site":{"publisher":{"id":"\xff"}},"imp":[{"id":"1"}]}'
+        self.assertEqual(openrtb.admission.source_of(invalid, 'x'), ('x', None))
+        self.assertIsNone(openrtb.admission.AdmissionControl().admit(invalid, 'x'))
+
+    def test_rate_limit(self):
+        now = [0.0]
+        control = openrtb.admission.AdmissionControl(default_rate=2, rates={('x', 'big'): 100},
+                                                     clock=lambda: now[0])
+        results = [control.admit(self.raw('p1'), 'x') for _ in range(4)]
+        self.assertEqual(results, [None, None, 'rate_limited', 'rate_limited'])
+        self.assertIsNone(control.admit(self.raw('p2'), 'x'))
+        self.assertTrue(all(control.admit(self.raw('big'), 'x') is None for _ in range(50)))
+        now[0] += 0.5
+        self.assertIsNone(control.admit(self.raw('p1'), 'x'))
+        self.assertEqual(control.shed_by_source, {('rate_limited', ('x', 'p1')): 2})
+
+    def test_overload(self):
+        now = [0.0]
+        control = openrtb.admission.AdmissionControl(latency_budget=0.01, smoothing=1.0, step=0.5,
+                                                     clock=lambda: now[0])
+        control.report(('x', 'good'), True)
+        for floor in range(10):
+            self.assertIsNone(control.admit(self.raw('p', floor), 'x'))
+        control.observe(0.05)
+        control.observe(0.05)
+        self.assertEqual(control.shed_level, 0.5)
+        self.assertEqual(control.admit(self.raw('p', 1), 'x'), 'overloaded')
+        self.assertIsNone(control.admit(self.raw('p', 9), 'x'))
+        self.assertIsNone(control.admit(self.raw('good', 1), 'x'))
+        now[0] += 1
+        control.observe(0.001)
+        self.assertEqual(control.shed_level, 0.25)
+        now[0] += 1
+        control.observe(0.001)
+        self.assertEqual(control.shed_level, 0)
+        self.assertIsNone(control.admit(self.raw('p', 0), 'x'))
+        counters = control.counters()
+        self.assertEqual((counters['shed_overloaded'], counters['shed_rate_limited']), (1, 0))
+        self.assertEqual(counters['admitted'], 13)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        openrtb.metrics.disable()
+
+    def test_buckets(self):
+        metrics = openrtb.metrics
+        for ns in [0, 1, 15, 16, 31, 32, 33, 1000, 123456789, 2 ** 40 + 5]:
+            index = metrics.bucket_of(ns)
+            self.assertLessEqual(ns, metrics.bucket_bound(index))
+            self.assertGreater(ns, metrics.bucket_bound(index - 1) if index else -1)
+            self.assertLessEqual(metrics.bucket_bound(index) - ns, ns / 16.0)
+
+    def test_histogram(self):
+        histogram = openrtb.metrics.Histogram()
+        for us in range(1, 101):
+            histogram.record(us / 1e6)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.quantile(0.5), 50e-6, delta=4e-6)
+        self.assertAlmostEqual(histogram.quantile(0.99), 99e-6, delta=7e-6)
+        self.assertEqual(histogram.cumulative([16e-6, 1])[1], 100)
+        copy = openrtb.metrics.Histogram.from_dict(histogram.to_dict()).merge(histogram)
+        self.assertEqual((copy.count, copy.total), (200, 2 * histogram.total))
+
+    def test_hooks(self):
+        registry = openrtb.metrics.Registry()
+        openrtb.metrics.enable(registry)
+        brq = openrtb.request.BidRequest.deserialize(BRQ)
+        brp = openrtb.response.BidResponse.minimal('r', 'b', '1', Decimal('1'))
+        brp.serialize()
+        openrtb.macros.substitution(brq, brp, 1, '${AUCTION_PRICE}')
+        with openrtb.metrics.timer('targeting'):
+            pass
+        openrtb.metrics.disable()
+        openrtb.request.BidRequest.deserialize(BRQ)
+        with openrtb.metrics.timer('targeting'):
+            pass
+        self.assertNotIn('deserialize', openrtb.request.BidRequest.__dict__)
+        counts = {stage: h.count for stage, h in registry.collect().items()}
+        self.assertEqual(counts, {'deserialize': 1, 'serialize': 1, 'macros': 1, 'targeting': 1})
+
+    def test_merge_and_export(self):
+        import threading
+        registry = openrtb.metrics.Registry()
+        threads = [threading.Thread(target=registry.observe, args=('auction', 0.002)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        path = os.path.join(tempfile.mkdtemp(), 'worker.json')
+        registry.dump(path)
+        registry.load(path)
+        self.assertEqual(registry.collect()['auction'].count, 6)
+        text = openrtb.metrics.prometheus_text(registry.collect())
+        self.assertIn('# TYPE openrtb_stage_seconds histogram', text)
+        self.assertIn('openrtb_stage_seconds_bucket{stage="auction",le="0.001024"} 0', text)
+        self.assertIn('openrtb_stage_seconds_bucket{stage="auction",le="0.002048"} 6', text)
+        self.assertIn('openrtb_stage_seconds_count{stage="auction"} 6', text)
+
+
+class TestDeserializeProfile(unittest.TestCase):
+
+    def tearDown(self):
+        openrtb.base.profile_deserialize(False)
+
+    def test_profile(self):
+        openrtb.base.profile_deserialize()
+        data = dict(BRQ, unknown1=1, unknown2=2)
+        openrtb.request.BidRequest.deserialize(data)
+        openrtb.request.BidRequest.deserialize(BRQ)
+        rows = {row.name: row for row in openrtb.base.deserialize_profile()}
+        self.assertEqual(openrtb.base.deserialize_profile()[0].name, 'request.BidRequest')
+        brq = rows['request.BidRequest']
+        self.assertEqual((brq.calls, brq.fields, brq.unknown), (2, 2 * len(BRQ) + 2, 2))
+        self.assertEqual(rows['request.Segment'].calls, 2)
+        self.assertEqual(rows['request.Impression'].calls, 2)
+        self.assertGreaterEqual(brq.seconds, rows['request.Impression'].seconds)
+        self.assertIn('request.Geo', openrtb.base.format_deserialize_profile())
+
+        class Late(openrtb.base.Object):
+            x = openrtb.base.Field(int)
+
+            @classmethod
+            def deserialize(cls, raw_data):
+                return super(Late, cls).deserialize(raw_data)
+        self.assertIn('original', Late.__dict__['deserialize'].__func__.__dict__)
+
+    def test_disabled(self):
+        openrtb.base.profile_deserialize()
+        openrtb.base.profile_deserialize(False)
+        self.assertEqual(openrtb.base.deserialize_profile(), [])
+        self.assertNotIn('original', openrtb.base.Object.__dict__['deserialize'].__func__.__dict__)
+        brq = openrtb.request.BidRequest.deserialize(BRQ)
+        self.assertEqual(brq.imp[0].banner.w, 320)
+        self.assertEqual(openrtb.base.deserialize_profile(), [])
+
+    def test_metrics(self):
+        registry = openrtb.metrics.Registry()
+        openrtb.base.profile_deserialize()
+        openrtb.metrics.enable(registry)
+        try:
+            openrtb.base.profile_deserialize(False)
+            openrtb.request.BidRequest.deserialize(BRQ)
+            self.assertEqual(registry.collect()['deserialize'].count, 1)
+            self.assertEqual(openrtb.base.deserialize_profile(), [])
+            openrtb.base.profile_deserialize()
+            openrtb.request.BidRequest.deserialize(BRQ)
+            self.assertEqual(registry.collect()['deserialize'].count, 2)
+            self.assertEqual(openrtb.base.deserialize_profile()[0].calls, 1)
+        finally:
+            openrtb.metrics.disable()
+        openrtb.request.BidRequest.deserialize(BRQ)
+        self.assertEqual(registry.collect()['deserialize'].count, 2)
+        self.assertEqual(openrtb.base.deserialize_profile()[0].calls, 2)
+        openrtb.base.profile_deserialize(False)
+        self.assertNotIn('deserialize', openrtb.request.BidRequest.__dict__)
+        self.assertNotIn('original', openrtb.base.Object.__dict__['deserialize'].__func__.__dict__)
+
+
+class TestTracking(unittest.TestCase):
+
+    def test_sample(self):
+        tracker = openrtb.tracking.FieldTracker(rate=0.0)
+        brq = openrtb.request.BidRequest.deserialize(BRQ)
+        self.assertFalse(tracker.sample(brq))
+        self.assertIs(type(brq), openrtb.request.BidRequest)
+
+        self.assertTrue(tracker.sample(brq, force=True))
+        self.assertIsInstance(brq.device, openrtb.request.Device)
+        self.assertEqual(brq.imp[0].banner.w, 320)
+        self.assertEqual(brq.imp[0].banner.w, 320)
+        self.assertEqual(brq.device.geo.lat, 54.3123)
+        self.assertEqual(brq.serialize(), openrtb.request.BidRequest.deserialize(BRQ).serialize())
+        self.assertEqual(tracker.reads['imp.banner.w'], 2)
+        self.assertEqual(tracker.request_counts['imp.banner.w'], 1)
+        self.assertEqual(set(tracker.paths()), {'imp', 'imp.banner', 'imp.banner.w',
+                                                'device', 'device.geo', 'device.geo.lat'})
+
+        tracker.release(brq)
+        self.assertIs(type(brq.imp[0].banner), openrtb.request.Banner)
+        brq.imp[0].banner.h
+        self.assertNotIn('imp.banner.h', tracker.reads)
+
+    def test_projection(self):
+        tracker = openrtb.tracking.FieldTracker(rate=1.0)
+        for i in range(4):
+            brq = openrtb.request.BidRequest.deserialize(BRQ)
+            tracker.sample(brq)
+            brq.imp[0].banner.w
+            if not i:
+                brq.device.ua
+        self.assertEqual(tracker.requests, 4)
+        spec = tracker.projection(openrtb.request.BidRequest, min_fraction=0.5)
+        self.assertEqual(spec, {'id': True, 'imp': {'id': True, 'banner': {'w': True}}})
+        self.assertIn('device', tracker.projection(openrtb.request.BidRequest))
+
+        brq = openrtb.tracking.deserialize(openrtb.request.BidRequest, BRQ, spec)
+        self.assertEqual(brq.imp[0].banner.w, 320)
+        self.assertIsNone(brq.imp[0].banner.h)
+        self.assertIsNone(brq.device)
+
+
+class TestMemory(unittest.TestCase):
+
+    def test_footprint(self):
+        brq = openrtb.request.BidRequest.deserialize(BRQ)
+        report = openrtb.memory.footprint(brq)
+        self.assertEqual(report.by_class['request.BidRequest'][0], 1)
+        self.assertGreater(report.by_path['imp'][1], report.by_path['imp.banner'][1])
+        self.assertGreater(report.total, report.by_path['imp'][1] + report.by_path['device'][1])
+        self.assertIn('request.Geo', report.format())
+
+        # an object reachable twice is counted once
+        shared = openrtb.request.BidRequest.deserialize(BRQ)
+        shared.site = openrtb.request.Site(id='x', publisher=shared.app.publisher)
+        self.assertEqual(openrtb.memory.footprint(shared).by_class['request.Publisher'][0], 1)
+        self.assertNotIn('request.Regulations', report.by_class)
+
+    def test_block_lists(self):
+        brq = openrtb.request.BidRequest.deserialize(dict(BRQ, badv=['a.com', 'b.com']))
+        self.assertIsInstance(brq.badv, openrtb.base.OrderedFrozenSet)
+        report = openrtb.memory.footprint(brq)
+        badv = brq.badv
+        expected = (sys.getsizeof(badv) + sys.getsizeof(badv.__dict__) + sys.getsizeof(badv.order) +
+                    sum(sys.getsizeof(domain) for domain in badv))
+        self.assertEqual(report.by_path['badv'][1], expected)
+        self.assertEqual(report.by_class['tuple'][0], 1)
+
+    def test_corpus(self):
+        lines = [openrtb.codec.dumps(dict(BRQ, id='x' * i)) for i in range(1, 11)]
+        report = openrtb.memory.corpus(lines + [b'', b'{"id"'])
+        self.assertEqual((len(report.sizes), report.errors), (10, 1))
+        percentiles = report.percentiles((0.5, 1.0))
+        self.assertLess(percentiles[0.5], percentiles[1.0])
+        self.assertEqual(percentiles[1.0], max(report.sizes))
+        self.assertEqual(len(report.path_sizes['imp.banner']), 10)
+        self.assertEqual(report.footprint.by_class['request.BidRequest'][0], 10)
+        self.assertIn('p99', report.format())
+        self.assertEqual(openrtb.memory.percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertIsNone(openrtb.memory.percentile([], 0.5))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file